@@ -23,6 +23,14 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
+# Warm the search autocomplete index of this worker
+from user.suggest import preload_suggest_index
+preload_suggest_index()
+
+# Sample system health in the background for the admin dashboard
+from user.health import start_health_sampler
+start_health_sampler()
+
 # Define the ASGI application
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -10,10 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import copy
 import os
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 # Load environment variables
 load_dotenv()
@@ -158,8 +160,11 @@ TEMPLATES = [
     },
 ]
 MIDDLEWARE = [
+    'user.metrics.MetricsMiddleware',
+    'user.querybudget.QueryBudgetMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'user.dbrouting.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -170,6 +175,20 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'myproject.urls'
 
+# Prometheus metrics (/metrics); a bearer token is required, except with DEBUG
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN', '')
+# Port on which Celery workers serve their metrics (0 disables)
+CELERY_METRICS_PORT = int(os.getenv('CELERY_METRICS_PORT', 0))
+
+# Query budgets and N+1 detection (see user/querybudget.py), for dev/staging:
+# X-DB-Queries/X-DB-Time headers and warnings for repeated SQL shapes
+QUERY_BUDGET_ENABLED = os.getenv('QUERY_BUDGET_ENABLED', str(DEBUG)).lower() == 'true'
+QUERY_BUDGET_REPEAT_THRESHOLD = int(os.getenv('QUERY_BUDGET_REPEAT_THRESHOLD', 5))
+
+# Results and baseline of `manage.py benchmark` (see user/benchmarks.py)
+BENCHMARK_DIR = os.getenv('BENCHMARK_DIR', os.path.join(BASE_DIR, 'benchmarks'))
+
 # TEMPLATES = [
 #     {
 #         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -212,6 +231,63 @@ else:
         }
     }
 
+# Database connections. Connections are verified before reuse (a dead one is
+# replaced instead of failing the request).
+# - DB_CONN_MAX_AGE: seconds a connection is kept across requests/tasks
+#   (0 = one per request). For WSGI servers and Celery workers only: under
+#   ASGI every request runs in its own thread and would leak connections.
+# - DB_POOL (Postgres, needs psycopg[pool]): a connection pool per process,
+#   the mode for the ASGI server. A process holds DB_POOL_MIN_SIZE to
+#   DB_POOL_MAX_SIZE connections, capped by DB_MAX_CONNECTIONS (the share of
+#   the server's max_connections for this service) / DB_POOL_PROCESSES.
+#   Requests wait DB_POOL_TIMEOUT seconds for a free connection.
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 0))
+DB_POOL = os.getenv('DB_POOL', 'False').lower() == 'true'
+if DB_POOL and 'postgresql' in DATABASES['default']['ENGINE']:
+    _pool_max_size = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    if os.getenv('DB_MAX_CONNECTIONS'):
+        _pool_max_size = min(
+            _pool_max_size,
+            max(int(os.getenv('DB_MAX_CONNECTIONS')) // int(os.getenv('DB_POOL_PROCESSES', 1)), 1),
+        )
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # The pool keeps the connections
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': min(int(os.getenv('DB_POOL_MIN_SIZE', 2)), _pool_max_size),
+            'max_size': _pool_max_size,
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+        },
+    }
+
+# Read replica for analytics (see user/dbrouting.py): REPLICA_DB_HOST adds a
+# Postgres replica with the credentials of default, REPLICA_SQLITE_NAME a
+# local SQLite stand-in (a copy of db.sqlite3) for development. Run the test
+# suite without either: ReplicaRoutingTests covers the routing
+if os.getenv('REPLICA_DB_HOST'):
+    # A deep copy: the replica must not share the OPTIONS (pool) of default
+    DATABASES['replica'] = {
+        **copy.deepcopy(DATABASES['default']),
+        'HOST': os.getenv('REPLICA_DB_HOST'),
+        'PORT': os.getenv('REPLICA_DB_PORT', DATABASES['default'].get('PORT', '')),
+    }
+elif os.getenv('REPLICA_SQLITE_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('REPLICA_SQLITE_NAME'),
+    }
+if 'replica' in DATABASES:
+    # Tests read the replica through the default test database
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['user.dbrouting.ReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+# Seconds a client reads from default after one of its writes (> replication lag)
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+REPLICA_STICKY_COOKIE = 'read_primary'
+
 REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
 REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD', '')  # Get password from environment
@@ -233,6 +309,37 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache Configuration
+# Redis is shared by every worker; the in-process cache is only meant for
+# local development and tests. Both count hits and misses for the Prometheus
+# metrics (user/cache_backends.py).
+if os.getenv('CACHE_BACKEND', 'redis' if os.getenv('DB_ENGINE') else 'locmem') == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'user.cache_backends.MetricsRedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'course_app',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'user.cache_backends.MetricsLocMemCache',
+        }
+    }
+
+# Seconds a user's subscription feed stays cached (0 disables the cache)
+MY_SUBSCRIPTIONS_CACHE_TIMEOUT = int(os.getenv('MY_SUBSCRIPTIONS_CACHE_TIMEOUT', 60))
+
+# Home feed: run sections in parallel threads and cut off slow ones (seconds)
+HOME_FEED_CONCURRENT = os.getenv('HOME_FEED_CONCURRENT', 'True').lower() == 'true'
+HOME_FEED_SECTION_TIMEOUT = float(os.getenv('HOME_FEED_SECTION_TIMEOUT', 2.0))
+
+# Async views: run independent query groups in worker threads with their own connection
+ASYNC_VIEWS_CONCURRENT = os.getenv('ASYNC_VIEWS_CONCURRENT', 'True').lower() == 'true'
+# Concurrent query groups (so connections) per async view request
+ASYNC_SERIALIZE_BATCHES = int(os.getenv('ASYNC_SERIALIZE_BATCHES', 3))
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -402,6 +509,52 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Storage of course videos and PDFs (see user/storage.py):
+# 'filesystem' keeps one file per upload, 'content_addressed' stores each
+# distinct file once under media/blobs/ with reference counting
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 'filesystem')
+COURSE_MEDIA_BACKENDS = {
+    'filesystem': 'django.core.files.storage.FileSystemStorage',
+    'content_addressed': 'user.storage.ContentAddressedStorage',
+    's3': 'user.storage_s3.PresignedS3Storage',
+}
+
+# Lifetime (s) of presigned GET URLs, and how long before expiry a cached one is renewed
+PRESIGNED_URL_EXPIRE = int(os.getenv('PRESIGNED_URL_EXPIRE', 900))
+PRESIGNED_URL_CACHE_MARGIN = int(os.getenv('PRESIGNED_URL_CACHE_MARGIN', 120))
+
+# S3-compatible object store used when MEDIA_STORAGE=s3 (MinIO in docker-compose)
+S3_STORAGE_OPTIONS = {
+    'bucket_name': os.getenv('S3_BUCKET_NAME', 'course-media'),
+    'endpoint_url': os.getenv('S3_ENDPOINT_URL') or None,
+    'public_endpoint_url': os.getenv('S3_PUBLIC_ENDPOINT_URL') or None,
+    'access_key': os.getenv('S3_ACCESS_KEY_ID'),
+    'secret_key': os.getenv('S3_SECRET_ACCESS_KEY'),
+    'region_name': os.getenv('S3_REGION_NAME', 'us-east-1'),
+    'addressing_style': os.getenv('S3_ADDRESSING_STYLE', 'path'),
+    'signature_version': 's3v4',
+    'querystring_auth': True,
+    'querystring_expire': PRESIGNED_URL_EXPIRE,
+    'file_overwrite': False,
+    'default_acl': None,
+}
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'course_media': {
+        'BACKEND': COURSE_MEDIA_BACKENDS[MEDIA_STORAGE],
+        'OPTIONS': S3_STORAGE_OPTIONS if MEDIA_STORAGE == 's3' else {},
+    },
+}
+
+# Direct (presigned) uploads: lifetime of the upload URL and size limits in bytes
+DIRECT_UPLOAD_EXPIRE = int(os.getenv('DIRECT_UPLOAD_EXPIRE', 3600))
+DIRECT_UPLOAD_MAX_SIZE = {
+    'pdf': int(os.getenv('DIRECT_UPLOAD_MAX_PDF_SIZE', 200 * 1024 * 1024)),
+    'video': int(os.getenv('DIRECT_UPLOAD_MAX_VIDEO_SIZE', 5 * 1024 * 1024 * 1024)),
+}
+
 # Media subfolders (optional but recommended)
 MEDIA_SUBFOLDERS = {
     'course_images': 'course_images/',
@@ -420,6 +573,78 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 CELERY_ENABLE_UTC = True
 
+CELERY_BEAT_SCHEDULE = {
+    'rebuild-course-recommendations': {
+        'task': 'user.tasks.rebuild_course_recommendations',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'rebuild-similar-courses-index': {
+        'task': 'user.tasks.rebuild_similar_courses_index',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'maintain-time-tracking': {
+        'task': 'user.tasks.maintain_time_tracking',
+        'schedule': crontab(hour=1, minute=15),
+    },
+}
+
+# Number of courses stored per user / per course by the recommendation job
+RECOMMENDATIONS_TOP_K = int(os.getenv('RECOMMENDATIONS_TOP_K', 20))
+
+# TF-IDF similar courses index (see user/similarity.py)
+SIMILARITY_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH', os.path.join(BASE_DIR, 'indexes', 'similar_courses.npz'))
+SIMILARITY_INDEX_TOP_K = int(os.getenv('SIMILARITY_INDEX_TOP_K', 10))
+# Seconds between checks for a newer index file written by another process
+SIMILARITY_INDEX_CHECK_INTERVAL = float(os.getenv('SIMILARITY_INDEX_CHECK_INTERVAL', 5))
+
+# Seconds between checks for a newer search autocomplete index (see user/suggest.py)
+SEARCH_SUGGEST_CHECK_INTERVAL = float(os.getenv('SEARCH_SUGGEST_CHECK_INTERVAL', 2))
+
+# PDF text extraction (see user/media_processing.py)
+PDF_TEXT_MAX_CHARS = int(os.getenv('PDF_TEXT_MAX_CHARS', 1_000_000))
+READING_WORDS_PER_MINUTE = int(os.getenv('READING_WORDS_PER_MINUTE', 200))
+
+# Tracked time storage (see user/timetracking.py): read the stats from the
+# daily rollups, partitions created ahead (PostgreSQL), days rolled up again
+# for late heartbeats, and months of raw rows kept (0 = forever)
+TIME_STATS_FROM_ROLLUPS = os.getenv('TIME_STATS_FROM_ROLLUPS', 'False').lower() == 'true'
+TIME_TRACKING_PARTITIONS_AHEAD = int(os.getenv('TIME_TRACKING_PARTITIONS_AHEAD', 3))
+TIME_TRACKING_ROLLUP_RECOMPUTE_DAYS = int(os.getenv('TIME_TRACKING_ROLLUP_RECOMPUTE_DAYS', 2))
+TIME_TRACKING_RETENTION_MONTHS = int(os.getenv('TIME_TRACKING_RETENTION_MONTHS', 0))
+
+# Longest duration a single time tracking record may claim: longer or
+# negative ones are rejected by TimeTrackingRecordView
+TIME_TRACKING_MAX_DURATION_SECONDS = int(os.getenv('TIME_TRACKING_MAX_DURATION_SECONDS', 4 * 3600))
+
+# Idle seconds after which the next tracked interval starts a new learning
+# session (see user/sessionization.py)
+SESSION_IDLE_GAP_SECONDS = int(os.getenv('SESSION_IDLE_GAP_SECONDS', 300))
+
+# Seconds a cached unread notification count lives before it is counted
+# again from the database, which also bounds how long a count racing with a
+# new notification stays off by one (see user/notifications.py)
+NOTIFICATION_UNREAD_COUNT_TTL = int(os.getenv('NOTIFICATION_UNREAD_COUNT_TTL', 300))
+
+# Delay during which repeated triggers of the same background job are merged
+TASK_COALESCE_SECONDS = int(os.getenv('TASK_COALESCE_SECONDS', 30))
+
+# System health sampling (see user/health.py): seconds between samples,
+# samples kept, timeout of each Redis probe and Celery queues to watch
+HEALTH_SAMPLE_INTERVAL = float(os.getenv('HEALTH_SAMPLE_INTERVAL', 15))
+HEALTH_HISTORY_SIZE = int(os.getenv('HEALTH_HISTORY_SIZE', 60))
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', 1.0))
+HEALTH_CELERY_QUEUES = os.getenv('HEALTH_CELERY_QUEUES', 'celery').split(',')
+
+# Readiness probe (/readyz): dependencies checked, per-check timeout and
+# seconds a result is reused
+READINESS_CHECKS = os.getenv('READINESS_CHECKS', 'database,cache,channel_layer,celery_broker,media').split(',')
+READINESS_CHECK_TIMEOUT = float(os.getenv('READINESS_CHECK_TIMEOUT', 2.0))
+READINESS_CACHE_SECONDS = float(os.getenv('READINESS_CACHE_SECONDS', 5))
+
+# Widths (px) of the responsive course image variants and their encoding quality
+COURSE_IMAGE_WIDTHS = [int(width) for width in os.getenv('COURSE_IMAGE_WIDTHS', '320,640,1280').split(',')]
+COURSE_IMAGE_QUALITY = int(os.getenv('COURSE_IMAGE_QUALITY', 80))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
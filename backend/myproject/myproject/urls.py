@@ -18,11 +18,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from user.views import HealthCheckView, simple_health_check 
+from user.views import HealthCheckView, LivenessView, ReadinessView, simple_health_check 
+from user.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/health/', HealthCheckView.as_view(), name='health-check'),
+    path('livez', LivenessView.as_view(), name='livez'),
+    path('readyz', ReadinessView.as_view(), name='readyz'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include('user.urls')),
 ]
 
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_wsgi_application()
+
+# Warm the search autocomplete index of this worker
+from user.suggest import preload_suggest_index
+preload_suggest_index()
+
+# Sample system health in the background for the admin dashboard
+from user.health import start_health_sampler
+start_health_sampler()
@@ -7,4 +7,8 @@ class UserConfig(AppConfig):
     
     def ready(self):
         # Import signals to connect them
-        import user.signals
\ No newline at end of file
+        import user.signals
+
+        from .metrics import connect_celery_signals, metrics_enabled
+        if metrics_enabled():
+            connect_celery_signals()
@@ -0,0 +1,429 @@
+# user/benchmarks.py
+"""
+Endpoint benchmarks on seed_load data.
+
+run_suite() sends every endpoint of ENDPOINTS through the full middleware
+stack with the test client, authenticated by the JWT cookie like the
+frontend, and records for each one:
+- p50/p95/mean latency over the timed iterations (after a few warmup ones);
+- the number of SQL queries of a request;
+- the peak Python memory allocated by a request (tracemalloc, measured in
+  separate iterations so that tracing does not skew the latencies).
+
+Writing endpoints run inside a transaction that is rolled back, so every
+iteration sees the same data. The cache is cleared before each request: the
+numbers are those of the uncached path.
+
+The `benchmark` command seeds a fresh test database per scale point, stores
+the results as JSON and compares them with a baseline (see compare()).
+
+run_throughput() compares the sync views with their async variants in one
+ASGI worker: concurrent clients on a single event loop, where sync views
+share the worker's thread-sensitive executor.
+
+run_connection_modes() compares the latency of short requests when each one
+opens its own database connection, when threads keep theirs (CONN_MAX_AGE)
+and, on PostgreSQL, when they borrow one from a pool (DB_POOL). SQLite
+in-memory test databases are never closed: compare the modes on a file or
+PostgreSQL database (--current-db) to see the connection cost.
+"""
+import asyncio
+import io
+import json
+import statistics
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager, redirect_stdout
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from .metrics import QueryStats
+
+Endpoint = namedtuple('Endpoint', 'name url_name method role kwargs data')
+
+# kwargs and data are built from the fixture of load_fixture()
+ENDPOINTS = [
+    Endpoint('CourseList', 'course-list', 'GET', 'student', lambda f: {}, None),
+    Endpoint('CourseDetail', 'course-detail', 'GET', 'student', lambda f: {'pk': f['course'].pk}, None),
+    Endpoint('CourseContentsView', 'course-contents', 'GET', 'student', lambda f: {'pk': f['course'].pk}, None),
+    Endpoint('MySubscriptions', 'my-subscriptions', 'GET', 'student', lambda f: {}, None),
+    Endpoint(
+        'SubmitQCM', 'submit-qcm', 'POST', 'student', lambda f: {'pk': f['course'].pk},
+        lambda f: {'content_id': f['qcm_content'].pk, 'question_answers': f['answers'], 'time_taken': 120},
+    ),
+    Endpoint(
+        'TimeTrackingRecordView', 'time-tracking-record', 'POST', 'student', lambda f: {'pk': f['course'].pk},
+        lambda f: {'content_id': f['qcm_content'].pk, 'duration': 300, 'session_type': 'content'},
+    ),
+    Endpoint(
+        'GlobalSearchView', 'global-search', 'GET', 'student', lambda f: {},
+        lambda f: {'q': f['search_term']},
+    ),
+    Endpoint('AdminDashboardView', 'admin-dashboard', 'GET', 'admin', lambda f: {}, None),
+    Endpoint('CourseStatisticsView', 'course-statistics', 'GET', 'creator', lambda f: {'pk': f['course'].pk}, None),
+]
+
+BENCHMARK_ADMIN = 'bench_admin'
+
+# seed_load options of the benchmark datasets, multiplied by the scale
+SEED_OPTIONS = {'time_tracking_rows': 200_000}
+
+
+@contextmanager
+def seeded_database(scale, seed=42, **options):
+    """A fresh test database filled by seed_load at scale, destroyed on exit"""
+    from django.core.management import call_command
+
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+    try:
+        call_command('seed_load', scale=scale, seed=seed, stdout=io.StringIO(), **{**SEED_OPTIONS, **options})
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def load_fixture():
+    """
+    The objects the endpoints are called with: the busiest active subscription
+    whose course has a QCM with questions, its learner, the course creator and
+    an admin (created when the database has none).
+    """
+    from .models import CourseContent, CustomUser, Subscription
+
+    qcm_contents = CourseContent.objects.filter(
+        content_type__name='qcm', status=1, module__status=1, qcm__questions__isnull=False,
+    )
+    subscription = (
+        Subscription.objects
+        .filter(is_active=True, course__status=1, course__modules__contents__in=qcm_contents)
+        .select_related('user', 'course__creator')
+        .order_by('-total_time_spent', 'pk')
+        .first()
+    )
+    if subscription is None:
+        raise ValueError('No active subscription to a course with a QCM, run seed_load first')
+
+    course = subscription.course
+    qcm_content = qcm_contents.filter(module__course=course).order_by('module__order', 'order').first()
+    answers = {
+        str(question.pk): [option.pk for option in question.options.all() if option.is_correct]
+        for question in qcm_content.qcm.questions.prefetch_related('options')
+    }
+
+    admin = CustomUser.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+    if admin is None:
+        admin = CustomUser.objects.create_superuser(BENCHMARK_ADMIN, f'{BENCHMARK_ADMIN}@load.test', None)
+
+    return {
+        'student': subscription.user,
+        'creator': course.creator,
+        'admin': admin,
+        'course': course,
+        'qcm_content': qcm_content,
+        'answers': answers,
+        'search_term': course.title_of_course.split()[0],
+    }
+
+
+def percentile(values, fraction):
+    """Linear-interpolated percentile of values (fraction between 0 and 1)"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class EndpointRunner:
+    """Sends the requests of one endpoint with a cookie-authenticated client"""
+
+    def __init__(self, endpoint, fixture):
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        self.endpoint = endpoint
+        self.url = reverse(endpoint.url_name, kwargs=endpoint.kwargs(fixture))
+        self.data = endpoint.data(fixture) if endpoint.data else None
+        self.client = APIClient(raise_request_exception=False)
+        self.client.cookies['accessToken'] = str(AccessToken.for_user(fixture[endpoint.role]))
+
+    def request(self):
+        cache.clear()
+        # Several views print debugging output
+        with redirect_stdout(io.StringIO()), transaction.atomic():
+            if self.endpoint.method == 'GET':
+                response = self.client.get(self.url, self.data)
+            else:
+                response = self.client.generic(
+                    self.endpoint.method, self.url, json.dumps(self.data or {}), content_type='application/json'
+                )
+            transaction.set_rollback(True)
+        return response
+
+    def timed(self):
+        with ExitStack() as stack:
+            stats = QueryStats().track(stack)
+            started = time.perf_counter()
+            response = self.request()
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, stats.count
+
+    def peak_memory(self):
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            self.request()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+def measure_endpoint(endpoint, fixture, iterations=30, warmup=3, memory_iterations=3):
+    runner = EndpointRunner(endpoint, fixture)
+    for _ in range(warmup):
+        runner.request()
+
+    latencies, query_counts, statuses = [], [], set()
+    for _ in range(iterations):
+        status_code, elapsed, queries = runner.timed()
+        latencies.append(elapsed * 1000)
+        query_counts.append(queries)
+        statuses.add(status_code)
+
+    peak = max(runner.peak_memory() for _ in range(max(memory_iterations, 1)))
+    return {
+        'url': runner.url,
+        'method': endpoint.method,
+        'status': sorted(statuses),
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries': max(query_counts),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_suite(names=None, iterations=30, warmup=3, memory_iterations=3, stdout=None):
+    """{endpoint name: measurements} for the endpoints of ENDPOINTS (all by default)"""
+    endpoints = [endpoint for endpoint in ENDPOINTS if names is None or endpoint.name in names]
+    unknown = set(names or ()) - {endpoint.name for endpoint in endpoints}
+    if unknown:
+        raise ValueError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    fixture = load_fixture()
+    results = {}
+    # Measure the request path itself, not the development-only query recorder
+    with override_settings(QUERY_BUDGET_ENABLED=False):
+        for endpoint in endpoints:
+            results[endpoint.name] = measure_endpoint(endpoint, fixture, iterations, warmup, memory_iterations)
+            if stdout is not None:
+                result = results[endpoint.name]
+                stdout.write(
+                    f"  {endpoint.name:<24} p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms  "
+                    f"{result['queries']:>4} queries  {result['peak_memory_kb']:>8.1f} KiB  {result['status']}"
+                )
+    return results
+
+
+def compare(baseline, current, tolerance=0.25, query_tolerance=0, memory_tolerance=None):
+    """
+    Regressions of current against baseline, both {scale: {endpoint: measurements}}.
+    Latencies and peak memory regress when they grow by more than tolerance
+    (a fraction, memory_tolerance defaults to tolerance); query counts are
+    deterministic and regress when they grow by more than query_tolerance.
+    Endpoints missing from either side are ignored.
+    """
+    memory_tolerance = tolerance if memory_tolerance is None else memory_tolerance
+    regressions = []
+    for scale, endpoints in current.items():
+        for name, result in endpoints.items():
+            reference = baseline.get(scale, {}).get(name)
+            if not reference:
+                continue
+            for metric, allowed in (
+                ('p50_ms', reference['p50_ms'] * (1 + tolerance)),
+                ('p95_ms', reference['p95_ms'] * (1 + tolerance)),
+                ('queries', reference['queries'] + query_tolerance),
+                ('peak_memory_kb', reference['peak_memory_kb'] * (1 + memory_tolerance)),
+            ):
+                if result[metric] > allowed:
+                    regressions.append(
+                        f"{scale} {name}: {metric} {result[metric]} > {reference[metric]} (allowed {allowed:.1f})"
+                    )
+    return regressions
+
+
+# (name, sync url name, async url name, role, kwargs)
+THROUGHPUT_PAIRS = [
+    ('CourseDetail', 'course-detail', 'async-course-detail', 'student', lambda f: {'pk': f['course'].pk}),
+    ('MySubscriptions', 'my-subscriptions', 'async-my-subscriptions', 'student', lambda f: {}),
+    ('NotificationListView', 'notification-list', 'async-notification-list', 'student', lambda f: {}),
+    ('CheckSubscription', 'is-subscribed', 'async-is-subscribed', 'student', lambda f: {'pk': f['course'].pk}),
+    ('AdminDashboardView', 'admin-dashboard', 'async-admin-dashboard', 'admin', lambda f: {}),
+]
+
+
+async def measure_throughput(url, user, concurrency, requests):
+    """Requests per second of concurrency clients sending requests GETs in total"""
+    from django.test import AsyncClient
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    client = AsyncClient(raise_request_exception=False)
+    client.cookies['accessToken'] = str(AccessToken.for_user(user))
+    remaining, statuses = requests, set()
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            statuses.add((await client.get(url)).status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {'requests_per_second': round(requests / elapsed, 1), 'status': sorted(statuses)}
+
+
+def run_throughput(names=None, concurrency=16, requests=200, stdout=None):
+    """{endpoint name: {'sync': ..., 'async': ..., 'speedup': async/sync}} for THROUGHPUT_PAIRS"""
+    from asgiref.sync import async_to_sync
+
+    fixture = load_fixture()
+    results = {}
+    # Uncached responses, without the development-only query recorder
+    with override_settings(QUERY_BUDGET_ENABLED=False, MY_SUBSCRIPTIONS_CACHE_TIMEOUT=0):
+        for name, sync_name, async_name, role, kwargs in THROUGHPUT_PAIRS:
+            if names is not None and name not in names:
+                continue
+            result = {
+                variant: async_to_sync(measure_throughput)(
+                    reverse(url_name, kwargs=kwargs(fixture)), fixture[role], concurrency, requests
+                )
+                for variant, url_name in (('sync', sync_name), ('async', async_name))
+            }
+            result['speedup'] = round(
+                result['async']['requests_per_second'] / result['sync']['requests_per_second'], 2
+            )
+            results[name] = result
+            if stdout is not None:
+                stdout.write(
+                    f"  {name:<24} sync {result['sync']['requests_per_second']:>8.1f} req/s  "
+                    f"async {result['async']['requests_per_second']:>8.1f} req/s  x{result['speedup']}"
+                )
+    return results
+
+
+# Connection handling of a request: opened and closed by the request
+# (CONN_MAX_AGE=0), kept by the thread, or borrowed from a pool
+CONNECTION_MODES = {
+    'per-request': {'CONN_MAX_AGE': 0},
+    'persistent': {'CONN_MAX_AGE': 600},
+    'pooled': {'CONN_MAX_AGE': 0, 'OPTIONS': {'pool': True}},
+}
+
+
+@contextmanager
+def connection_mode(mode, pool_size):
+    """A database alias on the default database using the connection handling of mode"""
+    from django.db import connections
+
+    settings_dict = {**connections['default'].settings_dict, 'CONN_HEALTH_CHECKS': True}
+    settings_dict.update(CONNECTION_MODES[mode])
+    if mode == 'pooled':
+        settings_dict['OPTIONS'] = {
+            **connections['default'].settings_dict.get('OPTIONS', {}),
+            'pool': {'min_size': pool_size, 'max_size': pool_size, 'timeout': 30},
+        }
+
+    alias = f'benchmark_{mode}'
+    connections.settings[alias] = settings_dict
+    try:
+        yield alias
+    finally:
+        pool = getattr(connections[alias], 'pool', None)
+        connections[alias].close()
+        if pool is not None:
+            connections[alias].close_pool()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+def measure_connection_mode(mode, concurrency=8, requests=400):
+    """
+    Latency of short simulated requests (request signals around one indexed
+    query) sent by concurrency threads, connection acquisition included.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from django.core.signals import request_finished, request_started
+    from django.db import connections
+
+    from .models import Course
+
+    course_pk = Course.objects.order_by('pk').values_list('pk', flat=True).first()
+    per_thread = max(requests // concurrency, 1)
+
+    with connection_mode(mode, pool_size=max(concurrency // 2, 1)) as alias:
+        def client():
+            timings = []
+            try:
+                for _ in range(per_thread):
+                    start = time.perf_counter()
+                    request_started.send(sender=None)
+                    Course.objects.using(alias).filter(pk=course_pk).exists()
+                    request_finished.send(sender=None)
+                    timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                connections.close_all()
+            return timings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            timings = [t for result in executor.map(lambda _: client(), range(concurrency)) for t in result]
+        elapsed = time.perf_counter() - started
+
+        result = {
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'requests_per_second': round(len(timings) / elapsed, 1),
+        }
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats = pool.get_stats()
+            result['pool'] = {
+                'max_size': stats.get('pool_max'),
+                'queued': stats.get('requests_queued', 0),
+                'wait_ms': stats.get('requests_wait_ms', 0),
+                'connections_opened': stats.get('connections_num', 0),
+            }
+    return result
+
+
+def run_connection_modes(concurrency=8, requests=400, stdout=None):
+    """{mode: latency of measure_connection_mode()} for CONNECTION_MODES; pooling needs Postgres"""
+    from django.db import connection
+
+    results = {}
+    for mode in CONNECTION_MODES:
+        if mode == 'pooled' and connection.vendor != 'postgresql':
+            if stdout is not None:
+                stdout.write(f'  {mode:<12} skipped: connection pools need PostgreSQL')
+            continue
+        results[mode] = result = measure_connection_mode(mode, concurrency, requests)
+        if stdout is not None:
+            stdout.write(
+                f"  {mode:<12} p50 {result['p50_ms']:>7.3f} ms  p95 {result['p95_ms']:>7.3f} ms  "
+                f"{result['requests_per_second']:>8.1f} req/s"
+            )
+    return results
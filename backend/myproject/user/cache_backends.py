@@ -0,0 +1,33 @@
+# user/cache_backends.py
+"""
+Cache backends counting the hits and misses of get() (see user/metrics.py),
+labelled with the route or Celery task that read. settings.CACHES uses them
+in place of Django's RedisCache and LocMemCache; other caches are left as
+they are.
+"""
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from .metrics import CACHE_REQUESTS, current_route, metrics_enabled
+
+_MISSING = object()
+
+
+class MetricsCacheMixin:
+    def get(self, key, default=None, version=None):
+        if not metrics_enabled():
+            return super().get(key, default, version=version)
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            CACHE_REQUESTS.labels(current_route.get(), 'miss').inc()
+            return default
+        CACHE_REQUESTS.labels(current_route.get(), 'hit').inc()
+        return value
+
+
+class MetricsRedisCache(MetricsCacheMixin, RedisCache):
+    pass
+
+
+class MetricsLocMemCache(MetricsCacheMixin, LocMemCache):
+    pass
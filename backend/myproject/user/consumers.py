@@ -7,9 +7,10 @@ from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 from .models import Course, Subscription, CourseContent, QCM, QCMCompletion, QCMAttempt, QCMOption
 from .serializers import CourseSerializer, SubscriptionWithProgressSerializer, QCMCompletionSerializer
+from .metrics import ConsumerMetricsMixin
 
 
-class CourseConsumer(AsyncWebsocketConsumer):
+class CourseConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.course_id = self.scope['url_route']['kwargs']['course_id']
         self.course_group_name = f'course_{self.course_id}'
@@ -218,7 +219,7 @@ class CourseConsumer(AsyncWebsocketConsumer):
         try:
             return CourseContent.objects.filter(
                 id=content_id, 
-                course_id=course_id
+                module__course_id=course_id
             ).exists()
         except Exception:
             return False
@@ -245,14 +246,14 @@ class CourseConsumer(AsyncWebsocketConsumer):
                 is_active=True
             )
             
-            content = CourseContent.objects.get(id=content_id, course_id=course_id)
+            content = CourseContent.objects.get(id=content_id, module__course_id=course_id)
             
             # Add content to completed contents if not already
             if not subscription.completed_contents.filter(id=content_id).exists():
                 subscription.completed_contents.add(content)
                 
                 # Update progress percentage
-                total_contents = subscription.course.contents.count()
+                total_contents = CourseContent.objects.filter(module__course_id=course_id).count()
                 completed_count = subscription.completed_contents.count()
                 if total_contents > 0:
                     subscription.progress_percentage = (completed_count / total_contents) * 100
@@ -276,7 +277,7 @@ class CourseConsumer(AsyncWebsocketConsumer):
             
             content = CourseContent.objects.select_related('qcm').get(
                 id=content_id, 
-                course_id=course_id
+                module__course_id=course_id
             )
             
             if not hasattr(content, 'qcm') or content.qcm is None:
@@ -305,7 +306,7 @@ class CourseConsumer(AsyncWebsocketConsumer):
             # Add selected options
             selected_options = QCMOption.objects.filter(
                 id__in=selected_option_ids, 
-                qcm=qcm
+                question__qcm=qcm
             )
             attempt.selected_options.set(selected_options)
             
@@ -365,7 +366,7 @@ from .serializers import ChatMessageSerializer
 
 User = get_user_model()
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for real-time chat"""
     
     async def connect(self):
@@ -554,4 +555,65 @@ class ChatConsumer(AsyncWebsocketConsumer):
             message = ChatMessage.objects.get(id=message_id)
             return message.sender.id
         except ChatMessage.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+class NotificationConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
+    """
+    Pushes new notifications and unread count changes to the user (see
+    user/notifications.py), so that clients stop polling the unread count.
+    Course broadcasts reach the courses subscribed to when connecting.
+    """
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if self.user.is_anonymous:
+            await self.close(code=4001)
+            return
+
+        self.notification_groups = await self.get_notification_groups()
+        for group in self.notification_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+        await self.send_unread_count()
+
+    async def disconnect(self, close_code):
+        for group in getattr(self, 'notification_groups', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send(text_data=json.dumps({'type': 'error', 'message': 'Invalid JSON format'}))
+            return
+        if data.get('type') == 'unread_count_request':
+            await self.send_unread_count()
+
+    async def notification_created(self, event):
+        """A personal notification of the user or a broadcast to one of their groups"""
+        if event.get('excluded_user_id') == self.user.id:
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event['notification'],
+        }))
+        if event.get('unread_count') is not None:
+            await self.send(text_data=json.dumps({'type': 'unread_count', 'unread_count': event['unread_count']}))
+        else:
+            await self.send_unread_count()
+
+    async def unread_count_changed(self, event):
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'unread_count': event['unread_count']}))
+
+    async def send_unread_count(self):
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'unread_count': await self.get_unread_count()}))
+
+    @database_sync_to_async
+    def get_notification_groups(self):
+        from .notifications import notification_groups
+        return notification_groups(self.user)
+
+    @database_sync_to_async
+    def get_unread_count(self):
+        from .notifications import unread_count
+        return unread_count(self.user)
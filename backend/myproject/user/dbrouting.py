@@ -0,0 +1,147 @@
+# user/dbrouting.py
+"""
+Read replica routing.
+
+ReplicaRouter sends reads to the REPLICA_DATABASE_ALIAS database inside
+use_replica() blocks, and everything else to default. Designated read-only
+views (ReplicaReadMixin: the admin analytics views) and analytics Celery
+tasks run in such a block; without a replica alias configured, everything
+stays on default.
+
+Read-your-writes:
+- within a request or task, reads go back to default after its first write;
+- ReplicaStickinessMiddleware sets the REPLICA_STICKY_COOKIE cookie on the
+  response of a request that wrote, for REPLICA_STICKY_SECONDS (longer than
+  the replication lag). Requests carrying the cookie, or the
+  X-Read-Your-Writes header for clients without cookies, read from default.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_HEADER = 'X-Read-Your-Writes'
+
+_state = ContextVar('replica_state', default=None)
+
+
+class ReplicaState:
+    """Routing state of the current request or task"""
+
+    def __init__(self, enabled, parent=None):
+        self.enabled = enabled
+        self.parent = parent
+        self.wrote = False
+
+    def mark_write(self):
+        state = self
+        while state is not None:
+            state.wrote = True
+            state = state.parent
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Reads of the block go to the replica (until the block writes)"""
+    state = ReplicaState(enabled, parent=_state.get())
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def sticky_cookie():
+    return getattr(settings, 'REPLICA_STICKY_COOKIE', 'read_primary')
+
+
+def reads_own_writes(request):
+    """Whether the client wrote recently and must read from default"""
+    return bool(request.COOKIES.get(sticky_cookie()) or request.headers.get(STICKY_HEADER))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.enabled and not state.wrote:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.mark_write()
+        # Explicit: Django would otherwise save an instance read from the
+        # replica back to the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from replication
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Tracks the writes of each request and makes its client read from default for a while"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with use_replica(enabled=False) as state:
+            response = self.get_response(request)
+        return self.stick(request, response, state)
+
+    async def __acall__(self, request):
+        # The state is shared with the sync thread through the context
+        with use_replica(enabled=False) as state:
+            response = await self.get_response(request)
+        return self.stick(request, response, state)
+
+    def stick(self, request, response, state):
+        if state.wrote or (request.method not in SAFE_METHODS and response.status_code < 400):
+            response.set_cookie(
+                sticky_cookie(), '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class ReplicaReadMixin:
+    """View mixin: safe requests read from the replica unless the client reads its own writes"""
+
+    def dispatch(self, request, *args, **kwargs):
+        handler = super().dispatch
+        if request.method not in SAFE_METHODS or reads_own_writes(request):
+            return handler(request, *args, **kwargs)
+
+        if getattr(self, 'view_is_async', False):
+            async def dispatch_on_replica():
+                with use_replica():
+                    return await handler(request, *args, **kwargs)
+            return dispatch_on_replica()
+
+        with use_replica():
+            return handler(request, *args, **kwargs)
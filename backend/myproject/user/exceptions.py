@@ -2,8 +2,10 @@
 from rest_framework.views import exception_handler
 from rest_framework.exceptions import AuthenticationFailed
 from django.http import JsonResponse
+from .metrics import record_api_exception
 
 def custom_exception_handler(exc, context):
+    record_api_exception(exc, context)
     response = exception_handler(exc, context)
     
     if isinstance(exc, AuthenticationFailed) and 'Token expired' in str(exc):
@@ -0,0 +1,286 @@
+# user/health.py
+"""
+System health: background sampling for the admin dashboard and the
+readiness checks of /readyz.
+
+A daemon thread per server process takes a sample every HEALTH_SAMPLE_INTERVAL
+seconds (CPU, memory, disk, database size, active sessions, Redis and Celery
+queue depth, database pool use) and keeps the last HEALTH_HISTORY_SIZE samples in a ring buffer.
+SystemHealthView only reads the buffer, so it answers instantly and never
+blocks on psutil or on live queries.
+
+/readyz runs one check per dependency (database, cache, channel layer, Celery
+broker, media volume) concurrently, each bounded by READINESS_CHECK_TIMEOUT,
+and reuses the result for READINESS_CACHE_SECONDS.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psutil
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+from .metrics import record_pool_stats
+
+logger = logging.getLogger(__name__)
+
+_samples = deque(maxlen=getattr(settings, 'HEALTH_HISTORY_SIZE', 60))
+_sampler_thread = None
+_last_sampled_at = None
+_cpu_primed = False
+_lock = threading.Lock()
+
+
+def database_size():
+    """Size of the default database in bytes, None when unknown"""
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        name = settings.DATABASES['default']['NAME']
+        return os.path.getsize(name) if os.path.exists(str(name)) else None
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute("SELECT pg_database_size(current_database())")
+        elif vendor == 'mysql':
+            cursor.execute(
+                "SELECT SUM(data_length + index_length) FROM information_schema.tables "
+                "WHERE table_schema = DATABASE()"
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def active_sessions():
+    from django.contrib.sessions.models import Session
+    return Session.objects.filter(expire_date__gt=timezone.now()).count()
+
+
+def redis_client(url):
+    import redis
+    timeout = getattr(settings, 'HEALTH_PROBE_TIMEOUT', 1.0)
+    return redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+
+def redis_stats():
+    info = redis_client(settings.REDIS_URL).info()
+    return {
+        'used_memory': info.get('used_memory'),
+        'connected_clients': info.get('connected_clients'),
+        'ops_per_sec': info.get('instantaneous_ops_per_sec'),
+    }
+
+
+def celery_queue_depth():
+    """Messages waiting in each Celery queue (Redis broker: one list per queue)"""
+    client = redis_client(settings.CELERY_BROKER_URL)
+    return {queue: client.llen(queue) for queue in getattr(settings, 'HEALTH_CELERY_QUEUES', ['celery'])}
+
+
+def cpu_percent():
+    """CPU use since the previous call; never sleeps (None on the very first call)"""
+    global _cpu_primed
+    value = psutil.cpu_percent(interval=None)
+    if not _cpu_primed:
+        _cpu_primed = True
+        return None
+    return value
+
+
+def take_sample():
+    """Collect one sample; a failing source is reported as None"""
+    sample = {
+        'timestamp': timezone.now().isoformat(),
+        'cpu_percent': cpu_percent(),
+    }
+
+    memory = psutil.virtual_memory()
+    sample['memory'] = {
+        'total': memory.total, 'available': memory.available, 'used': memory.used, 'percent': memory.percent,
+    }
+    disk = psutil.disk_usage('/')
+    sample['disk'] = {'total': disk.total, 'used': disk.used, 'free': disk.free, 'percent': disk.percent}
+
+    for name, source in (
+        ('database_size', database_size),
+        ('active_sessions', active_sessions),
+        ('redis', redis_stats),
+        ('celery_queues', celery_queue_depth),
+        ('db_pool', record_pool_stats),
+    ):
+        try:
+            sample[name] = source()
+        except Exception as e:
+            logger.warning(f"Health sample: {name} unavailable: {str(e)}")
+            sample[name] = None
+    return sample
+
+
+def record_sample():
+    global _last_sampled_at
+    sample = take_sample()
+    _samples.append(sample)
+    _last_sampled_at = time.monotonic()
+    return sample
+
+
+def _sample_forever():
+    interval = getattr(settings, 'HEALTH_SAMPLE_INTERVAL', 15)
+    while True:
+        started = time.monotonic()
+        try:
+            record_sample()
+        except Exception as e:
+            logger.error(f"Health sampling failed: {str(e)}")
+        finally:
+            connections.close_all()
+        time.sleep(max(interval - (time.monotonic() - started), 0.1))
+
+
+def start_health_sampler():
+    """Start the sampling thread of this server process (idempotent)"""
+    global _sampler_thread
+    with _lock:
+        if _sampler_thread is not None and _sampler_thread.is_alive():
+            return
+        # The first cpu_percent() call only sets the reference point
+        cpu_percent()
+        _sampler_thread = threading.Thread(target=_sample_forever, name='health-sampler', daemon=True)
+        _sampler_thread.start()
+
+
+def sampler_running():
+    return _sampler_thread is not None and _sampler_thread.is_alive()
+
+
+def get_health_samples():
+    """
+    Samples of the ring buffer, oldest first. Processes without the sampling
+    thread (management commands, tests) take a sample when the latest one is
+    older than the sampling interval.
+    """
+    if not sampler_running():
+        with _lock:
+            interval = getattr(settings, 'HEALTH_SAMPLE_INTERVAL', 15)
+            if _last_sampled_at is None or time.monotonic() - _last_sampled_at >= interval:
+                record_sample()
+    return list(_samples)
+
+
+# ============================================================================
+# Readiness checks (/readyz)
+# ============================================================================
+
+_readiness = None
+_readiness_checked_at = None
+_readiness_lock = threading.Lock()
+
+
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def check_cache():
+    from django.core.cache import cache
+    token = str(time.monotonic())
+    cache.set('readyz:probe', token, timeout=30)
+    if cache.get('readyz:probe') != token:
+        raise RuntimeError("value written to the cache could not be read back")
+
+
+def check_channel_layer():
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    layer = get_channel_layer()
+    if layer is None:
+        raise RuntimeError("no channel layer configured")
+
+    async def round_trip():
+        channel = await layer.new_channel()
+        await layer.send(channel, {'type': 'readyz.probe'})
+        return await layer.receive(channel)
+
+    if async_to_sync(round_trip)().get('type') != 'readyz.probe':
+        raise RuntimeError("message sent to the channel layer was not received")
+
+
+def check_celery_broker():
+    from myproject.celery import app
+    with app.connection_for_write() as broker:
+        broker.ensure_connection(max_retries=1, timeout=getattr(settings, 'HEALTH_PROBE_TIMEOUT', 1.0))
+
+
+def check_media():
+    import tempfile
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT, prefix='.readyz-') as probe:
+        probe.write(b'ok')
+        probe.flush()
+
+
+READINESS_CHECKS = {
+    'database': check_database,
+    'cache': check_cache,
+    'channel_layer': check_channel_layer,
+    'celery_broker': check_celery_broker,
+    'media': check_media,
+}
+
+
+def _timed_check(check):
+    started = time.perf_counter()
+    try:
+        check()
+        result = {'status': 'ok'}
+    except Exception as e:
+        result = {'status': 'error', 'error': str(e)}
+    finally:
+        connections.close_all()
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def run_readiness_checks():
+    """Run the enabled checks concurrently; a check slower than the timeout fails"""
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    names = [name for name in getattr(settings, 'READINESS_CHECKS', READINESS_CHECKS) if name in READINESS_CHECKS]
+    timeout = getattr(settings, 'READINESS_CHECK_TIMEOUT', 2.0)
+
+    executor = ThreadPoolExecutor(max_workers=max(len(names), 1), thread_name_prefix='readyz')
+    futures = {name: executor.submit(_timed_check, READINESS_CHECKS[name]) for name in names}
+    wait(futures.values(), timeout=timeout)
+    # Don't wait for hung checks: their threads end with their socket timeouts
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    checks = {
+        name: future.result() if future.done() else {'status': 'timeout', 'duration_ms': timeout * 1000}
+        for name, future in futures.items()
+    }
+    return {
+        'status': 'ready' if all(check['status'] == 'ok' for check in checks.values()) else 'not_ready',
+        'checks': checks,
+        'checked_at': timezone.now().isoformat(),
+    }
+
+
+def get_readiness():
+    """
+    Readiness of this process, cached for READINESS_CACHE_SECONDS so frequent
+    probes share one run of the checks. Returns (result, cached).
+    """
+    global _readiness, _readiness_checked_at
+    max_age = getattr(settings, 'READINESS_CACHE_SECONDS', 5)
+
+    with _readiness_lock:
+        if _readiness is not None and time.monotonic() - _readiness_checked_at < max_age:
+            return _readiness, True
+        _readiness = run_readiness_checks()
+        _readiness_checked_at = time.monotonic()
+        return _readiness, False
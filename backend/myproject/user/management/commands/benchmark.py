@@ -0,0 +1,153 @@
+# user/management/commands/benchmark.py
+import json
+import os
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from user.benchmarks import ENDPOINTS, compare, run_connection_modes, run_suite, run_throughput, seeded_database
+
+
+def benchmark_dir():
+    return str(getattr(settings, 'BENCHMARK_DIR', os.path.join(settings.BASE_DIR, 'benchmarks')))
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the hot endpoints on seed_load data at several scales, store the results as JSON '
+        'and fail when they regress from a baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='0.05,0.2',
+                            help='Comma-separated seed_load scales, each seeded in a fresh test database')
+        parser.add_argument('--current-db', action='store_true',
+                            help='Benchmark the data of the configured database instead of seeding')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--endpoints', help=f"Comma-separated subset of: {', '.join(e.name for e in ENDPOINTS)}")
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--memory-iterations', type=int, default=3)
+        parser.add_argument('--output', help='Results file (default BENCHMARK_DIR/results.json)')
+        parser.add_argument('--baseline', help='Baseline file (default BENCHMARK_DIR/baseline.json)')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative growth of latencies and peak memory')
+        parser.add_argument('--query-tolerance', type=int, default=0,
+                            help='Allowed growth of query counts')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Store the results as the new baseline instead of comparing')
+        parser.add_argument('--throughput', action='store_true',
+                            help='Also compare the throughput of one ASGI worker on the sync and async views')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients of --throughput')
+        parser.add_argument('--throughput-requests', type=int, default=200)
+        parser.add_argument('--connections', action='store_true',
+                            help='Also compare per-request, persistent and pooled database connections')
+        parser.add_argument('--connection-concurrency', type=int, default=8)
+        parser.add_argument('--connection-requests', type=int, default=400)
+
+    def handle(self, *args, **options):
+        names = options['endpoints'].split(',') if options['endpoints'] else None
+        output = options['output'] or os.path.join(benchmark_dir(), 'results.json')
+        baseline_path = options['baseline'] or os.path.join(benchmark_dir(), 'baseline.json')
+        run = dict(
+            names=names, iterations=options['iterations'], warmup=options['warmup'],
+            memory_iterations=options['memory_iterations'], stdout=self.stdout,
+        )
+
+        if options['throughput']:
+            run['throughput'] = dict(
+                names=names, concurrency=options['concurrency'], requests=options['throughput_requests'],
+                stdout=self.stdout,
+            )
+
+        if options['connections']:
+            run['connections'] = dict(
+                concurrency=options['connection_concurrency'], requests=options['connection_requests'],
+                stdout=self.stdout,
+            )
+
+        results, throughput, connection_modes = {}, {}, {}
+        # A local cache: the benchmark clears it before every request
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            try:
+                if options['current_db']:
+                    self.stdout.write('Current database')
+                    results['current'], throughput['current'], connection_modes['current'] = self.measure(run)
+                else:
+                    for scale in self.parse_scales(options['scales']):
+                        key = f'scale={scale:g}'
+                        results[key], throughput[key], connection_modes[key] = self.run_scale(
+                            scale, options['seed'], run
+                        )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'python': platform.python_version(),
+                'machine': platform.node(),
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        if options['throughput']:
+            report['throughput'] = throughput
+        if options['connections']:
+            report['connections'] = connection_modes
+        self.write_json(output, report)
+        self.stdout.write(f'Results written to {output}')
+
+        if options['update_baseline']:
+            self.write_json(baseline_path, report)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+            return
+
+        if not os.path.exists(baseline_path):
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}, nothing to compare'))
+            return
+        with open(baseline_path) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(baseline, results, options['tolerance'], options['query_tolerance'])
+        if regressions:
+            raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regression against the baseline'))
+
+    def parse_scales(self, value):
+        try:
+            return [float(scale) for scale in value.split(',') if scale.strip()]
+        except ValueError:
+            raise CommandError(f'Invalid --scales {value!r}')
+
+    def run_scale(self, scale, seed, run):
+        """Seed a fresh test database at scale and benchmark it"""
+        self.stdout.write(f'Scale {scale:g}: seeding')
+        with seeded_database(scale, seed):
+            self.stdout.write(f'Scale {scale:g}: measuring')
+            return self.measure(run)
+
+    def measure(self, run):
+        """(endpoint results, throughput results or None, connection mode results or None)"""
+        run = dict(run)
+        throughput = run.pop('throughput', None)
+        connections = run.pop('connections', None)
+        results = run_suite(**run)
+        throughput_results = connection_results = None
+        if throughput is not None:
+            self.stdout.write('Throughput of one ASGI worker, sync vs async views')
+            throughput_results = run_throughput(**throughput)
+        if connections is not None:
+            self.stdout.write('Request latency by database connection handling')
+            connection_results = run_connection_modes(**connections)
+        return results, throughput_results, connection_results
+
+    def write_json(self, path, data):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
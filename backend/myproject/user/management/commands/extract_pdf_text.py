@@ -0,0 +1,28 @@
+# user/management/commands/extract_pdf_text.py
+from django.core.management.base import BaseCommand
+
+from user.models import PDFContent
+from user.media_processing import extract_pdf_text
+
+
+class Command(BaseCommand):
+    help = 'Extract text, page count and reading time of PDFs uploaded before background extraction existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-extract PDFs that already have text')
+
+    def handle(self, *args, **options):
+        pdfs = PDFContent.objects.exclude(pdf_file='')
+        if not options['all']:
+            pdfs = pdfs.filter(text_index__isnull=True)
+
+        processed = failed = 0
+        for pdf_id in pdfs.values_list('id', flat=True).iterator():
+            try:
+                extract_pdf_text(pdf_id)
+                processed += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'PDF {pdf_id}: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Extracted {processed} PDFs ({failed} failed)'))
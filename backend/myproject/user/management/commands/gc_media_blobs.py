@@ -0,0 +1,115 @@
+# user/management/commands/gc_media_blobs.py
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from user.models import MediaBlob, PDFContent, VideoContent
+from user.storage import BLOB_PREFIX, course_media_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs that no video or PDF references anymore'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=int, default=24,
+            help='Keep unreferenced blobs saved more recently than this (uploads still being attached)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report without deleting')
+
+    def count_references(self):
+        """Actual references per blob name, read from the file fields"""
+        references = {}
+        for model, field in ((VideoContent, 'video_file'), (PDFContent, 'pdf_file')):
+            for row in model.objects.filter(
+                **{f'{field}__startswith': f'{BLOB_PREFIX}/'}
+            ).values(field).annotate(total=Count('id')).order_by():
+                references[row[field]] = references.get(row[field], 0) + row['total']
+        return references
+
+    def is_referenced(self, name):
+        return (
+            VideoContent.objects.filter(video_file=name).exists()
+            or PDFContent.objects.filter(pdf_file=name).exists()
+        )
+
+    def handle(self, *args, **options):
+        storage = course_media_storage()
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        # A snapshot picking the candidates: each one is checked again under
+        # the lock of its row, which uploads and reference updates also take
+        references = self.count_references()
+
+        # Counters drift if a signal was skipped (bulk operations, raw SQL)
+        fixed = 0
+        for blob in MediaBlob.objects.iterator():
+            if blob.ref_count == references.get(blob.name, 0):
+                continue
+            if dry_run:
+                fixed += 1
+                continue
+            with transaction.atomic():
+                locked = MediaBlob.objects.select_for_update().filter(pk=blob.pk).first()
+                if locked is None:
+                    continue
+                actual = sum(
+                    model.objects.filter(**{field: locked.name}).count()
+                    for model, field in ((VideoContent, 'video_file'), (PDFContent, 'pdf_file'))
+                )
+                # Only if no update happened since the row was read
+                fixed += MediaBlob.objects.filter(pk=locked.pk, ref_count=locked.ref_count).exclude(
+                    ref_count=actual
+                ).update(ref_count=actual)
+
+        deleted = freed = 0
+        for blob in MediaBlob.objects.filter(last_uploaded_at__lt=cutoff).iterator():
+            if references.get(blob.name, 0):
+                continue
+            if dry_run:
+                deleted += 1
+                freed += blob.size
+                continue
+            with transaction.atomic():
+                locked = MediaBlob.objects.select_for_update().filter(
+                    pk=blob.pk, last_uploaded_at__lt=cutoff
+                ).first()
+                # Saved again or referenced since the snapshot
+                if locked is None or self.is_referenced(locked.name):
+                    continue
+                storage.delete(locked.name)
+                locked.delete()
+            deleted += 1
+            freed += locked.size
+
+        # Files left behind by interrupted uploads or lost rows
+        orphans = 0
+        known = set(MediaBlob.objects.values_list('name', flat=True))
+        try:
+            blobs_root = storage.path(BLOB_PREFIX)
+        except (AttributeError, NotImplementedError):
+            # Remote storage (MEDIA_STORAGE=s3): no local files to scan
+            blobs_root = None
+        if blobs_root and os.path.isdir(blobs_root):
+            for directory, _, filenames in os.walk(blobs_root):
+                for filename in filenames:
+                    path = os.path.join(directory, filename)
+                    name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                    # Files still referenced are never orphans, row or not
+                    if name in known or name in references:
+                        continue
+                    if os.path.getmtime(path) > cutoff.timestamp():
+                        continue
+                    orphans += 1
+                    if not dry_run:
+                        os.remove(path)
+
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Fixed {fixed} reference counts, deleted {deleted} blobs '
+            f'({freed / 1024 / 1024:.1f} MB) and {orphans} orphan files'
+        ))
@@ -0,0 +1,367 @@
+# user/management/commands/seed_load.py
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from user.models import (
+    DEPARTMENT_CHOICES, ContentType, Course, CourseContent, CustomUser, Module, PDFContent, QCM,
+    QCMAttempt, QCMCompletion, QCMOption, QCMQuestion, Subscription, TimeTracking, VideoContent,
+)
+from user.sessionization import backfill_sessions
+
+# Share of each content kind and of formateurs among generated users
+CONTENT_KINDS = (('video', 0.40), ('pdf', 0.35), ('qcm', 0.25))
+FORMATEUR_SHARE = 0.05
+# Share of a user's subscriptions taken in their own department
+OWN_DEPARTMENT_SHARE = 0.7
+
+WORDS = (
+    'introduction', 'advanced', 'budget', 'compliance', 'leadership', 'sales', 'negotiation', 'excel',
+    'reporting', 'safety', 'quality', 'marketing', 'digital', 'strategy', 'finance', 'recruitment',
+    'onboarding', 'production', 'logistics', 'customer', 'analytics', 'management', 'communication',
+    'project', 'risk', 'audit', 'planning', 'training', 'security', 'performance',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate load-test data (users, courses, contents, QCMs, subscriptions, attempts and '
+        'time tracking) with bulk inserts and a seeded random generator, then rebuild the '
+        'learning sessions and subscription times from the time tracking'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplies users, courses and time tracking rows')
+        parser.add_argument('--users-per-department', type=int, default=200)
+        parser.add_argument('--courses', type=int, default=100)
+        parser.add_argument('--modules-per-course', type=int, default=5)
+        parser.add_argument('--contents-per-module', type=int, default=6)
+        parser.add_argument('--questions-per-qcm', type=int, default=5)
+        parser.add_argument('--options-per-question', type=int, default=4)
+        parser.add_argument('--subscriptions-per-user', type=int, default=8)
+        parser.add_argument('--time-tracking-rows', type=int, default=1_000_000)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='load_', help='Prefix of generated usernames')
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete the data generated earlier with the same prefix first')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(f'{connection.vendor} does not return primary keys from bulk inserts')
+
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.prefix = options['prefix']
+        self.now = timezone.now()
+        scale = options['scale']
+
+        if options['flush']:
+            self.flush()
+        elif CustomUser.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f'Users prefixed {self.prefix!r} already exist, use --flush or another --prefix')
+
+        started = time.monotonic()
+        users = self.step('users', self.create_users, max(1, round(options['users_per_department'] * scale)))
+        courses = self.step('courses', self.create_courses, users, max(1, round(options['courses'] * scale)))
+        contents = self.step(
+            'modules and contents', self.create_contents, courses,
+            options['modules_per_course'], options['contents_per_module'],
+        )
+        questions = self.step(
+            'QCM questions and options', self.create_questions, contents,
+            options['questions_per_qcm'], options['options_per_question'],
+        )
+        subscriptions = self.step(
+            'subscriptions', self.create_subscriptions, users, courses, contents,
+            options['subscriptions_per_user'],
+        )
+        self.step('QCM attempts', self.create_attempts, subscriptions, contents, questions)
+        self.step(
+            'time tracking', self.create_time_tracking, subscriptions, contents,
+            round(options['time_tracking_rows'] * scale),
+        )
+        self.step('learning sessions', self.create_sessions)
+        self.stdout.write(self.style.SUCCESS(f'Load data generated in {time.monotonic() - started:.1f}s'))
+
+    # ------------------------------------------------------------------ helpers
+
+    def step(self, label, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        count = len(result) if hasattr(result, '__len__') else result
+        self.stdout.write(f'  {label}: {count} in {time.monotonic() - started:.1f}s')
+        return result
+
+    def bulk_create(self, model, objects):
+        """Insert in chunks, each in its own transaction; objects get their pk"""
+        for start in range(0, len(objects), self.chunk_size):
+            with transaction.atomic():
+                model.objects.bulk_create(objects[start:start + self.chunk_size])
+        return objects
+
+    def bulk_insert_stream(self, model, rows):
+        """Insert objects produced by an iterator without keeping them all in memory"""
+        count, chunk = 0, []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                count += len(self.bulk_create(model, chunk))
+                chunk = []
+        return count + len(self.bulk_create(model, chunk))
+
+    def title(self, words=3):
+        return ' '.join(self.rng.sample(WORDS, words)).capitalize()
+
+    def past(self, days):
+        return self.now - timedelta(seconds=self.rng.randint(0, days * 86400))
+
+    def flush(self):
+        users = CustomUser.objects.filter(username__startswith=self.prefix)
+        # Deleting the creators cascades to their courses and everything below
+        deleted, _ = users.delete()
+        self.stdout.write(f'  flushed {deleted} rows')
+
+    # ------------------------------------------------------------------ steps
+
+    def create_users(self, per_department):
+        password = make_password('loadtest')
+        users = [
+            CustomUser(
+                username=f'{self.prefix}{department.lower()}_{number}',
+                email=f'{self.prefix}{department.lower()}_{number}@load.test',
+                first_name=self.rng.choice(WORDS).capitalize(),
+                last_name=self.rng.choice(WORDS).capitalize(),
+                password=password,
+                department=department,
+                privilege='F' if self.rng.random() < FORMATEUR_SHARE or number == 0 else 'AP',
+                date_joined=self.past(730),
+            )
+            for department, _ in DEPARTMENT_CHOICES
+            for number in range(per_department)
+        ]
+        return self.bulk_create(CustomUser, users)
+
+    def create_courses(self, users, count):
+        creators = {}
+        for user in users:
+            if user.privilege == 'F':
+                creators.setdefault(user.department, []).append(user)
+        departments = list(creators)
+
+        courses = []
+        for _ in range(count):
+            department = self.rng.choice(departments)
+            courses.append(Course(
+                title_of_course=self.title(),
+                description=' '.join(self.rng.choices(WORDS, k=30)),
+                department=department,
+                creator=self.rng.choice(creators[department]),
+                status=1 if self.rng.random() < 0.85 else self.rng.choice((0, 2)),
+                created_at=self.past(365),
+            ))
+        return self.bulk_create(Course, courses)
+
+    def create_contents(self, courses, modules_per_course, contents_per_module):
+        """Returns {course id: [(content id, module id, kind, qcm id)]}"""
+        content_types = {kind: ContentType.objects.get_or_create(name=kind)[0] for kind, _ in CONTENT_KINDS}
+        kinds, weights = zip(*CONTENT_KINDS)
+
+        modules = self.bulk_create(Module, [
+            Module(course=course, title=self.title(2), order=order, status=1 if self.rng.random() < 0.9 else 0)
+            for course in courses
+            for order in range(1, modules_per_course + 1)
+        ])
+        contents = self.bulk_create(CourseContent, [
+            CourseContent(
+                module=module,
+                content_type=content_types[kind],
+                title=self.title(2),
+                caption=self.title(4),
+                order=order,
+                status=1 if self.rng.random() < 0.95 else 0,
+                estimated_duration=self.rng.randint(2, 45),
+            )
+            for module in modules
+            for order, kind in enumerate(self.rng.choices(kinds, weights, k=contents_per_module), start=1)
+        ])
+
+        videos, pdfs, qcms = [], [], []
+        for content in contents:
+            kind = content.content_type.name
+            if kind == 'video':
+                videos.append(VideoContent(
+                    course_content=content, video_file=f'videos/load/{content.pk}.mp4',
+                    duration=self.rng.randint(60, 3600), width=1280, height=720,
+                ))
+            elif kind == 'pdf':
+                page_count = self.rng.randint(1, 80)
+                pdfs.append(PDFContent(
+                    course_content=content, pdf_file=f'pdfs/load/{content.pk}.pdf',
+                    page_count=page_count, estimated_reading_time=page_count * 2,
+                ))
+            else:
+                qcms.append(QCM(course_content=content, title=content.title, passing_score=self.rng.choice((60, 70, 80))))
+        self.bulk_create(VideoContent, videos)
+        self.bulk_create(PDFContent, pdfs)
+        self.bulk_create(QCM, qcms)
+
+        qcm_ids = {qcm.course_content_id: qcm.pk for qcm in qcms}
+        course_of_module = {module.pk: module.course_id for module in modules}
+        by_course = {course.pk: [] for course in courses}
+        for content in contents:
+            by_course[course_of_module[content.module_id]].append(
+                (content.pk, content.module_id, content.content_type.name, qcm_ids.get(content.pk))
+            )
+        return by_course
+
+    def create_questions(self, contents, questions_per_qcm, options_per_question):
+        """Returns {qcm id: [(correct option id, [option ids])]}"""
+        qcm_ids = [qcm_id for items in contents.values() for _, _, _, qcm_id in items if qcm_id]
+        questions = self.bulk_create(QCMQuestion, [
+            QCMQuestion(qcm_id=qcm_id, question=f'{self.title(5)}?', order=order, points=self.rng.randint(1, 3))
+            for qcm_id in qcm_ids
+            for order in range(1, questions_per_qcm + 1)
+        ])
+
+        options = []
+        for question in questions:
+            correct = self.rng.randrange(options_per_question)
+            options.extend(
+                QCMOption(question=question, text=self.title(2), is_correct=order == correct, order=order)
+                for order in range(options_per_question)
+            )
+        self.bulk_create(QCMOption, options)
+
+        by_question = {}
+        for option in options:
+            by_question.setdefault(option.question_id, []).append(option)
+        by_qcm = {qcm_id: [] for qcm_id in qcm_ids}
+        for question in questions:
+            question_options = by_question[question.pk]
+            correct = next(option.pk for option in question_options if option.is_correct)
+            by_qcm[question.qcm_id].append((correct, [option.pk for option in question_options]))
+        return by_qcm
+
+    def create_subscriptions(self, users, courses, contents, per_user):
+        active = {}
+        for course in courses:
+            if course.status == 1:
+                active.setdefault(course.department, []).append(course)
+        every_course = [course for department_courses in active.values() for course in department_courses]
+
+        subscriptions = []
+        for user in users:
+            own = active.get(user.department, [])
+            chosen = {}
+            for _ in range(min(per_user, len(every_course))):
+                pool = own if own and self.rng.random() < OWN_DEPARTMENT_SHARE else every_course
+                course = self.rng.choice(pool)
+                chosen[course.pk] = course
+            for course in chosen.values():
+                subscribed_at = max(course.created_at, user.date_joined) + timedelta(days=self.rng.randint(0, 60))
+                subscription = Subscription(user=user, course=course, is_active=self.rng.random() < 0.95)
+                subscription._subscribed_at = min(subscribed_at, self.now)
+                subscriptions.append(subscription)
+        self.bulk_create(Subscription, subscriptions)
+
+        # subscribed_at is auto_now_add: spread it over time afterwards
+        for start in range(0, len(subscriptions), self.chunk_size):
+            chunk = subscriptions[start:start + self.chunk_size]
+            for subscription in chunk:
+                subscription.subscribed_at = subscription._subscribed_at
+            with transaction.atomic():
+                Subscription.objects.bulk_update(chunk, ['subscribed_at'])
+
+        # Completed contents: a prefix of the course, as learners progress in order
+        Completed = Subscription.completed_contents.through
+        completed_rows = []
+        for subscription in subscriptions:
+            items = contents[subscription.course_id]
+            done = int(len(items) * self.rng.betavariate(1.2, 1.5))
+            subscription._completed = items[:done]
+            subscription.progress_percentage = round(done / len(items) * 100, 2) if items else 0.0
+            subscription.is_completed = bool(items) and done == len(items)
+            subscription.completed_at = self.now if subscription.is_completed else None
+            completed_rows.extend(
+                Completed(subscription_id=subscription.pk, coursecontent_id=content_id)
+                for content_id, _, _, _ in subscription._completed
+            )
+        self.bulk_create(Completed, completed_rows)
+        for start in range(0, len(subscriptions), self.chunk_size):
+            with transaction.atomic():
+                Subscription.objects.bulk_update(
+                    subscriptions[start:start + self.chunk_size],
+                    ['progress_percentage', 'is_completed', 'completed_at'],
+                )
+        return subscriptions
+
+    def create_attempts(self, subscriptions, contents, questions):
+        completions, attempts, selections = [], [], []
+        for subscription in subscriptions:
+            for _, _, kind, qcm_id in subscription._completed:
+                if kind != 'qcm' or not questions.get(qcm_id):
+                    continue
+                best, attempt_count = 0.0, self.rng.randint(1, 3)
+                for number in range(1, attempt_count + 1):
+                    chosen = [
+                        correct if self.rng.random() < 0.7 else self.rng.choice(option_ids)
+                        for correct, option_ids in questions[qcm_id]
+                    ]
+                    score = round(
+                        sum(option_id == correct for option_id, (correct, _) in zip(chosen, questions[qcm_id]))
+                        / len(chosen) * 100, 2
+                    )
+                    best = max(best, score)
+                    attempt = QCMAttempt(
+                        user_id=subscription.user_id, qcm_id=qcm_id, attempt_number=number, score=score,
+                        is_passed=score >= 70, completed_at=self.now, time_taken=self.rng.randint(30, 900),
+                    )
+                    attempt._selected = chosen
+                    attempts.append(attempt)
+                completions.append(QCMCompletion(
+                    subscription_id=subscription.pk, qcm_id=qcm_id, best_score=best,
+                    is_passed=best >= 70, attempts_count=attempt_count,
+                ))
+
+        self.bulk_create(QCMCompletion, completions)
+        self.bulk_create(QCMAttempt, attempts)
+        Selected = QCMAttempt.selected_options.through
+        for attempt in attempts:
+            selections.extend(Selected(qcmattempt_id=attempt.pk, qcmoption_id=option_id) for option_id in attempt._selected)
+        self.bulk_create(Selected, selections)
+        return attempts
+
+    def create_time_tracking(self, subscriptions, contents, count):
+        """Tracked intervals on the contents of subscribed courses"""
+        candidates = [subscription for subscription in subscriptions if contents[subscription.course_id]]
+        if not candidates:
+            return 0
+
+        def rows():
+            for _ in range(count):
+                subscription = self.rng.choice(candidates)
+                content_id, module_id, _, _ = self.rng.choice(contents[subscription.course_id])
+                duration = min(int(self.rng.lognormvariate(5.5, 1.0)) + 10, 4 * 3600)
+                span = max((self.now - subscription.subscribed_at).total_seconds() - duration, 1)
+                start = subscription.subscribed_at + timedelta(seconds=self.rng.uniform(0, span))
+                yield TimeTracking(
+                    user_id=subscription.user_id, course_id=subscription.course_id,
+                    module_id=module_id, content_id=content_id, session_type='content',
+                    start_time=start, end_time=start + timedelta(seconds=duration), duration=duration,
+                )
+
+        return self.bulk_insert_stream(TimeTracking, rows())
+
+    def create_sessions(self):
+        """
+        LearningSession rows and subscription times, as sessionize_time_tracking
+        computes them (overlapping intervals count once)
+        """
+        return backfill_sessions(chunk_size=self.chunk_size)['sessions']
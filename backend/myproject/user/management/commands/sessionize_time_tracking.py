@@ -0,0 +1,40 @@
+# user/management/commands/sessionize_time_tracking.py
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from user.sessionization import backfill_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild learning sessions from the stored time tracking and recompute the time spent '
+        'of the subscriptions. Once TIME_TRACKING_RETENTION_MONTHS has dropped raw rows, the '
+        'sessions before the retention cutoff are kept as they are'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild the sessions starting on or after this date (YYYY-MM-DD)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=100_000,
+            help='Time tracking rows merged per batch'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                day = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--since must be a date (YYYY-MM-DD)')
+            since = timezone.make_aware(datetime.combine(day, time.min))
+
+        try:
+            stats = backfill_sessions(since=since, chunk_size=options['chunk_size'], stdout=self.stdout)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {stats['records']} time tracking records into {stats['sessions']} sessions, "
+            f"updated {stats['subscriptions']} subscriptions"
+        ))
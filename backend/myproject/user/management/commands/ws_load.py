@@ -0,0 +1,53 @@
+# user/management/commands/ws_load.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.benchmarks import seeded_database
+from user.wsload import run_load
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive simulated WebSocket clients against the course and chat consumers on seed_load data and '
+        'report message latency, broadcast fan-out time and memory per connection'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.1,
+                            help='seed_load scale of the fresh test database the clients run against')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--course-connections', type=int, default=1000,
+                            help='Connections to the busiest course, cycling through its subscribers')
+        parser.add_argument('--chat-connections', type=int, default=200)
+        parser.add_argument('--messages', type=int, default=20, help='Messages of each kind per sender')
+        parser.add_argument('--senders', type=int, default=20, help='Concurrent senders')
+        parser.add_argument('--broadcasts', type=int, default=10)
+        parser.add_argument('--connect-concurrency', type=int, default=100)
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--output', help='Also write the report to this JSON file')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Seeding scale {options['scale']:g}")
+        try:
+            with seeded_database(options['scale'], options['seed'], time_tracking_rows=0):
+                self.stdout.write(
+                    f"Opening {options['course_connections']} course and {options['chat_connections']} chat connections"
+                )
+                report = run_load(
+                    course_connections=options['course_connections'],
+                    chat_connections=options['chat_connections'],
+                    messages=options['messages'],
+                    senders=options['senders'],
+                    broadcasts=options['broadcasts'],
+                    connect_concurrency=options['connect_concurrency'],
+                    timeout=options['timeout'],
+                )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(text + '\n')
+        self.stdout.write(text)
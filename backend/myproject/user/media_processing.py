@@ -0,0 +1,452 @@
+# user/media_processing.py
+"""
+Background processing of uploaded course media.
+
+Each function takes a primary key, works from the stored file and only
+writes back the fields it computes, so it can run in a Celery worker right
+after the upload request has returned.
+"""
+import io
+import logging
+import math
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .models import Course, CourseContent, PDFContent, PDFText, VideoContent
+from .storage import is_blob_name, open_for_ranged_reads
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# PDF TEXT EXTRACTION
+# ============================================================================
+
+def iter_pdf_pages(file):
+    """
+    Yield the text of each page. pypdf only parses the cross-reference table
+    up front and reads page objects from the open file on demand, so a large
+    document is never loaded in memory at once.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(file)
+    for page in reader.pages:
+        try:
+            yield page.extract_text() or ''
+        except Exception as e:
+            # A broken page shouldn't lose the rest of the document
+            logger.warning(f"Could not extract text from a PDF page: {str(e)}")
+            yield ''
+
+
+def read_pdf_text(file):
+    """Return (page_count, word_count, text) with text capped at PDF_TEXT_MAX_CHARS"""
+    max_chars = getattr(settings, 'PDF_TEXT_MAX_CHARS', 1_000_000)
+
+    page_count = word_count = stored_chars = 0
+    chunks = []
+    for text in iter_pdf_pages(file):
+        page_count += 1
+        word_count += len(text.split())
+        # Only the searchable text is kept, capped to bound memory and row size
+        if stored_chars < max_chars and text.strip():
+            chunk = text[:max_chars - stored_chars]
+            chunks.append(chunk)
+            stored_chars += len(chunk)
+    return page_count, word_count, '\n'.join(chunks)
+
+
+def extract_pdf_text(pdf_content_id):
+    """Fill page_count and estimated_reading_time of a PDF and store its text"""
+    try:
+        pdf_content = PDFContent.objects.get(pk=pdf_content_id)
+    except PDFContent.DoesNotExist:
+        return None
+    if not pdf_content.pdf_file:
+        return None
+
+    # A deduplicated blob already extracted for another content is not read again
+    processed = None
+    if is_blob_name(pdf_content.pdf_file.name):
+        processed = PDFText.objects.filter(
+            pdf_content__pdf_file=pdf_content.pdf_file.name
+        ).exclude(pdf_content=pdf_content).select_related('pdf_content').first()
+
+    if processed:
+        page_count, word_count, text = processed.pdf_content.page_count, processed.word_count, processed.text
+    else:
+        with open_for_ranged_reads(pdf_content.pdf_file) as file:
+            page_count, word_count, text = read_pdf_text(file)
+
+    words_per_minute = getattr(settings, 'READING_WORDS_PER_MINUTE', 200)
+    pdf_content.page_count = page_count
+    if word_count:
+        pdf_content.estimated_reading_time = max(1, math.ceil(word_count / words_per_minute))
+    else:
+        # Scanned documents have no text layer: fall back to time per page
+        pdf_content.estimated_reading_time = pdf_content.calculate_reading_time()
+    pdf_content.save(update_fields=['page_count', 'estimated_reading_time'])
+
+    PDFText.objects.update_or_create(
+        pdf_content=pdf_content,
+        defaults={'text': text, 'word_count': word_count}
+    )
+
+    logger.info(f"Extracted {page_count} pages, {word_count} words from PDF {pdf_content_id}")
+    return {'page_count': page_count, 'word_count': word_count}
+
+
+# ============================================================================
+# VIDEO METADATA PROBE
+# ============================================================================
+
+class VideoProbeError(Exception):
+    pass
+
+
+def read_exact(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise VideoProbeError('Unexpected end of file')
+    return data
+
+
+# ---- MP4 / MOV (ISO base media file format) --------------------------------
+
+MP4_CONTAINER_BOXES = {b'moov', b'trak', b'mdia'}
+
+
+def iter_mp4_boxes(file, start, end):
+    """Yield (type, payload_offset, payload_size) reading only box headers"""
+    offset = start
+    while offset + 8 <= end:
+        file.seek(offset)
+        header = read_exact(file, 8)
+        size, box_type = int.from_bytes(header[:4], 'big'), header[4:]
+        header_size = 8
+        if size == 1:
+            size = int.from_bytes(read_exact(file, 8), 'big')
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            raise VideoProbeError(f'Invalid {box_type!r} box size')
+        yield box_type, offset + header_size, size - header_size
+        offset += size
+
+
+def probe_mp4(file, file_size):
+    """
+    Walk moov > trak > mdia seeking over everything else (mdat included), so
+    only a few hundred header bytes are read whatever the video size.
+    """
+    metadata = {}
+
+    def walk(start, end, track):
+        for box_type, offset, size in iter_mp4_boxes(file, start, end):
+            if box_type in MP4_CONTAINER_BOXES:
+                child_track = {} if box_type == b'trak' else track
+                walk(offset, offset + size, child_track)
+                if box_type == b'trak' and child_track.get('handler') == b'vide':
+                    metadata.setdefault('width', child_track.get('width'))
+                    metadata.setdefault('height', child_track.get('height'))
+                if box_type == b'moov':
+                    return True
+            elif box_type == b'mvhd':
+                file.seek(offset)
+                payload = read_exact(file, min(size, 32))
+                if payload[0] == 1:
+                    timescale = int.from_bytes(payload[20:24], 'big')
+                    duration = int.from_bytes(payload[24:32], 'big')
+                else:
+                    timescale = int.from_bytes(payload[12:16], 'big')
+                    duration = int.from_bytes(payload[16:20], 'big')
+                if timescale:
+                    metadata['duration'] = duration / timescale
+            elif box_type == b'tkhd':
+                file.seek(offset)
+                payload = read_exact(file, min(size, 96))
+                position = 88 if payload[0] == 1 else 76
+                # 16.16 fixed-point values
+                track['width'] = int.from_bytes(payload[position:position + 4], 'big') >> 16
+                track['height'] = int.from_bytes(payload[position + 4:position + 8], 'big') >> 16
+            elif box_type == b'hdlr':
+                file.seek(offset + 8)
+                track['handler'] = read_exact(file, 4)
+        return False
+
+    walk(0, file_size, None)
+    return metadata
+
+
+# ---- Matroska / WebM --------------------------------------------------------
+
+EBML_HEADER = 0x1A45DFA3
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+
+
+def read_ebml_varint(file, keep_marker):
+    first = read_exact(file, 1)[0]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise VideoProbeError('Invalid EBML variable-size integer')
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in read_exact(file, length - 1):
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, unknown
+
+
+def iter_ebml_elements(file, start, end):
+    """Yield (id, payload_offset, payload_size) reading only element headers"""
+    offset = start
+    while offset < end:
+        file.seek(offset)
+        element_id, _ = read_ebml_varint(file, keep_marker=True)
+        size, unknown = read_ebml_varint(file, keep_marker=False)
+        payload_offset = file.tell()
+        if unknown:
+            size = end - payload_offset
+        yield element_id, payload_offset, size
+        offset = payload_offset + size
+
+
+def read_ebml_uint(file, offset, size):
+    file.seek(offset)
+    return int.from_bytes(read_exact(file, size), 'big')
+
+
+def probe_matroska(file, file_size):
+    """Read Segment > Info and Tracks, stopping at the first Cluster"""
+    import struct
+
+    metadata = {}
+    timecode_scale, duration = 1_000_000, None
+
+    for element_id, offset, size in iter_ebml_elements(file, 0, file_size):
+        if element_id != MKV_SEGMENT:
+            continue
+        for child_id, child_offset, child_size in iter_ebml_elements(file, offset, offset + size):
+            if child_id == MKV_INFO:
+                for info_id, info_offset, info_size in iter_ebml_elements(file, child_offset, child_offset + child_size):
+                    if info_id == MKV_TIMECODE_SCALE:
+                        timecode_scale = read_ebml_uint(file, info_offset, info_size)
+                    elif info_id == MKV_DURATION:
+                        file.seek(info_offset)
+                        duration = struct.unpack('>f' if info_size == 4 else '>d', read_exact(file, info_size))[0]
+            elif child_id == MKV_TRACKS:
+                for entry_id, entry_offset, entry_size in iter_ebml_elements(file, child_offset, child_offset + child_size):
+                    if entry_id != MKV_TRACK_ENTRY:
+                        continue
+                    track = {}
+                    for field_id, field_offset, field_size in iter_ebml_elements(file, entry_offset, entry_offset + entry_size):
+                        if field_id == MKV_TRACK_TYPE:
+                            track['type'] = read_ebml_uint(file, field_offset, field_size)
+                        elif field_id == MKV_VIDEO:
+                            for video_id, video_offset, video_size in iter_ebml_elements(file, field_offset, field_offset + field_size):
+                                if video_id == MKV_PIXEL_WIDTH:
+                                    track['width'] = read_ebml_uint(file, video_offset, video_size)
+                                elif video_id == MKV_PIXEL_HEIGHT:
+                                    track['height'] = read_ebml_uint(file, video_offset, video_size)
+                    if track.get('type') == 1 and 'width' not in metadata:
+                        metadata['width'], metadata['height'] = track.get('width'), track.get('height')
+            elif child_id == MKV_CLUSTER:
+                break
+        break
+
+    if duration is not None:
+        metadata['duration'] = duration * timecode_scale / 1e9
+    return metadata
+
+
+def probe_video(file, file_size):
+    """
+    Return {'duration', 'width', 'height', 'bitrate'} (any may be missing)
+    for MP4/MOV and Matroska/WebM files.
+    """
+    file.seek(0)
+    head = file.read(12)
+    if len(head) >= 8 and head[4:8] in (b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip'):
+        metadata = probe_mp4(file, file_size)
+    elif int.from_bytes(head[:4], 'big') == EBML_HEADER:
+        metadata = probe_matroska(file, file_size)
+    else:
+        raise VideoProbeError('Unsupported video container')
+
+    if metadata.get('duration'):
+        metadata['bitrate'] = int(file_size * 8 / metadata['duration'])
+    return metadata
+
+
+def probe_video_metadata(video_content_id):
+    """Fill duration, resolution and bitrate of an uploaded video"""
+    try:
+        video = VideoContent.objects.select_related('course_content__module').get(pk=video_content_id)
+    except VideoContent.DoesNotExist:
+        return None
+    if not video.video_file:
+        return None
+
+    # A deduplicated blob already probed for another content is not read again
+    processed = None
+    if is_blob_name(video.video_file.name):
+        processed = VideoContent.objects.filter(
+            video_file=video.video_file.name, bitrate__isnull=False
+        ).exclude(pk=video.pk).first()
+
+    if processed:
+        metadata = {
+            'duration': processed.duration, 'width': processed.width,
+            'height': processed.height, 'bitrate': processed.bitrate,
+        }
+    else:
+        try:
+            with open_for_ranged_reads(video.video_file) as file:
+                metadata = probe_video(file, video.video_file.size)
+        except VideoProbeError as e:
+            logger.warning(f"Could not probe video {video_content_id}: {str(e)}")
+            return None
+
+    video.duration = round(metadata.get('duration') or 0)
+    video.width = metadata.get('width')
+    video.height = metadata.get('height')
+    video.bitrate = metadata.get('bitrate')
+    video.save(update_fields=['duration', 'width', 'height', 'bitrate'])
+
+    # A content without an explicit duration takes the one of its video
+    content = video.course_content
+    if not content.estimated_duration and video.duration:
+        CourseContent.objects.filter(pk=content.pk).update(estimated_duration=math.ceil(video.duration / 60))
+
+    logger.info(f"Probed video {video_content_id}: {metadata}")
+    return metadata
+
+
+# ============================================================================
+# DURATION RECOMPUTE
+# ============================================================================
+
+def recompute_course_durations(course_id):
+    """
+    Recompute estimated_duration of every module of a course and of the
+    course itself, plus module min_required_time. A course min_required_time
+    set by its creator is kept.
+    """
+    from .models import Module
+
+    try:
+        course = Course.objects.get(pk=course_id)
+    except Course.DoesNotExist:
+        return None
+
+    for module in course.modules.all():
+        Module.objects.filter(pk=module.pk).update(
+            estimated_duration=module.calculate_estimated_duration(),
+            min_required_time=module.calculate_min_required_time(),
+        )
+
+    updates = {'estimated_duration': course.calculate_estimated_duration()}
+    if not course.min_required_time:
+        updates['min_required_time'] = course.calculate_min_required_time()
+    Course.objects.filter(pk=course_id).update(**updates)
+    return updates
+
+
+# ============================================================================
+# COURSE IMAGE VARIANTS
+# ============================================================================
+
+# Pillow format name and file extension of each generated variant format
+IMAGE_VARIANT_FORMATS = {'webp': ('WEBP', 'webp'), 'jpeg': ('JPEG', 'jpg')}
+
+
+def variant_path(image_name, width, extension):
+    """course_images/cover.png -> course_images/cover_w320.webp"""
+    root, _ = os.path.splitext(image_name)
+    return f"{root}_w{width}.{extension}"
+
+
+def generate_course_image_variants(course_id, stale_paths=()):
+    """
+    Write WebP and JPEG copies of a course image at each width of
+    COURSE_IMAGE_WIDTHS smaller than the original, next to it in storage,
+    and store their paths in Course.image_variants.
+    """
+    from PIL import Image, ImageOps
+
+    for path in stale_paths:
+        default_storage.delete(path)
+
+    try:
+        course = Course.objects.get(pk=course_id)
+    except Course.DoesNotExist:
+        return None
+    if not course.image:
+        return None
+
+    widths = sorted(getattr(settings, 'COURSE_IMAGE_WIDTHS', [320, 640, 1280]), reverse=True)
+    quality = getattr(settings, 'COURSE_IMAGE_QUALITY', 80)
+    image_name = course.image.name
+    variants = {variant_format: {} for variant_format in IMAGE_VARIANT_FORMATS}
+
+    with course.image.open('rb') as file:
+        image = Image.open(file)
+        # JPEG sources are decoded directly at a reduced scale when possible:
+        # the largest scale still at least as wide as the largest variant
+        image.draft('RGB', (widths[0], 1))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        # Largest width first, each variant resized from the previous one
+        for width in widths:
+            if width >= image.width:
+                continue
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            for variant_format, (pillow_format, extension) in IMAGE_VARIANT_FORMATS.items():
+                buffer = io.BytesIO()
+                output = image.convert('RGB') if pillow_format == 'JPEG' else image
+                output.save(buffer, pillow_format, quality=quality, optimize=True)
+                path = variant_path(image_name, width, extension)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                variants[variant_format][str(width)] = default_storage.save(path, ContentFile(buffer.getvalue()))
+
+    variants = {variant_format: paths for variant_format, paths in variants.items() if paths}
+    # Skip the write if the image was replaced while we were working
+    Course.objects.filter(pk=course_id, image=image_name).update(image_variants=variants)
+    return variants
+
+
+def image_variant_fields(course, request=None):
+    """
+    srcset-ready map of a course's image variants:
+    {'image_variants': {'webp': {'320': url, ...}, ...},
+     'image_srcset': {'webp': 'url 320w, url 640w', ...}}
+    Both are empty until the variants have been generated.
+    """
+    variants, srcset = {}, {}
+    for variant_format, paths in (course.image_variants or {}).items():
+        urls = {}
+        for width, path in sorted(paths.items(), key=lambda item: int(item[0])):
+            url = default_storage.url(path)
+            urls[width] = request.build_absolute_uri(url) if request else url
+        variants[variant_format] = urls
+        srcset[variant_format] = ', '.join(f"{url} {width}w" for width, url in urls.items())
+    return {'image_variants': variants, 'image_srcset': srcset}
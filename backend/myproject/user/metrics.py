@@ -0,0 +1,426 @@
+# user/metrics.py
+"""
+Prometheus metrics for the HTTP API, the WebSocket consumers and Celery.
+
+- MetricsMiddleware records, per named route, request latency, status codes
+  and the number and time of the SQL queries each request ran;
+- the DRF exception handler counts API exceptions by type;
+- cache reads are counted as hits or misses, labelled with the route (or the
+  Celery task) that made them, by the backends of user/cache_backends.py;
+- ConsumerMetricsMixin times every message handled by a consumer;
+- Celery signals record task outcomes and durations;
+- record_pool_stats exports the use, saturation and wait time of the
+  database connection pools (DB_POOL).
+
+Everything is exposed in the Prometheus text format by metrics_view (/metrics)
+and summarized for the admin dashboard by route_performance_stats.
+
+With several server processes, set PROMETHEUS_MULTIPROC_DIR to a directory
+shared by them (emptied at startup) so /metrics aggregates all of them.
+"""
+import contextvars
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by route, method and status code',
+    ['route', 'method', 'status'],
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ['route', 'method'], buckets=LATENCY_BUCKETS,
+)
+HTTP_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries run by one HTTP request',
+    ['route'], buckets=QUERY_COUNT_BUCKETS,
+)
+HTTP_DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in SQL queries by one HTTP request',
+    ['route'], buckets=LATENCY_BUCKETS,
+)
+API_EXCEPTIONS = Counter(
+    'api_exceptions_total', 'Exceptions handled by the REST framework',
+    ['route', 'exception'],
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache reads by route (or task) and result',
+    ['route', 'result'],
+)
+WEBSOCKET_CONNECTIONS = Counter(
+    'websocket_connections_total', 'WebSocket connections opened',
+    ['consumer'],
+)
+WEBSOCKET_ACTIVE = Gauge(
+    'websocket_connections_active', 'WebSocket connections currently open',
+    ['consumer'], multiprocess_mode='livesum',
+)
+WEBSOCKET_MESSAGES = Counter(
+    'websocket_messages_total', 'WebSocket frames received from or sent to clients',
+    ['consumer', 'direction'],
+)
+WEBSOCKET_HANDLER_LATENCY = Histogram(
+    'websocket_handler_duration_seconds', 'Time a consumer spends handling one message',
+    ['consumer', 'type'], buckets=LATENCY_BUCKETS,
+)
+CELERY_TASKS = Counter(
+    'celery_tasks_total', 'Celery task executions by outcome',
+    ['task', 'state'],
+)
+CELERY_TASK_LATENCY = Histogram(
+    'celery_task_duration_seconds', 'Celery task run time',
+    ['task'], buckets=LATENCY_BUCKETS + (30, 60, 300),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Connections of the database pools by state (in_use, idle) and their max size',
+    ['alias', 'state'], multiprocess_mode='livesum',
+)
+DB_POOL_WAITING = Gauge(
+    'db_pool_requests_waiting', 'Requests waiting for a connection of the pool',
+    ['alias'], multiprocess_mode='livesum',
+)
+DB_POOL_SATURATION = Gauge(
+    'db_pool_saturation', 'Connections in use / max size of the pool (highest of the processes)',
+    ['alias'], multiprocess_mode='livemax',
+)
+DB_POOL_REQUESTS = Counter(
+    'db_pool_requests_total', 'Connections requested from the pool: served at once, queued, or failed (timeout)',
+    ['alias', 'result'],
+)
+DB_POOL_WAIT = Counter(
+    'db_pool_wait_seconds_total', 'Time requests spent waiting for a connection of the pool',
+    ['alias'],
+)
+
+# Route (or task) being served by the current thread / coroutine
+current_route = contextvars.ContextVar('current_route', default='-')
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def get_registry():
+    """Registry to read from: this process, or all processes in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def route_name(request):
+    """Low-cardinality label for a request: URL name, else route pattern"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route or 'unmatched'
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+class QueryStats:
+    """connection.execute_wrapper counting queries and their total time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+    def track(self, stack):
+        """Install the wrapper on every database connection of this thread"""
+        for connection in connections.all(initialized_only=False):
+            stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+
+class MetricsMiddleware:
+    """Record latency, status and SQL usage of every request, by route"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_route.set('unmatched')
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                queries = QueryStats().track(stack)
+                response = self.get_response(request)
+        finally:
+            current_route.reset(token)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        token = current_route.set('unmatched')
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                # The ORM of async views runs in the sync thread, on its own connections
+                queries = await sync_to_async(QueryStats().track)(stack)
+                response = await self.get_response(request)
+        finally:
+            current_route.reset(token)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    def record(self, request, response, duration, queries):
+        route = route_name(request)
+        HTTP_REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+        HTTP_LATENCY.labels(route, request.method).observe(duration)
+        HTTP_DB_QUERIES.labels(route).observe(queries.count)
+        HTTP_DB_TIME.labels(route).observe(queries.duration)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # URL resolution happens after __call__ starts: label cache reads from here on
+        current_route.set(route_name(request))
+
+
+def record_api_exception(exc, context):
+    """Called by the DRF exception handler"""
+    if metrics_enabled():
+        API_EXCEPTIONS.labels(route_name(context.get('request')), type(exc).__name__).inc()
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, protected by METRICS_AUTH_TOKEN. Without a
+    token it is only served with DEBUG.
+    """
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if not token and not settings.DEBUG:
+        return HttpResponse(status=404)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    record_pool_stats()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+# ============================================================================
+# Channels
+# ============================================================================
+
+class ConsumerMetricsMixin:
+    """Mixin for the WebSocket consumers: connections, frames and handler latency"""
+
+    async def dispatch(self, message):
+        consumer = type(self).__name__
+        message_type = message['type']
+        if message_type == 'websocket.connect':
+            WEBSOCKET_CONNECTIONS.labels(consumer).inc()
+            WEBSOCKET_ACTIVE.labels(consumer).inc()
+        elif message_type == 'websocket.disconnect':
+            WEBSOCKET_ACTIVE.labels(consumer).dec()
+        elif message_type == 'websocket.receive':
+            WEBSOCKET_MESSAGES.labels(consumer, 'in').inc()
+
+        token = current_route.set(f'ws:{consumer}')
+        start = time.perf_counter()
+        try:
+            return await super().dispatch(message)
+        finally:
+            WEBSOCKET_HANDLER_LATENCY.labels(consumer, message_type).observe(time.perf_counter() - start)
+            current_route.reset(token)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        WEBSOCKET_MESSAGES.labels(type(self).__name__, 'out').inc()
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+
+# ============================================================================
+# Celery
+# ============================================================================
+
+_task_starts = {}
+
+
+def connect_celery_signals():
+    from celery import signals
+
+    @signals.task_prerun.connect(weak=False)
+    def task_prerun(task_id=None, task=None, **kwargs):
+        _task_starts[task_id] = (time.perf_counter(), current_route.set(f'task:{task.name}'))
+
+    @signals.task_postrun.connect(weak=False)
+    def task_postrun(task_id=None, task=None, state=None, **kwargs):
+        started = _task_starts.pop(task_id, None)
+        if started is not None:
+            CELERY_TASK_LATENCY.labels(task.name).observe(time.perf_counter() - started[0])
+            try:
+                current_route.reset(started[1])
+            except ValueError:
+                pass
+        CELERY_TASKS.labels(task.name, state or 'UNKNOWN').inc()
+        record_pool_stats()
+
+    @signals.task_retry.connect(weak=False)
+    def task_retry(request=None, **kwargs):
+        CELERY_TASKS.labels(request.task, 'RETRY_SCHEDULED').inc()
+
+    @signals.worker_process_shutdown.connect(weak=False)
+    def worker_process_shutdown(pid=None, **kwargs):
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(pid or os.getpid())
+
+    @signals.worker_ready.connect(weak=False)
+    def worker_ready(**kwargs):
+        # Workers have no HTTP server: serve their metrics on a dedicated port
+        port = getattr(settings, 'CELERY_METRICS_PORT', 0)
+        if port:
+            from prometheus_client import start_http_server
+            start_http_server(port, registry=get_registry())
+            logger.info(f"Celery metrics served on port {port}")
+
+
+# ============================================================================
+# Database connection pools
+# ============================================================================
+
+def record_pool_stats():
+    """
+    Move the statistics of this process' connection pools (DB_POOL) into the
+    metrics; called on scrape, by the health sampler and after Celery tasks.
+    Returns {alias: stats} for the health samples.
+    """
+    summary = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None or pool.closed:
+            continue
+        # pop_stats: counters since the previous call, gauges as of now
+        stats = pool.pop_stats()
+        in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+        max_size = stats.get('pool_max', 0)
+        queued = stats.get('requests_queued', 0)
+        errors = stats.get('requests_errors', 0)
+
+        DB_POOL_CONNECTIONS.labels(alias, 'in_use').set(in_use)
+        DB_POOL_CONNECTIONS.labels(alias, 'idle').set(stats.get('pool_available', 0))
+        DB_POOL_CONNECTIONS.labels(alias, 'max').set(max_size)
+        DB_POOL_WAITING.labels(alias).set(stats.get('requests_waiting', 0))
+        DB_POOL_SATURATION.labels(alias).set(in_use / max_size if max_size else 0)
+        DB_POOL_REQUESTS.labels(alias, 'immediate').inc(max(stats.get('requests_num', 0) - queued, 0))
+        DB_POOL_REQUESTS.labels(alias, 'queued').inc(queued)
+        DB_POOL_REQUESTS.labels(alias, 'error').inc(errors)
+        DB_POOL_WAIT.labels(alias).inc(stats.get('requests_wait_ms', 0) / 1000)
+
+        summary[alias] = {
+            'in_use': in_use,
+            'max_size': max_size,
+            'waiting': stats.get('requests_waiting', 0),
+            'saturation': round(in_use / max_size, 3) if max_size else None,
+        }
+    return summary
+
+
+# ============================================================================
+# Summaries for SystemHealthView
+# ============================================================================
+
+def collect_samples(registry=None):
+    """{metric family name: [samples]} read from the registry"""
+    families = defaultdict(list)
+    for family in (registry or get_registry()).collect():
+        families[family.name].extend(family.samples)
+    return families
+
+
+def histogram_quantile(quantile, buckets):
+    """Estimate a quantile from cumulative [(upper bound, count)] like PromQL does"""
+    buckets = sorted(buckets)
+    total = buckets[-1][1] if buckets else 0
+    if not total:
+        return None
+    rank = quantile * total
+    lower_bound, lower_count = 0.0, 0
+    for upper_bound, count in buckets:
+        if count >= rank:
+            if upper_bound == float('inf'):
+                return lower_bound
+            return lower_bound + (upper_bound - lower_bound) * (rank - lower_count) / max(count - lower_count, 1)
+        lower_bound, lower_count = upper_bound, count
+    return lower_bound
+
+
+def route_performance_stats(limit=10):
+    """
+    Busiest routes with their request count, mean and p95 latency (ms) and
+    5xx error rate (%), in the chart format of the admin dashboard.
+    """
+    samples = collect_samples()
+
+    routes = defaultdict(lambda: {'count': 0, 'errors': 0, 'sum': 0.0, 'buckets': defaultdict(float)})
+    for sample in samples['http_requests']:
+        if sample.name == 'http_requests_total':
+            route = routes[sample.labels['route']]
+            route['count'] += sample.value
+            if sample.labels['status'].startswith('5'):
+                route['errors'] += sample.value
+    for sample in samples['http_request_duration_seconds']:
+        route = routes[sample.labels['route']]
+        if sample.name.endswith('_sum'):
+            route['sum'] += sample.value
+        elif sample.name.endswith('_bucket'):
+            route['buckets'][float(sample.labels['le'])] += sample.value
+
+    busiest = sorted(
+        ((name, route) for name, route in routes.items() if route['count']),
+        key=lambda item: -item[1]['count']
+    )[:limit]
+    return {
+        'labels': [name for name, _ in busiest],
+        'data': [round(route['sum'] / route['count'] * 1000, 1) for _, route in busiest],
+        'p95': [
+            round((histogram_quantile(0.95, route['buckets'].items()) or 0) * 1000, 1)
+            for _, route in busiest
+        ],
+        'request_counts': [int(route['count']) for _, route in busiest],
+        'error_rates': [round(route['errors'] / route['count'] * 100, 2) for _, route in busiest],
+    }
+
+
+def error_rate():
+    """Share of requests answered with a 5xx status, over all recorded requests"""
+    total = errors = 0
+    for sample in collect_samples()['http_requests']:
+        if sample.name == 'http_requests_total':
+            total += sample.value
+            if sample.labels['status'].startswith('5'):
+                errors += sample.value
+    return (errors / total * 100) if total else 0.0
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 01:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0030_courserecommendation_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PDFText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(blank=True, default='')),
+                ('word_count', models.PositiveIntegerField(default=0)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+                ('pdf_content', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='text_index', to='user.pdfcontent')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0031_pdftext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videocontent',
+            name='bitrate',
+            field=models.PositiveIntegerField(blank=True, help_text='Average bitrate in bits per second', null=True),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
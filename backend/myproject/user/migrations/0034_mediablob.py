@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 01:39
+
+import user.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0033_course_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='pdfcontent',
+            name='pdf_file',
+            field=models.FileField(storage=user.storage.course_media_storage, upload_to='pdfs/'),
+        ),
+        migrations.AlterField(
+            model_name='videocontent',
+            name='video_file',
+            field=models.FileField(storage=user.storage.course_media_storage, upload_to='videos/%y'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0034_mediablob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeTrackingDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('session_type', models.CharField(max_length=10)),
+                ('total_duration', models.BigIntegerField(default=0, help_text='Seconds')),
+                ('record_count', models.PositiveIntegerField(default=0)),
+                ('last_end_time', models.DateTimeField(blank=True, null=True)),
+                ('content', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='user.coursecontent')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='user.course')),
+                ('module', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='user.module')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='user_timetr_day_a48036_idx'), models.Index(fields=['user', 'course', 'day'], name='user_timetr_user_id_1cb1bf_idx'), models.Index(fields=['course', 'day'], name='user_timetr_course__ee8cbd_idx'), models.Index(fields=['user', 'content'], name='user_timetr_user_id_703dc6_idx')],
+            },
+        ),
+    ]
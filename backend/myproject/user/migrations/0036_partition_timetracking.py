@@ -0,0 +1,132 @@
+"""
+Rebuild user_timetracking as a table partitioned by month of start_time
+(PostgreSQL only; a no-op elsewhere). Monthly partitions are created for the
+existing rows and the next TIME_TRACKING_PARTITIONS_AHEAD months, and a
+DEFAULT partition catches rows outside of them; later months are created
+ahead of time by user.timetracking.ensure_partitions().
+
+The primary key becomes (id, start_time) as PostgreSQL requires the
+partition key in unique constraints; ids still come from a sequence.
+"""
+import re
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations
+
+TABLE = 'user_timetracking'
+OLD_TABLE = 'user_timetracking_old'
+SEQUENCE = 'user_timetracking_partitioned_id_seq'
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(value):
+    return month_start(datetime(value.year + value.month // 12, value.month % 12 + 1, 1))
+
+
+def table_definitions(cursor, table):
+    """
+    (primary key name, index definitions, foreign key constraints) of table,
+    to recreate them under the same names
+    """
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [table])
+    primary_key = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+        [table, table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    return primary_key, indexes, cursor.fetchall()
+
+
+def rename_old_table(schema_editor, cursor):
+    """Move the table aside; returns its definitions"""
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+    primary_key, indexes, constraints = table_definitions(cursor, OLD_TABLE)
+    schema_editor.execute(f'ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT "{primary_key}" TO "{primary_key}_old"')
+    return primary_key, indexes, constraints
+
+
+def recreate(schema_editor, table, old_table, indexes, constraints):
+    for definition in indexes:
+        definition = re.sub(rf'\bON (ONLY )?(\S+\.)?"?{old_table}"?\b', f'ON {table}', definition)
+        schema_editor.execute(definition)
+    for name, definition in constraints:
+        schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+
+
+def partition_time_tracking(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(start_time), max(start_time), max(id) FROM {TABLE}')
+        first, last, max_id = cursor.fetchone()
+
+        primary_key, indexes, constraints = rename_old_table(schema_editor, cursor)
+
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS, '
+            f'CONSTRAINT "{primary_key}" PRIMARY KEY (id, start_time)) PARTITION BY RANGE (start_time)'
+        )
+        # Kept by unpartition_time_tracking() when migrating back and forth
+        schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE}')
+        schema_editor.execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+        schema_editor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        if max_id:
+            schema_editor.execute(f"SELECT setval('{SEQUENCE}', %s)", [max_id])
+
+        now = datetime.now(timezone.utc)
+        month = month_start(min(first or now, now))
+        # The coming months too, as ensure_partitions() would: their rows must
+        # not land in DEFAULT before the nightly job runs
+        end = next_month(max(last or now, now))
+        for _ in range(getattr(settings, 'TIME_TRACKING_PARTITIONS_AHEAD', 3)):
+            end = next_month(end)
+        while month < end:
+            upper = next_month(month)
+            schema_editor.execute(
+                f"CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+            month = upper
+        schema_editor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        schema_editor.execute(f'INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}')
+        schema_editor.execute(f'DROP TABLE {OLD_TABLE}')
+        recreate(schema_editor, TABLE, OLD_TABLE, indexes, constraints)
+
+
+def unpartition_time_tracking(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        primary_key, indexes, constraints = rename_old_table(schema_editor, cursor)
+
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS, CONSTRAINT "{primary_key}" PRIMARY KEY (id))'
+        )
+        schema_editor.execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+        schema_editor.execute(f'INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}')
+        schema_editor.execute(f'DROP TABLE {OLD_TABLE}')
+        recreate(schema_editor, TABLE, OLD_TABLE, indexes, constraints)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0035_timetrackingdaily'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_time_tracking, unpartition_time_tracking),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0036_partition_timetracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearningSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('duration', models.IntegerField(help_text='Seconds covered by the merged intervals')),
+                ('record_count', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learning_sessions', to='user.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learning_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'course', 'start_time'], name='user_learni_user_id_c7571f_idx')],
+            },
+        ),
+    ]
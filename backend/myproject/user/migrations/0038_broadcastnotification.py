@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0037_learningsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('course_activated', 'Course Activated'), ('module_activated', 'Module Activated'), ('content_activated', 'Content Activated'), ('qcm_result', 'QCM Result'), ('system', 'System Announcement'), ('message', 'New Message')], max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('audience', models.CharField(choices=[('department', 'Department'), ('course', 'Course subscribers')], default='department', max_length=10)),
+                ('department', models.CharField(blank=True, choices=[('F', 'FINANCE'), ('H', 'Human RESOURCES'), ('M', 'MARKETING'), ('O', 'OPERATIONS/PRODUCTION'), ('S', 'Sales')], default='', max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('excluded_user', models.ForeignKey(blank=True, help_text='Not shown to this user (the author of the course)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('related_content', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='user.coursecontent')),
+                ('related_course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='user.course')),
+                ('related_module', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='user.module')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BroadcastNotificationRead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('broadcast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reads', to='user.broadcastnotification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast_reads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_at', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_read_state', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='broadcastnotification',
+            index=models.Index(fields=['audience', 'department', 'created_at'], name='user_broadc_audienc_fd4be3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='broadcastnotification',
+            index=models.Index(fields=['audience', 'related_course', 'created_at'], name='user_broadc_audienc_a5e6fb_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='broadcastnotificationread',
+            unique_together={('user', 'broadcast')},
+        ),
+    ]
@@ -0,0 +1,118 @@
+"""
+Collapse the activation notifications written once per department user into
+BroadcastNotification rows.
+
+Rows of the same event share their type, title, message, related objects and
+day. Each event becomes one department broadcast, dated by its first row,
+with a read flag for every user who had read it; the per-user rows are then
+deleted. Going back fans the broadcasts out again to the users of their
+audience, read as of their cursor and flags.
+"""
+from django.db import migrations
+from django.db.models import Exists, Min, OuterRef
+from django.db.models.functions import TruncDate
+
+FANOUT_TYPES = ('course_activated', 'module_activated', 'content_activated')
+EVENT_FIELDS = ('notification_type', 'title', 'message', 'related_course', 'related_module', 'related_content')
+
+
+def collapse_notifications(apps, schema_editor):
+    Notification = apps.get_model('user', 'Notification')
+    BroadcastNotification = apps.get_model('user', 'BroadcastNotification')
+    BroadcastNotificationRead = apps.get_model('user', 'BroadcastNotificationRead')
+    Course = apps.get_model('user', 'Course')
+
+    events = (
+        Notification.objects.filter(notification_type__in=FANOUT_TYPES, related_course__isnull=False)
+        .annotate(day=TruncDate('created_at'))
+        .values(*EVENT_FIELDS, 'day')
+        .annotate(first_created_at=Min('created_at'))
+        .order_by('first_created_at')
+    )
+    courses = {}
+    # One row per event: the rows are deleted as the events are collapsed
+    for event in list(events):
+        course_id = event['related_course']
+        if course_id not in courses:
+            courses[course_id] = Course.objects.values('department', 'creator_id').get(pk=course_id)
+        course = courses[course_id]
+
+        broadcast = BroadcastNotification.objects.create(
+            **{field: event[field] for field in ('notification_type', 'title', 'message')},
+            related_course_id=course_id,
+            related_module_id=event['related_module'],
+            related_content_id=event['related_content'],
+            audience='department',
+            department=course['department'] or '',
+            excluded_user_id=course['creator_id'],
+            created_at=event['first_created_at'],
+        )
+        rows = Notification.objects.filter(
+            **{field: event[field] for field in EVENT_FIELDS},
+            created_at__date=event['day'],
+            notification_type__in=FANOUT_TYPES,
+        )
+        BroadcastNotificationRead.objects.bulk_create(
+            (
+                BroadcastNotificationRead(user_id=user_id, broadcast=broadcast, read_at=broadcast.created_at)
+                for user_id in rows.filter(is_read=True).values_list('user_id', flat=True).distinct()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        rows.delete()
+
+
+def fan_out_broadcasts(apps, schema_editor):
+    Notification = apps.get_model('user', 'Notification')
+    BroadcastNotification = apps.get_model('user', 'BroadcastNotification')
+    BroadcastNotificationRead = apps.get_model('user', 'BroadcastNotificationRead')
+    NotificationReadState = apps.get_model('user', 'NotificationReadState')
+    CustomUser = apps.get_model('user', 'CustomUser')
+    Subscription = apps.get_model('user', 'Subscription')
+
+    cursors = dict(NotificationReadState.objects.values_list('user_id', 'last_read_at'))
+    for broadcast in BroadcastNotification.objects.order_by('created_at').iterator():
+        users = CustomUser.objects.filter(date_joined__lte=broadcast.created_at)
+        if broadcast.audience == 'course':
+            users = users.filter(Exists(Subscription.objects.filter(
+                user=OuterRef('pk'), course_id=broadcast.related_course_id, is_active=True
+            )))
+        elif broadcast.department:
+            users = users.filter(department=broadcast.department)
+        if broadcast.excluded_user_id:
+            users = users.exclude(pk=broadcast.excluded_user_id)
+        flagged = set(BroadcastNotificationRead.objects.filter(broadcast=broadcast).values_list('user_id', flat=True))
+
+        user_ids = list(users.values_list('pk', flat=True))
+        for index in range(0, len(user_ids), 1000):
+            created = Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id,
+                    notification_type=broadcast.notification_type,
+                    title=broadcast.title,
+                    message=broadcast.message,
+                    related_course_id=broadcast.related_course_id,
+                    related_module_id=broadcast.related_module_id,
+                    related_content_id=broadcast.related_content_id,
+                    is_read=user_id in flagged or (
+                        user_id in cursors and broadcast.created_at <= cursors[user_id]
+                    ),
+                )
+                for user_id in user_ids[index:index + 1000]
+            ])
+            # created_at is auto_now_add
+            Notification.objects.filter(pk__in=[notification.pk for notification in created]).update(
+                created_at=broadcast.created_at
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0038_broadcastnotification'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_notifications, fan_out_broadcasts),
+    ]
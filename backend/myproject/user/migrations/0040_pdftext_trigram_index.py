@@ -0,0 +1,40 @@
+"""
+Trigram index on the extracted PDF text (PostgreSQL only; a no-op
+elsewhere), so that the icontains search of GlobalSearchView, which
+compares UPPER(text), is served by an index instead of scanning every
+document. Servers without the pg_trgm extension (postgresql-contrib) keep
+the unindexed search: migrate back to 0039 and forward again once it is
+installed.
+"""
+from django.db import migrations
+
+INDEX = 'user_pdftext_text_trgm'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    # pg_trgm is a trusted extension: the owner of the database can create it
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX} ON user_pdftext USING gin (UPPER(text) gin_trgm_ops)')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0039_notifications_to_broadcasts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
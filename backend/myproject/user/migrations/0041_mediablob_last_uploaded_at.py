@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:21
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    MediaBlob = apps.get_model('user', 'MediaBlob')
+    MediaBlob.objects.update(last_uploaded_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0040_pdftext_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='last_uploaded_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -7,6 +7,7 @@ from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
+from .storage import course_media_storage
 
 PRIVILEGE_CHOICES = [
     ('A', 'Admin'),
@@ -82,6 +83,8 @@ class Course(models.Model):
         blank=True,
         max_length=100  
     )
+    # Resized copies of image, {format: {width: path}} (see user/media_processing.py)
+    image_variants = models.JSONField(default=dict, blank=True)
     creator = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -496,20 +499,24 @@ class QCMOption(models.Model):
         return f"{self.text} ({'Correct' if self.is_correct else 'Incorrect'})"
 class VideoContent(models.Model):
     course_content = models.OneToOneField(CourseContent, on_delete=models.CASCADE, related_name='video_content')
-    video_file = models.FileField(upload_to='videos/%y')
+    video_file = models.FileField(upload_to='videos/%y', storage=course_media_storage)
     # NEW FIELD - Added for video duration
     duration = models.IntegerField(
         default=0,
         validators=[MinValueValidator(0)],
         help_text="Video duration in seconds"
     )
+    # Filled by the metadata probe after upload (see user/media_processing.py)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, help_text="Average bitrate in bits per second")
     
     def __str__(self):
         return self.course_content.title
 
 class PDFContent(models.Model):
     course_content = models.OneToOneField(CourseContent, on_delete=models.CASCADE, related_name='pdf_content')
-    pdf_file = models.FileField(upload_to='pdfs/')
+    pdf_file = models.FileField(upload_to='pdfs/', storage=course_media_storage)
     # NEW FIELDS - Added for PDF metadata
     page_count = models.IntegerField(
         default=0,
@@ -535,6 +542,35 @@ class PDFContent(models.Model):
             self.estimated_reading_time = self.calculate_reading_time()
         super().save(*args, **kwargs)
 
+class PDFText(models.Model):
+    """
+    Text extracted from a PDF after upload (see user/media_processing.py).
+    Kept apart from PDFContent so loading a content never pulls the text.
+    """
+    pdf_content = models.OneToOneField(PDFContent, on_delete=models.CASCADE, related_name='text_index')
+    text = models.TextField(blank=True, default='')
+    word_count = models.PositiveIntegerField(default=0)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Text of {self.pdf_content}"
+
+class MediaBlob(models.Model):
+    """
+    A file of the content-addressed media storage (see user/storage.py),
+    with the number of VideoContent/PDFContent rows pointing to it.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last save of these bytes, the start of gc_media_blobs' grace period
+    last_uploaded_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
 class Subscription(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='course_subscriptions')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='course_subscriptions')
@@ -796,14 +832,14 @@ class QCMAttempt(models.Model):
         unique_together = ['user', 'qcm', 'attempt_number']
     
     def calculate_score(self):
-        correct_options = self.qcm.options.filter(is_correct=True)
+        correct_options = QCMOption.objects.filter(question__qcm=self.qcm, is_correct=True)
         selected_correct = self.selected_options.filter(is_correct=True).count()
         total_correct = correct_options.count()
         
         if total_correct > 0:
             self.score = (selected_correct / total_correct) * 100
             self.is_passed = self.score >= self.qcm.passing_score
-            self.points_earned = self.qcm.points if self.is_passed else 0
+            self.points_earned = self.qcm.total_points if self.is_passed else 0
         else:
             self.score = 0
             self.is_passed = False
@@ -838,6 +874,48 @@ class TimeTracking(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.course.title_of_course} - {self.duration}s"
 
+
+class TimeTrackingDaily(models.Model):
+    """TimeTracking rolled up per day, user, course, content and session type (see user/timetracking.py)"""
+    day = models.DateField()
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    module = models.ForeignKey(Module, on_delete=models.CASCADE, null=True, blank=True)
+    content = models.ForeignKey(CourseContent, on_delete=models.CASCADE, null=True, blank=True)
+    session_type = models.CharField(max_length=10)
+    total_duration = models.BigIntegerField(default=0, help_text="Seconds")
+    record_count = models.PositiveIntegerField(default=0)
+    last_end_time = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day']),
+            models.Index(fields=['user', 'course', 'day']),
+            models.Index(fields=['course', 'day']),
+            models.Index(fields=['user', 'content']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} user={self.user_id} course={self.course_id} - {self.total_duration}s"
+
+
+class LearningSession(models.Model):
+    """TimeTracking intervals of a user on a course merged into one session (see user/sessionization.py)"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='learning_sessions')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='learning_sessions')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    duration = models.IntegerField(help_text="Seconds covered by the merged intervals")
+    record_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'course', 'start_time']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.course_id} - {self.start_time:%Y-%m-%d %H:%M} ({self.duration}s)"
+
 class ChatMessage(models.Model):
     sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='received_messages')
@@ -945,4 +1023,98 @@ class Notification(models.Model):
             minutes = diff.seconds // 60
             return f"Il y a {minutes} minute{'s' if minutes > 1 else ''}"
         else:
-            return "À l'instant"
\ No newline at end of file
+            return "À l'instant"
+
+
+class BroadcastNotification(models.Model):
+    """
+    One notification for a whole audience instead of one row per user: the
+    users of a department (everyone when department is empty) or the active
+    subscribers of related_course. Read state is the user's
+    NotificationReadState cursor plus BroadcastNotificationRead flags
+    (see user/notifications.py)
+    """
+    AUDIENCE_CHOICES = [
+        ('department', 'Department'),
+        ('course', 'Course subscribers'),
+    ]
+
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    related_course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True)
+    related_module = models.ForeignKey(Module, on_delete=models.CASCADE, null=True, blank=True)
+    related_content = models.ForeignKey(CourseContent, on_delete=models.CASCADE, null=True, blank=True)
+    audience = models.CharField(max_length=10, choices=AUDIENCE_CHOICES, default='department')
+    department = models.CharField(max_length=20, choices=DEPARTMENT_CHOICES, blank=True, default='')
+    excluded_user = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        help_text="Not shown to this user (the author of the course)"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['audience', 'department', 'created_at']),
+            models.Index(fields=['audience', 'related_course', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.audience} {self.department or self.related_course_id or 'all'} - {self.title}"
+
+    time_ago = Notification.time_ago
+
+
+class NotificationReadState(models.Model):
+    """Read cursor of a user: broadcasts created up to last_read_at are read"""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='notification_read_state')
+    last_read_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} read up to {self.last_read_at}"
+
+
+class BroadcastNotificationRead(models.Model):
+    """A broadcast read on its own, after the user's cursor"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='broadcast_reads')
+    broadcast = models.ForeignKey(BroadcastNotification, on_delete=models.CASCADE, related_name='reads')
+    read_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['user', 'broadcast']
+
+    def __str__(self):
+        return f"{self.user_id} read {self.broadcast_id}"
+
+
+class CourseRecommendation(models.Model):
+    """Precomputed item-item neighbours: courses similar to a course"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='recommendations')
+    recommended_course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+    rank = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['course', 'rank']
+        unique_together = ['course', 'recommended_course']
+
+    def __str__(self):
+        return f"{self.course_id} -> {self.recommended_course_id} ({self.score:.3f})"
+
+
+class UserRecommendation(models.Model):
+    """Precomputed top-K course recommendations for a user"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='course_recommendations')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+    rank = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['user', 'rank']
+        unique_together = ['user', 'course']
+
+    def __str__(self):
+        return f"{self.user.username} -> {self.course_id} ({self.score:.3f})"
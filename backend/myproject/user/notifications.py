@@ -0,0 +1,291 @@
+# user/notifications.py
+"""
+Personal and broadcast notifications.
+
+Activation events used to write one Notification per department user, so
+the table grew with users x events and "mark all as read" rewrote thousands
+of rows. Events for an audience are now one BroadcastNotification:
+
+- a user sees the broadcasts of their department (or of every department)
+  and those of the courses they are actively subscribed to, created since
+  they joined, except the ones they authored;
+- a broadcast is read when it is older than the user's NotificationReadState
+  cursor, or when the user has a BroadcastNotificationRead flag for it. Marking
+  everything as read moves the cursor and drops the flags, so flags only
+  exist for broadcasts read one by one since.
+
+Personal Notification rows remain for what concerns a single user (QCM
+results, messages). The list and the unread count merge both kinds.
+
+Unread counts are kept per user in the cache (Redis in production) so that
+reading them costs no query: a missing counter is counted from the database,
+new notifications increment the existing counters of their audience and the
+mark-read views reset them. A broadcast increments the counters of its
+audience in a Celery task, off the request that created it. Counters are
+only trusted for NOTIFICATION_UNREAD_COUNT_TTL after they were counted or
+reset (increments keep the expiry): an increment racing with a count, or a
+task running after it, is off by one only until then. Every change is
+pushed to the user's NotificationConsumer (ws/notifications/), which
+clients listen to instead of polling:
+
+- {"type": "notification", "notification": {...}} for a new notification;
+- {"type": "unread_count", "unread_count": n} when the count changes.
+"""
+import heapq
+import logging
+from itertools import islice
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from .models import (
+    BroadcastNotification, BroadcastNotificationRead, CustomUser, Notification, NotificationReadState,
+    Subscription,
+)
+
+logger = logging.getLogger(__name__)
+
+RELATED_FIELDS = ('related_course', 'related_module', 'related_content')
+# Read cursor not fetched yet (None means nothing read)
+UNKNOWN = object()
+UNREAD_COUNT_CACHE_KEY = 'notifications:unread:{user_id}'
+
+
+def broadcasts_for(user):
+    """The broadcasts user is in the audience of"""
+    subscribed_courses = Subscription.objects.filter(user=user, is_active=True).values('course_id')
+    return BroadcastNotification.objects.filter(
+        Q(audience='department', department__in=[user.department, ''])
+        | Q(audience='course', related_course__in=subscribed_courses),
+        created_at__gte=user.date_joined,
+    ).exclude(excluded_user=user)
+
+
+def read_cursor(user):
+    return NotificationReadState.objects.filter(user=user).values_list('last_read_at', flat=True).first()
+
+
+def read_flag(user):
+    return Exists(BroadcastNotificationRead.objects.filter(user=user, broadcast=OuterRef('pk')))
+
+
+def unread_broadcasts(user, cursor):
+    broadcasts = broadcasts_for(user).filter(~read_flag(user))
+    if cursor is not None:
+        broadcasts = broadcasts.filter(created_at__gt=cursor)
+    return broadcasts
+
+
+def count_unread(user, cursor=UNKNOWN):
+    """Unread personal and broadcast notifications of user, counted in the database"""
+    if cursor is UNKNOWN:
+        cursor = read_cursor(user)
+    personal = Notification.objects.filter(user=user, is_read=False).count()
+    return personal + unread_broadcasts(user, cursor).count()
+
+
+def unread_count(user, cursor=UNKNOWN):
+    """Unread personal and broadcast notifications of user, from their counter"""
+    key = UNREAD_COUNT_CACHE_KEY.format(user_id=user.id)
+    count = cache.get(key)
+    if count is None:
+        count = count_unread(user, cursor)
+        cache.add(key, count, getattr(settings, 'NOTIFICATION_UNREAD_COUNT_TTL', 300))
+    return count
+
+
+def total_count(user):
+    """All the personal and broadcast notifications of user"""
+    return Notification.objects.filter(user=user).count() + broadcasts_for(user).count()
+
+
+def notification_feed(user, limit=50, cursor=UNKNOWN):
+    """The latest personal and broadcast notifications of user, newest first"""
+    if cursor is UNKNOWN:
+        cursor = read_cursor(user)
+    personal = Notification.objects.filter(user=user).select_related(*RELATED_FIELDS).order_by('-created_at')
+
+    is_read = Q(read_flag(user))
+    if cursor is not None:
+        is_read |= Q(created_at__lte=cursor)
+    broadcasts = broadcasts_for(user).annotate(
+        is_read=Case(When(is_read, then=Value(True)), default=Value(False), output_field=BooleanField())
+    ).select_related(*RELATED_FIELDS).order_by('-created_at')
+
+    merged = heapq.merge(personal[:limit], broadcasts[:limit], key=lambda item: item.created_at, reverse=True)
+    return list(islice(merged, limit))
+
+
+def mark_notification_read(user, notification):
+    """Mark a personal notification of user as read; returns whether it was unread"""
+    if notification.is_read:
+        return False
+    notification.is_read = True
+    notification.save()
+    decrement_unread_count(user.id)
+    return True
+
+
+def mark_broadcast_read(user, broadcast):
+    """Flag broadcast as read by user, unless the cursor already covers it; returns whether it was unread"""
+    cursor = read_cursor(user)
+    if cursor is not None and broadcast.created_at <= cursor:
+        return False
+    _, created = BroadcastNotificationRead.objects.get_or_create(user=user, broadcast=broadcast)
+    if created:
+        decrement_unread_count(user.id)
+    return created
+
+
+def mark_all_read(user):
+    """Mark every notification of user as read; returns how many were unread"""
+    now = timezone.now()
+    updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    updated += unread_broadcasts(user, read_cursor(user)).filter(created_at__lte=now).count()
+    NotificationReadState.objects.bulk_create(
+        [NotificationReadState(user=user, last_read_at=now)],
+        update_conflicts=True, unique_fields=['user'], update_fields=['last_read_at'],
+    )
+    # Flags of broadcasts older than the cursor are redundant
+    BroadcastNotificationRead.objects.filter(user=user, broadcast__created_at__lte=now).delete()
+    set_unread_count(user.id, 0)
+    return updated
+
+
+# ============================================================================
+# Unread counters and WebSocket pushes
+# ============================================================================
+
+def user_group(user_id):
+    return f'notifications_user_{user_id}'
+
+
+def department_group(department):
+    return f'notifications_department_{department or "all"}'
+
+
+def course_group(course_id):
+    return f'notifications_course_{course_id}'
+
+
+def notification_groups(user):
+    """Channel layer groups of the NotificationConsumer of user"""
+    groups = [user_group(user.id), department_group(user.department), department_group('')]
+    groups += [
+        course_group(course_id)
+        for course_id in Subscription.objects.filter(user=user, is_active=True).values_list('course_id', flat=True)
+    ]
+    return groups
+
+
+def push(group, event):
+    """
+    Send event to a channel layer group once the current transaction commits.
+    A channel layer outage is logged instead of failing the request.
+    """
+    def send():
+        try:
+            async_to_sync(get_channel_layer().group_send)(group, event)
+        except Exception as e:
+            logger.error(f"Could not push {event['type']} to {group}: {str(e)}")
+
+    transaction.on_commit(send)
+
+
+def set_unread_count(user_id, count):
+    def reset():
+        cache.set(
+            UNREAD_COUNT_CACHE_KEY.format(user_id=user_id), count,
+            getattr(settings, 'NOTIFICATION_UNREAD_COUNT_TTL', 300),
+        )
+
+    transaction.on_commit(reset)
+    push(user_group(user_id), {'type': 'unread_count.changed', 'unread_count': count})
+
+
+def decrement_unread_count(user_id):
+    def decrement():
+        key = UNREAD_COUNT_CACHE_KEY.format(user_id=user_id)
+        try:
+            count = cache.decr(key)
+        except ValueError:
+            # No counter: the next read counts in the database
+            return
+        if count < 0:
+            cache.delete(key)
+            return
+        push(user_group(user_id), {'type': 'unread_count.changed', 'unread_count': count})
+
+    transaction.on_commit(decrement)
+
+
+def increment_unread_counts(user_ids, batch_size=1000):
+    """
+    Add one to the existing counters of user_ids; users without a counter are
+    counted on their next read. Returns {user_id: new count}.
+    """
+    counts = {}
+    user_ids = list(user_ids)
+    for index in range(0, len(user_ids), batch_size):
+        keys = {
+            UNREAD_COUNT_CACHE_KEY.format(user_id=user_id): user_id
+            for user_id in user_ids[index:index + batch_size]
+        }
+        for key in cache.get_many(list(keys)):
+            try:
+                counts[keys[key]] = cache.incr(key)
+            except ValueError:
+                pass  # Expired meanwhile
+    return counts
+
+
+def audience_user_ids(broadcast):
+    if broadcast.audience == 'course':
+        users = CustomUser.objects.filter(
+            course_subscriptions__course_id=broadcast.related_course_id, course_subscriptions__is_active=True
+        )
+    else:
+        users = CustomUser.objects.all()
+        if broadcast.department:
+            users = users.filter(department=broadcast.department)
+    if broadcast.excluded_user_id:
+        users = users.exclude(id=broadcast.excluded_user_id)
+    return users.values_list('id', flat=True)
+
+
+def serialize_notification(notification):
+    from .serializers import NotificationSerializer
+    return dict(NotificationSerializer(notification).data)
+
+
+def announce_notification(notification):
+    """Count a new personal notification as unread and push it"""
+    count = increment_unread_counts([notification.user_id]).get(notification.user_id)
+    push(user_group(notification.user_id), {
+        'type': 'notification.created',
+        'notification': serialize_notification(notification),
+        'unread_count': count,
+    })
+
+
+def announce_broadcast(broadcast):
+    """
+    Count a new broadcast as unread for its audience and push it. Walks the
+    audience: run by the announce_broadcast_notification task.
+    """
+    increment_unread_counts(audience_user_ids(broadcast).iterator())
+    broadcast.is_read = False
+    if broadcast.audience == 'course':
+        group = course_group(broadcast.related_course_id)
+    else:
+        group = department_group(broadcast.department)
+    push(group, {
+        'type': 'notification.created',
+        'notification': serialize_notification(broadcast),
+        'excluded_user_id': broadcast.excluded_user_id,
+    })
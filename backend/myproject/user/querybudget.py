@@ -0,0 +1,182 @@
+# user/querybudget.py
+"""
+Query budgets and N+1 detection for development and staging.
+
+QueryBudgetMiddleware (enabled by QUERY_BUDGET_ENABLED, on by default when
+DEBUG is) records every SQL query of a request with the project line that
+issued it. It adds X-DB-Queries / X-DB-Time headers to the response and logs
+a warning when:
+- the same SQL shape (the query with its values stripped) runs at least
+  QUERY_BUDGET_REPEAT_THRESHOLD times, the signature of an N+1 loop;
+- the request runs more queries than the budget of its route.
+
+Budgets live in query_budgets.json ({url name: {method: max queries}}) and
+cover every route of user/urls.py. Tests assert them with
+QueryBudgetTestMixin.assertQueryBudget; running the QueryBudgetTests suite
+with UPDATE_QUERY_BUDGETS=1 rewrites the file from the measured counts.
+"""
+import json
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import QueryStats, route_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES_RE = re.compile(r'\s+')
+
+# Frames of these files are never reported as the origin of a query
+_SKIPPED_FILES = (__file__, os.path.join(os.path.dirname(__file__), 'metrics.py'))
+
+
+def sql_shape(sql):
+    """SQL with its values replaced, so that the queries of a loop compare equal"""
+    shape = STRING_RE.sub('?', sql)
+    shape = NUMBER_RE.sub('?', shape)
+    shape = PLACEHOLDER_RE.sub('?', shape)
+    shape = IN_LIST_RE.sub('(...)', shape)
+    return SPACES_RE.sub(' ', shape).strip()
+
+
+def call_site():
+    """'file:line in function' of the innermost project frame issuing a query"""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and filename not in _SKIPPED_FILES and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryRecorder(QueryStats):
+    """QueryStats that also keeps the shape and origin of every query"""
+
+    def __init__(self):
+        super().__init__()
+        self.shapes = Counter()
+        self.sites = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = sql_shape(sql)
+        self.shapes[shape] += 1
+        self.sites[shape][call_site()] += 1
+        return super().__call__(execute, sql, params, many, context)
+
+    def repeated(self, threshold=None):
+        """[(shape, count, [(call site, count)])] of the shapes run at least threshold times"""
+        threshold = threshold or getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 5)
+        return [
+            (shape, count, self.sites[shape].most_common(3))
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def report(self, threshold=None):
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f} ms"]
+        for shape, count, sites in self.repeated(threshold):
+            origins = ', '.join(f"{site} ({site_count}x)" for site, site_count in sites)
+            lines.append(f"  {count}x {shape[:300]}\n     from {origins}")
+        return '\n'.join(lines)
+
+
+def budget_file():
+    return getattr(settings, 'QUERY_BUDGET_FILE', DEFAULT_BUDGET_FILE)
+
+
+@lru_cache(maxsize=4)
+def load_budgets(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def get_budget(route, method):
+    return load_budgets(budget_file()).get(route, {}).get(method.upper())
+
+
+class QueryBudgetMiddleware:
+    """Report query counts and N+1 patterns of each request (dev/staging only)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with ExitStack() as stack:
+            recorder = QueryRecorder().track(stack)
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        with ExitStack() as stack:
+            # The ORM of async views runs in the sync thread, on its own connections
+            recorder = await sync_to_async(QueryRecorder().track)(stack)
+            response = await self.get_response(request)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        response['X-DB-Queries'] = str(recorder.count)
+        response['X-DB-Time'] = f"{recorder.duration * 1000:.1f}"
+
+        route = route_name(request)
+        budget = get_budget(route, request.method)
+        over_budget = budget is not None and recorder.count > budget
+        if over_budget or recorder.repeated():
+            logger.warning(
+                f"{request.method} {request.path} ({route})"
+                f"{f' over its budget of {budget} queries' if over_budget else ''}: "
+                f"{recorder.report()}"
+            )
+        return response
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin asserting the query budget of an endpoint"""
+
+    @contextmanager
+    def assertQueryBudget(self, route, method='GET', budget=None):
+        """
+        Fail when the block runs more queries than budget, which defaults to
+        the entry of query_budgets.json for route and method.
+        """
+        if budget is None:
+            budget = get_budget(route, method)
+            if budget is None:
+                self.fail(f"No query budget for {method} {route} in {budget_file()}")
+
+        with ExitStack() as stack:
+            recorder = QueryRecorder().track(stack)
+            yield recorder
+
+        if recorder.count > budget:
+            self.fail(
+                f"{method} {route} ran {recorder.count} queries, budget is {budget}\n"
+                f"{recorder.report(threshold=2)}"
+            )
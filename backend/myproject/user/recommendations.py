@@ -0,0 +1,178 @@
+# user/recommendations.py
+"""
+Collaborative-filtering recommendations.
+
+A sparse user x course interaction matrix is built from subscriptions,
+favorites, passed QCMs and tracked time. Item-item cosine similarities are
+computed with sparse products, then the top-K neighbours of every course and
+the top-K unseen courses of every user are stored so that the API only has to
+read them back by primary key.
+"""
+import logging
+import math
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Course, Subscription, FavoriteCourse, QCMCompletion,
+    CourseRecommendation, UserRecommendation
+)
+from .timetracking import aggregate_time
+
+logger = logging.getLogger(__name__)
+
+# Weight of each kind of interaction in the matrix
+SUBSCRIPTION_WEIGHT = 1.0
+COMPLETION_WEIGHT = 1.0
+FAVORITE_WEIGHT = 2.0
+QCM_PASSED_WEIGHT = 0.5
+
+# Users scored per sparse product, bounds memory on large user bases
+USER_CHUNK_SIZE = 1000
+
+
+def collect_interactions():
+    """Yield (user_id, course_id, weight) triples from every interaction source"""
+    for user_id, course_id, is_completed in Subscription.objects.filter(
+        is_active=True
+    ).values_list('user_id', 'course_id', 'is_completed').iterator():
+        yield user_id, course_id, SUBSCRIPTION_WEIGHT + (COMPLETION_WEIGHT if is_completed else 0)
+
+    for user_id, course_id in FavoriteCourse.objects.values_list('user_id', 'course_id').iterator():
+        yield user_id, course_id, FAVORITE_WEIGHT
+
+    for user_id, course_id in QCMCompletion.objects.filter(
+        is_passed=True
+    ).values_list('subscription__user_id', 'subscription__course_id').iterator():
+        yield user_id, course_id, QCM_PASSED_WEIGHT
+
+    # Time spent is log-scaled so long sessions don't drown the other signals
+    for row in aggregate_time(['user_id', 'course_id']):
+        if row['total_time'] > 0:
+            yield row['user_id'], row['course_id'], math.log1p(row['total_time'] / 60)
+
+
+def build_interaction_matrix(interactions):
+    """
+    Build a CSR user x course matrix from (user_id, course_id, weight) triples.
+    Returns (matrix, user_ids, course_ids) where the id arrays map rows/columns
+    back to primary keys. Repeated pairs are summed.
+    """
+    user_index, course_index = {}, {}
+    rows, cols, values = [], [], []
+
+    for user_id, course_id, weight in interactions:
+        rows.append(user_index.setdefault(user_id, len(user_index)))
+        cols.append(course_index.setdefault(course_id, len(course_index)))
+        values.append(weight)
+
+    matrix = sparse.coo_matrix(
+        (
+            np.asarray(values, dtype=np.float32),
+            (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))
+        ),
+        shape=(len(user_index), len(course_index))
+    ).tocsr()
+    matrix.sum_duplicates()
+
+    return matrix, np.fromiter(user_index, dtype=np.int64), np.fromiter(course_index, dtype=np.int64)
+
+
+def item_similarities(matrix):
+    """Item-item cosine similarity (sparse courses x courses, zero diagonal)"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+    normalized = matrix @ sparse.diags(inverse_norms)
+    similarities = (normalized.T @ normalized).tocsr()
+    similarities = (similarities - sparse.diags(similarities.diagonal())).tocsr()
+    similarities.eliminate_zeros()
+    return similarities
+
+
+def top_k_per_row(matrix, k):
+    """Yield (row, column_indices, scores) with the k best columns of each CSR row"""
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        scores = matrix.data[start:end]
+        columns = matrix.indices[start:end]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            scores, columns = scores[best], columns[best]
+        order = np.argsort(-scores, kind='stable')
+        yield row, columns[order], scores[order]
+
+
+def score_users(matrix, similarities, candidates, k):
+    """
+    Yield (row, column_indices, scores) of the top-k candidate courses of each
+    user, excluding courses the user already interacted with.
+    """
+    for start in range(0, matrix.shape[0], USER_CHUNK_SIZE):
+        block = matrix[start:start + USER_CHUNK_SIZE]
+        seen = block.copy()
+        seen.data[:] = 1
+
+        scores = (block @ similarities).tocsr()
+        # Drop courses already seen and courses that can't be recommended
+        scores = ((scores - scores.multiply(seen)) @ candidates).tocsr()
+        scores.eliminate_zeros()
+        for row, columns, values in top_k_per_row(scores, k):
+            yield start + row, columns, values
+
+
+def rebuild_recommendations(top_k=None):
+    """Recompute and store course neighbours and user recommendations"""
+    top_k = top_k or getattr(settings, 'RECOMMENDATIONS_TOP_K', 20)
+    computed_at = timezone.now()
+
+    matrix, user_ids, course_ids = build_interaction_matrix(collect_interactions())
+    logger.info(
+        f"Recommendation matrix: {matrix.shape[0]} users x {matrix.shape[1]} courses, "
+        f"{matrix.nnz} interactions"
+    )
+
+    course_links, user_links = [], []
+    if matrix.nnz:
+        similarities = item_similarities(matrix)
+
+        active_ids = set(Course.objects.filter(status=1).values_list('id', flat=True))
+        # Diagonal 0/1 matrix keeping only the columns of active courses
+        candidates = sparse.diags(
+            np.fromiter((course_id in active_ids for course_id in course_ids), dtype=np.float32)
+        )
+
+        for row, columns, scores in top_k_per_row((similarities @ candidates).tocsr(), top_k):
+            course_links.extend(
+                CourseRecommendation(
+                    course_id=int(course_ids[row]), recommended_course_id=int(course_ids[column]),
+                    score=float(score), rank=rank, computed_at=computed_at
+                )
+                for rank, (column, score) in enumerate(zip(columns, scores))
+            )
+
+        for row, columns, scores in score_users(matrix, similarities, candidates, top_k):
+            user_links.extend(
+                UserRecommendation(
+                    user_id=int(user_ids[row]), course_id=int(course_ids[column]),
+                    score=float(score), rank=rank, computed_at=computed_at
+                )
+                for rank, (column, score) in enumerate(zip(columns, scores))
+            )
+
+    with transaction.atomic():
+        CourseRecommendation.objects.all().delete()
+        UserRecommendation.objects.all().delete()
+        CourseRecommendation.objects.bulk_create(course_links, batch_size=1000)
+        UserRecommendation.objects.bulk_create(user_links, batch_size=1000)
+
+    logger.info(
+        f"Stored {len(course_links)} course neighbours and {len(user_links)} user recommendations"
+    )
+    return {'course_recommendations': len(course_links), 'user_recommendations': len(user_links)}
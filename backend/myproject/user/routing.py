@@ -5,4 +5,5 @@ from . import consumers
 websocket_urlpatterns = [
     re_path(r'ws/course/(?P<course_id>\w+)/$', consumers.CourseConsumer.as_asgi()),
     re_path(r'ws/chat/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -10,6 +10,10 @@ from django.db import models
 from django.db.models import Sum, Avg, Count
 from django.shortcuts import get_object_or_404
 from django.conf import settings
+from django.core import signing
+from .media_processing import image_variant_fields
+
+DIRECT_UPLOAD_SALT = 'user.direct-upload'
 
 User = get_user_model()
 
@@ -302,75 +306,81 @@ class ModuleWithContentsSerializer(serializers.ModelSerializer):
     
     def get_content_stats(self, obj):
         """Calculate comprehensive content statistics for a module"""
-        course = obj.course
-
-        # DEBUG: Check what subscriptions exist 
-        all_subscriptions = Subscription.objects.filter(course=course, is_active=True)
-        print(f"DEBUG - Course: {course.id}, All active subscriptions: {all_subscriptions.count()}")
-
-        completed_subscriptions = Subscription.objects.filter(
-            course=course, 
-            is_active=True, 
-            is_completed=True
-        )
-        print(f"DEBUG - Completed subscriptions: {completed_subscriptions.count()}")
-
-        # Print details of each subscription
-        for sub in completed_subscriptions:
-            print(f"DEBUG - Completed subscription: User {sub.user.id}, Completed: {sub.is_completed}")
-
-        total_enrolled = safe_int(all_subscriptions.count())
-        total_completed = safe_int(completed_subscriptions.count())
-
-        print(f"DEBUG - Final counts - Enrolled: {total_enrolled}, Completed: {total_completed}")
+        course_stats = self.get_course_stats(obj.course_id)
+        type_counts = self.get_module_type_counts(obj).get(obj.pk, {})
 
+        return {
+            **course_stats,
+            'total_contents_module': safe_int(sum(type_counts.values())),
+            'pdf_count': safe_int(type_counts.get('pdf')),
+            'video_count': safe_int(type_counts.get('video')),
+            'qcm_count': safe_int(type_counts.get('qcm')),
+        }
 
-        # Calculate completion rate (percentage of enrolled users who completed)
-        completion_rate = safe_percentage(total_completed, total_enrolled)
+    def get_course_stats(self, course_id):
+        """
+        Course-wide figures shared by every module of the course.
+        Computed once per request and kept in the serializer context.
+        """
+        from .timetracking import total_time
 
-        # Course structure counts
-        total_modules = safe_int(Module.objects.filter(course=course).count())
-        total_contents_course = safe_int(CourseContent.objects.filter(module__course=course).count())
+        cache = self.context.setdefault('course_stats', {})
+        if course_id in cache:
+            return cache[course_id]
 
-        # Average progress of all active users
-        progress_result = Subscription.objects.filter(
-            course=course, 
+        subscription_result = Subscription.objects.filter(
+            course_id=course_id,
             is_active=True
-        ).aggregate(avg_progress=Avg('progress_percentage'))
-        average_progress = safe_float(progress_result.get('avg_progress', 0))
-
-        # Time tracking statistics
-        time_result = TimeTracking.objects.filter(course=course).aggregate(
-            avg_time=Avg('duration'),
-            total_time=Sum('duration')
+        ).aggregate(
+            total_enrolled=Count('id'),
+            total_completed=Count('id', filter=models.Q(is_completed=True)),
+            avg_progress=Avg('progress_percentage')
         )
-        avg_time = safe_float(time_result.get('avg_time', 0))
-        total_time = safe_int(time_result.get('total_time', 0))
+        total_enrolled = safe_int(subscription_result.get('total_enrolled'))
+        total_completed = safe_int(subscription_result.get('total_completed'))
 
-        # Module-specific content counts
-        if hasattr(obj, 'prefetched_contents'):
-            contents = obj.prefetched_contents
-        else:
-            contents = obj.contents.all()
+        time_result = total_time(course_id=course_id)
 
-        pdf_count = safe_int(contents.filter(content_type__name__iexact='pdf').count())
-        video_count = safe_int(contents.filter(content_type__name__iexact='video').count())
-        qcm_count = safe_int(contents.filter(content_type__name__iexact='qcm').count())
-        total_contents_module = safe_int(contents.count())
-        return {
+        cache[course_id] = {
             'total_users_enrolled': total_enrolled,
             'total_users_completed': total_completed,
-            'total_modules': total_modules,
-            'total_contents_course': total_contents_course,
-            'completion_rate': completion_rate,
-            'average_progress': average_progress,
-            'total_contents_module': total_contents_module,
-            'pdf_count': pdf_count,
-            'video_count': video_count,
-            'qcm_count': qcm_count,
-            'average_time_spent': avg_time,
-            'total_time_tracked': total_time,
+            'total_modules': safe_int(Module.objects.filter(course_id=course_id).count()),
+            'total_contents_course': safe_int(
+                CourseContent.objects.filter(module__course_id=course_id).count()
+            ),
+            'completion_rate': safe_percentage(total_completed, total_enrolled),
+            'average_progress': safe_float(subscription_result.get('avg_progress', 0)),
+            'average_time_spent': safe_float(
+                time_result['total_time'] / time_result['record_count'] if time_result['record_count'] else 0
+            ),
+            'total_time_tracked': safe_int(time_result['total_time']),
         }
+        return cache[course_id]
+
+    def get_module_type_counts(self, obj):
+        """
+        Content counts per type for every module being serialized,
+        fetched with a single grouped query: {module_id: {type_name: count}}
+        """
+        counts = self.context.get('module_type_counts')
+        if counts is not None and obj.pk in counts:
+            return counts
+
+        modules = getattr(self.parent, 'instance', None) if self.parent is not None else None
+        module_ids = {module.pk for module in modules} if modules is not None else set()
+        module_ids.add(obj.pk)
+
+        counts = {module_id: {} for module_id in module_ids}
+        rows = CourseContent.objects.filter(
+            module_id__in=module_ids
+        ).values('module_id', 'content_type__name').annotate(total=Count('id'))
+        for row in rows:
+            type_name = (row['content_type__name'] or '').lower()
+            module_counts = counts[row['module_id']]
+            module_counts[type_name] = module_counts.get(type_name, 0) + row['total']
+
+        self.context['module_type_counts'] = counts
+        return counts
 # FIXED: CourseContentSerializer with proper QCM handling
 # FIXED: CourseContentSerializer with all required methods
 class CourseContentSerializer(serializers.ModelSerializer):
@@ -468,34 +478,40 @@ class CourseContentSerializer(serializers.ModelSerializer):
         
         return False
     
-    def get_time_spent(self, obj):
-        """Get time spent on this content by the user"""
+    def get_content_time(self, obj):
+        """
+        Time tracked by the user on obj: {'total_time', 'last_end_time'} or None.
+        Computed for every content of the module at once and kept in the
+        serializer context.
+        """
+        from .timetracking import aggregate_time
+
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
-            return 0
-            
-        total_time = TimeTracking.objects.filter(
-            user=request.user,
-            content=obj
-        ).aggregate(total=Sum('duration'))['total']
-        
-        return total_time or 0
+            return None
+
+        cache = self.context.setdefault('content_time', {})
+        if obj.module_id not in cache:
+            cache[obj.module_id] = {
+                row['content']: row
+                for row in aggregate_time(['content'], user=request.user, content__module_id=obj.module_id)
+            }
+        return cache[obj.module_id].get(obj.pk)
+
+    def get_time_spent(self, obj):
+        """Get time spent on this content by the user"""
+        content_time = self.get_content_time(obj)
+        return content_time['total_time'] if content_time else 0
     
     def get_last_accessed(self, obj):
         """Get last accessed time for this content"""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return None
-            
-        last_tracking = TimeTracking.objects.filter(
-            user=request.user,
-            content=obj
-        ).order_by('-end_time').first()
-        
-        return last_tracking.end_time if last_tracking else None
+        content_time = self.get_content_time(obj)
+        return content_time['last_end_time'] if content_time else None
 
 class CourseSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     progress_percentage = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
     module_count = serializers.SerializerMethodField()
@@ -518,6 +534,8 @@ class CourseSerializer(serializers.ModelSerializer):
             'average_progress',
             'description', 
             'image_url', 
+            'image_variants',
+            'image_srcset',
             'department', 
             'department_display',
             'status',
@@ -618,6 +636,17 @@ class CourseSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.image.url)
             return obj.image.url
         return None
+
+    def to_representation(self, instance):
+        # image_variants and image_srcset share one pass over the variants
+        self._image_fields = image_variant_fields(instance, self.context.get('request'))
+        return super().to_representation(instance)
+
+    def get_image_variants(self, obj):
+        return self._image_fields['image_variants']
+
+    def get_image_srcset(self, obj):
+        return self._image_fields['image_srcset']
     
     def get_calculated_estimated_duration(self, obj):
         """Get calculated duration considering only active content"""
@@ -686,6 +715,9 @@ class CourseDetailSerializer(serializers.ModelSerializer):
     module_count = serializers.SerializerMethodField()
     average_progress = serializers.SerializerMethodField() 
 
+    # Method fields without queries, computed inline by the async view
+    query_free_fields = ('status_display', 'image_url')
+
     class Meta:
         model = Course
         fields = [
@@ -1224,6 +1256,53 @@ class VideoContentCreateSerializer(serializers.ModelSerializer):
         VideoContent.objects.create(course_content=course_content, video_file=video_file)
         return course_content
 
+# Direct Upload Complete Serializer
+class DirectUploadCompleteSerializer(serializers.Serializer):
+    """
+    Creates a PDF or video content from a file the client uploaded straight
+    to the object store. The upload token, signed when the upload URL was
+    issued, binds the stored key to this module and content kind.
+    """
+    upload_token = serializers.CharField()
+    title = serializers.CharField(max_length=100)
+    caption = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    order = serializers.IntegerField()
+    estimated_duration = serializers.IntegerField(required=False, min_value=0)
+    min_required_time = serializers.IntegerField(required=False, min_value=0)
+
+    def validate_upload_token(self, value):
+        try:
+            return signing.loads(
+                value, salt=DIRECT_UPLOAD_SALT, max_age=getattr(settings, 'DIRECT_UPLOAD_EXPIRE', 3600)
+            )
+        except signing.BadSignature:
+            raise serializers.ValidationError("Invalid or expired upload token")
+
+    def validate(self, data):
+        upload = data['upload_token']
+        module = self.context['module']
+        if upload.get('module_id') != module.id or upload.get('kind') != self.context['kind']:
+            raise serializers.ValidationError("Upload token does not match this module")
+
+        storage = self.context['storage']
+        if not storage.exists(upload['key']):
+            raise serializers.ValidationError("The file has not been uploaded")
+        if storage.size(upload['key']) > settings.DIRECT_UPLOAD_MAX_SIZE[upload['kind']]:
+            raise serializers.ValidationError("The uploaded file is too large")
+        return data
+
+    def create(self, validated_data):
+        upload = validated_data.pop('upload_token')
+        model, field_name = self.context['model'], self.context['field_name']
+
+        course_content = CourseContent.objects.create(
+            module=self.context['module'],
+            content_type=self.context['content_type'],
+            **validated_data
+        )
+        model.objects.create(course_content=course_content, **{field_name: upload['key']})
+        return course_content
+
 # QCM Content Create Serializer
 class QCMContentCreateSerializer(serializers.ModelSerializer):
     # Multi-question fields
@@ -1819,27 +1898,28 @@ class FavoriteCourseSerializer(serializers.ModelSerializer):
             return obj.course.image.url
         return None
     
+    def get_subscription_progress(self):
+        """
+        {course_id: progress_percentage} of the user's active subscriptions.
+        Views may pass it in the context; otherwise it is loaded once.
+        """
+        progress = self.context.get('subscription_progress')
+        if progress is None:
+            request = self.context.get('request')
+            progress = {}
+            if request and request.user.is_authenticated:
+                progress = dict(Subscription.objects.filter(
+                    user=request.user,
+                    is_active=True
+                ).values_list('course_id', 'progress_percentage'))
+            self.context['subscription_progress'] = progress
+        return progress
+    
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Subscription.objects.filter(
-                user=request.user,
-                course=obj.course,
-                is_active=True
-            ).exists()
-        return False
+        return obj.course_id in self.get_subscription_progress()
     
     def get_progress_percentage(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            subscription = Subscription.objects.filter(
-                user=request.user,
-                course=obj.course,
-                is_active=True
-            ).first()
-            if subscription:
-                return subscription.progress_percentage
-        return 0.0
+        return self.get_subscription_progress().get(obj.course_id, 0.0)
 
 
 class FavoriteCourseCreateSerializer(serializers.ModelSerializer):
@@ -1873,6 +1953,8 @@ class FavoriteCourseCreateSerializer(serializers.ModelSerializer):
 from .models import Notification
 
 class NotificationSerializer(serializers.ModelSerializer):
+    """Serializes Notification and BroadcastNotification (annotated with is_read) alike"""
+    kind = serializers.SerializerMethodField()
     time_ago = serializers.ReadOnlyField()
     related_course_title = serializers.CharField(source='related_course.title_of_course', read_only=True, allow_null=True)
     related_module_title = serializers.CharField(source='related_module.title', read_only=True, allow_null=True)
@@ -1893,10 +1975,15 @@ class NotificationSerializer(serializers.ModelSerializer):
             'related_module',
             'related_module_title',
             'related_content',
-            'related_content_title'
+            'related_content_title',
+            'kind'
         ]
         read_only_fields = ['id', 'created_at', 'time_ago']
 
+    def get_kind(self, obj):
+        """Broadcast ids are marked read on their own route"""
+        return 'personal' if isinstance(obj, Notification) else 'broadcast'
+
 class NotificationUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
@@ -0,0 +1,265 @@
+# user/sessionization.py
+"""
+Learning sessions: TimeTracking intervals merged per user and course.
+
+Heartbeats overlap (several tabs, retries), so summing their durations
+counts the same seconds several times. The intervals of a user on a course
+are sorted by start and merged in one pass: an interval starting less than
+SESSION_IDLE_GAP_SECONDS after the end of the current session extends it,
+and only its part beyond the session's end adds covered time. A session's
+duration is the time covered by its intervals, gaps excluded.
+
+Subscription.total_time_spent is the sum of the session durations and
+average_time_per_session their mean.
+
+- sessionize() rebuilds the sessions of one (user, course) from a point in
+  time: TimeTrackingRecordView calls it after every heartbeat, from the
+  session the heartbeat falls in;
+- backfill_sessions() (the `sessionize_time_tracking` command) rebuilds every
+  session from the stored TimeTracking, merging with numpy
+  (merge_intervals_vectorized) chunk by chunk. Raw rows dropped by
+  TIME_TRACKING_RETENTION_MONTHS are gone: once retention is on, backfills
+  start at the retention cutoff and keep the older sessions.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+
+from .models import LearningSession, Subscription, TimeTracking
+
+logger = logging.getLogger(__name__)
+
+
+def idle_gap():
+    return timedelta(seconds=getattr(settings, 'SESSION_IDLE_GAP_SECONDS', 300))
+
+
+def merge_intervals(intervals, gap):
+    """
+    Sessions of (start, end) datetime intervals sorted by start: a list of
+    [start, end, covered seconds, interval count].
+    """
+    sessions = []
+    for start, end in intervals:
+        end = max(start, end)
+        if sessions and start <= sessions[-1][1] + gap:
+            session = sessions[-1]
+            covered_from = max(start, session[1])
+            if end > covered_from:
+                session[2] += (end - covered_from).total_seconds()
+                session[1] = end
+            session[3] += 1
+        else:
+            sessions.append([start, end, (end - start).total_seconds(), 1])
+    return sessions
+
+
+def merge_intervals_vectorized(keys, starts, ends, gap):
+    """
+    merge_intervals() of many groups at once. keys (group ids), starts and
+    ends (integers, e.g. milliseconds) are numpy arrays sorted by key then
+    start; returns the arrays (key, start, end, covered, count) of the sessions.
+    """
+    count = len(starts)
+    if count == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty, empty
+    ends = np.maximum(ends, starts)
+
+    new_group = np.ones(count, dtype=bool)
+    new_group[1:] = keys[1:] != keys[:-1]
+
+    # Running end of each group: groups are shifted apart so that the running
+    # max never carries over from one group to the next
+    base = starts.min()
+    span = ends.max() - base + 1
+    offset = (np.cumsum(new_group) - 1) * span
+    running_end = np.maximum.accumulate(ends - base + offset) - offset + base
+
+    previous_end = np.empty(count, dtype=running_end.dtype)
+    previous_end[0] = starts[0]
+    previous_end[1:] = running_end[:-1]
+    new_session = new_group | (starts > previous_end + gap)
+    covered = np.where(new_session, ends - starts, np.maximum(ends - np.maximum(starts, previous_end), 0))
+
+    firsts = np.flatnonzero(new_session)
+    lasts = np.append(firsts[1:] - 1, count - 1)
+    return (
+        keys[firsts], starts[firsts], running_end[lasts],
+        np.add.reduceat(covered, firsts), np.diff(np.append(firsts, count)),
+    )
+
+
+def update_subscription_time(user_id, course_id):
+    """Set total_time_spent and average_time_per_session of the subscription from its sessions"""
+    totals = LearningSession.objects.filter(user_id=user_id, course_id=course_id).aggregate(
+        total=Sum('duration'), sessions=Count('id')
+    )
+    total, sessions = totals['total'] or 0, totals['sessions']
+    Subscription.objects.filter(user_id=user_id, course_id=course_id).update(
+        total_time_spent=total, average_time_per_session=total // sessions if sessions else 0,
+    )
+    return total, sessions
+
+
+def sessionize(user_id, course_id, since=None):
+    """
+    Rebuild the sessions of user on course from TimeTracking, starting with
+    the session since falls in (all of them when None), and update the
+    subscription. Returns (total seconds, session count).
+    """
+    with transaction.atomic():
+        # Serializes concurrent heartbeats of the same subscription
+        list(Subscription.objects.select_for_update().filter(user_id=user_id, course_id=course_id).values('pk'))
+
+        sessions = LearningSession.objects.filter(user_id=user_id, course_id=course_id)
+        records = TimeTracking.objects.filter(user_id=user_id, course_id=course_id)
+        if since is not None:
+            previous = (
+                sessions.filter(start_time__lte=since).order_by('-start_time')
+                .values_list('start_time', flat=True).first()
+            )
+            since = min(previous or since, since)
+            sessions = sessions.filter(start_time__gte=since)
+            records = records.filter(start_time__gte=since)
+        sessions.delete()
+
+        intervals = records.order_by('start_time').values_list('start_time', 'end_time')
+        LearningSession.objects.bulk_create(
+            LearningSession(
+                user_id=user_id, course_id=course_id, start_time=start, end_time=end,
+                duration=round(covered), record_count=count,
+            )
+            for start, end, covered, count in merge_intervals(intervals, idle_gap())
+        )
+        return update_subscription_time(user_id, course_id)
+
+
+def to_milliseconds(value):
+    return round(value.timestamp() * 1000)
+
+
+def from_milliseconds(value):
+    return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+
+
+def _write_sessions(rows):
+    """Merge the sorted (user_id, course_id, start, end) rows and store their sessions; returns the count"""
+    pairs, keys = [], []
+    for user_id, course_id, _, _ in rows:
+        if not pairs or pairs[-1] != (user_id, course_id):
+            pairs.append((user_id, course_id))
+        keys.append(len(pairs) - 1)
+
+    session_keys, starts, ends, covered, counts = merge_intervals_vectorized(
+        np.array(keys, dtype=np.int64),
+        np.array([to_milliseconds(row[2]) for row in rows], dtype=np.int64),
+        np.array([to_milliseconds(row[3]) for row in rows], dtype=np.int64),
+        round(idle_gap().total_seconds() * 1000),
+    )
+    LearningSession.objects.bulk_create(
+        (
+            LearningSession(
+                user_id=pairs[key][0], course_id=pairs[key][1],
+                start_time=from_milliseconds(int(start)), end_time=from_milliseconds(int(end)),
+                duration=round(int(duration) / 1000), record_count=int(count),
+            )
+            for key, start, end, duration, count in zip(session_keys, starts, ends, covered, counts)
+        ),
+        batch_size=2000,
+    )
+    return len(session_keys)
+
+
+def session_boundary(since):
+    """
+    Earliest start of a session that records at or after since could still
+    extend, so that rebuilding from it never merges a record twice. Repeated
+    until no session straddles the boundary.
+    """
+    gap = idle_gap()
+    while True:
+        earlier = LearningSession.objects.filter(
+            start_time__lt=since, end_time__gte=since - gap
+        ).aggregate(start=Min('start_time'))['start']
+        if earlier is None:
+            return since
+        since = earlier
+
+
+def backfill_sessions(since=None, chunk_size=100_000, stdout=None):
+    """
+    Rebuild the sessions from since (all of them when None) from TimeTracking,
+    then the time of every subscription with sessions. since moves back to the
+    start of the sessions it falls in. Once retention has dropped raw rows
+    (user/timetracking.py), since is at least the retention cutoff: the older
+    sessions cannot be rebuilt and are kept; ValueError when a session kept
+    would straddle the cutoff.
+    Subscriptions without any tracked interval keep their time.
+    Returns {'records', 'sessions', 'subscriptions', 'since'}.
+    """
+    from .timetracking import retention_cutoff, rollups_enabled
+
+    cutoff = retention_cutoff() if rollups_enabled() else None
+    if cutoff is not None and (since is None or since < cutoff):
+        logger.info(f"Sessionizing from the time tracking retention cutoff {cutoff:%Y-%m-%d}")
+        since = cutoff
+    if since is not None:
+        since = session_boundary(since)
+        if cutoff is not None and since < cutoff:
+            raise ValueError(
+                f"A session starting {since:%Y-%m-%d %H:%M} spans the retention cutoff "
+                f"{cutoff:%Y-%m-%d}: sessionize from a later date"
+            )
+
+    records = TimeTracking.objects.all()
+    sessions = LearningSession.objects.all()
+    if since is not None:
+        records = records.filter(start_time__gte=since)
+        sessions = sessions.filter(start_time__gte=since)
+
+    with transaction.atomic():
+        sessions.delete()
+        stats = {'records': 0, 'sessions': 0, 'subscriptions': 0, 'since': since}
+        buffer = []
+        rows = records.order_by('user_id', 'course_id', 'start_time').values_list(
+            'user_id', 'course_id', 'start_time', 'end_time'
+        )
+        for row in rows.iterator(chunk_size=10_000):
+            # Chunks end on a (user, course) boundary
+            if len(buffer) >= chunk_size and buffer[-1][:2] != row[:2]:
+                stats['sessions'] += _write_sessions(buffer)
+                stats['records'] += len(buffer)
+                if stdout is not None:
+                    stdout.write(f"  {stats['records']} records, {stats['sessions']} sessions")
+                buffer = []
+            buffer.append(row)
+        if buffer:
+            stats['sessions'] += _write_sessions(buffer)
+            stats['records'] += len(buffer)
+
+        totals = {
+            (row['user_id'], row['course_id']): (row['total'], row['sessions'])
+            for row in LearningSession.objects.values('user_id', 'course_id').annotate(
+                total=Sum('duration'), sessions=Count('id')
+            ).order_by()
+        }
+        updated = []
+        for subscription in Subscription.objects.only('id', 'user_id', 'course_id').iterator(chunk_size=2000):
+            if (subscription.user_id, subscription.course_id) not in totals:
+                continue
+            total, count = totals[subscription.user_id, subscription.course_id]
+            subscription.total_time_spent = total
+            subscription.average_time_per_session = total // count
+            updated.append(subscription)
+        Subscription.objects.bulk_update(
+            updated, ['total_time_spent', 'average_time_per_session'], batch_size=1000,
+        )
+        stats['subscriptions'] = len(updated)
+
+    logger.info(f"Sessionized {stats['records']} time tracking records into {stats['sessions']} sessions")
+    return stats
@@ -1,13 +1,14 @@
 # user/signals.py
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 import logging
-from .models import Course, Module, CourseContent, Subscription, Notification, CustomUser
+from .models import Course, Module, CourseContent, Subscription, Notification, BroadcastNotification, CustomUser, FavoriteCourse, PDFContent, VideoContent
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +36,16 @@ def get_department_users(course):
     
     return users_query
 
+
+def broadcast_notification(course, **fields):
+    """One notification for the users get_department_users(course) targets"""
+    return BroadcastNotification.objects.create(
+        audience='department',
+        department=course.department or '',
+        excluded_user=course.creator,
+        **fields
+    )
+
 # ============================================================================
 # COURSE ACTIVATION SIGNAL - Notify All Department Users
 # ============================================================================
@@ -46,10 +57,23 @@ def store_old_course_status(sender, instance, **kwargs):
         try:
             old_course = Course.objects.get(pk=instance.pk)
             instance._old_status = old_course.status
+            instance._old_title = old_course.title_of_course
+            instance._old_image = old_course.image.name
+            instance._old_image_variants = old_course.image_variants
         except Course.DoesNotExist:
             instance._old_status = None
+            instance._old_title = None
+            instance._old_image = None
+            instance._old_image_variants = {}
     else:
         instance._old_status = None
+        instance._old_title = None
+        instance._old_image = None
+        instance._old_image_variants = {}
+
+    # Variants of a replaced image are stale until regenerated
+    if instance.pk and instance.image.name != instance._old_image:
+        instance.image_variants = {}
 
 @receiver(post_save, sender=Course)
 def send_course_activation_email(sender, instance, created, **kwargs):
@@ -75,6 +99,15 @@ def send_course_activation_email(sender, instance, created, **kwargs):
                 logger.info(f"No users found in department for course: {instance.title_of_course}")
                 return
             
+            # One notification for the whole department
+            broadcast_notification(
+                instance,
+                notification_type='course_activated',
+                title="New course available",
+                message=f"The course '{instance.title_of_course}' is now available in your department.",
+                related_course=instance
+            )
+
             subject = f"New Course Available: {instance.title_of_course}"
             from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', settings.EMAIL_HOST_USER)
             
@@ -92,15 +125,6 @@ def send_course_activation_email(sender, instance, created, **kwargs):
                         is_active=True
                     ).exists()
                     
-                    # Create notification
-                    Notification.objects.create(
-                        user=user,
-                        notification_type='course_activated',
-                        title="New course available",
-                        message=f"The course '{instance.title_of_course}' is now available in your department.",
-                        related_course=instance
-                    )
-                    
                     # Prepare course URL
                     course_url = f"{getattr(settings, 'FRONTEND_URL', 'http://51.178.87.234:3000')}/courses/{instance.id}"
                     
@@ -164,10 +188,13 @@ def store_old_module_status(sender, instance, **kwargs):
         try:
             old_module = Module.objects.get(pk=instance.pk)
             instance._old_status = old_module.status
+            instance._old_title = old_module.title
         except Module.DoesNotExist:
             instance._old_status = None
+            instance._old_title = None
     else:
         instance._old_status = None
+        instance._old_title = None
 
 @receiver(post_save, sender=Module)
 def send_module_activation_email(sender, instance, created, **kwargs):
@@ -188,6 +215,15 @@ def send_module_activation_email(sender, instance, created, **kwargs):
                 logger.info("No users found in department")
                 return
             
+            broadcast_notification(
+                instance.course,
+                notification_type='module_activated',
+                title="New module available",
+                message=f"The module '{instance.title}' is available in course '{instance.course.title_of_course}'.",
+                related_course=instance.course,
+                related_module=instance
+            )
+
             subject = f"New Module Available: {instance.title}"
             from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', settings.EMAIL_HOST_USER)
             
@@ -204,16 +240,6 @@ def send_module_activation_email(sender, instance, created, **kwargs):
                         is_active=True
                     ).exists()
                     
-                    # Create notification
-                    Notification.objects.create(
-                        user=user,
-                        notification_type='module_activated',
-                        title="New module available",
-                        message=f"The module '{instance.title}' is available in course '{instance.course.title_of_course}'.",
-                        related_course=instance.course,
-                        related_module=instance
-                    )
-                    
                     # Prepare module URL
                     module_url = f"{getattr(settings, 'FRONTEND_URL', 'http://51.178.87.234:3000')}/courses/{instance.course.id}/modules/{instance.id}"
                     
@@ -274,12 +300,15 @@ def store_old_content_status(sender, instance, **kwargs):
         try:
             old_content = CourseContent.objects.get(pk=instance.pk)
             instance._old_status = old_content.status
+            instance._old_title = old_content.title
             instance._is_new = False
         except CourseContent.DoesNotExist:
             instance._old_status = None
+            instance._old_title = None
             instance._is_new = True
     else:
         instance._old_status = None
+        instance._old_title = None
         instance._is_new = True
 
 @receiver(post_save, sender=CourseContent)
@@ -315,6 +344,16 @@ def send_content_notification_email(sender, instance, created, **kwargs):
             logger.info("No users found in department")
             return
         
+        broadcast_notification(
+            instance.module.course,
+            notification_type='content_activated',
+            title="New content available",
+            message=f"The content '{instance.title}' has been {action} in module '{instance.module.title}'.",
+            related_course=instance.module.course,
+            related_module=instance.module,
+            related_content=instance
+        )
+
         subject = f"New Content Available: {instance.title}"
         from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', settings.EMAIL_HOST_USER)
         
@@ -331,17 +370,6 @@ def send_content_notification_email(sender, instance, created, **kwargs):
                     is_active=True
                 ).exists()
                 
-                # Create notification
-                Notification.objects.create(
-                    user=user,
-                    notification_type='content_activated',
-                    title="New content available",
-                    message=f"The content '{instance.title}' has been {action} in module '{instance.module.title}'.",
-                    related_course=instance.module.course,
-                    related_module=instance.module,
-                    related_content=instance
-                )
-                
                 # Prepare content URL
                 content_url = f"{getattr(settings, 'FRONTEND_URL', 'http://51.178.87.234:3000')}/courses/{instance.module.course.id}/modules/{instance.module.id}/contents/{instance.id}"
                 
@@ -394,3 +422,170 @@ def send_content_notification_email(sender, instance, created, **kwargs):
                     
     except Exception as e:
         logger.error(f"❌ Error: {str(e)}")
+
+
+# ============================================================================
+# SUBSCRIPTION FEED CACHE - Drop a user's cached feed on progress writes
+# ============================================================================
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=FavoriteCourse)
+@receiver(post_delete, sender=FavoriteCourse)
+def invalidate_subscription_feed_cache(sender, instance, **kwargs):
+    from .views import invalidate_subscription_feed
+    invalidate_subscription_feed(instance.user_id)
+
+@receiver(m2m_changed, sender=Subscription.completed_contents.through)
+def invalidate_subscription_feed_on_completion(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    from .views import invalidate_subscription_feed
+    if not reverse:
+        invalidate_subscription_feed(instance.user_id)
+    elif pk_set:
+        for user_id in Subscription.objects.filter(pk__in=pk_set).values_list('user_id', flat=True):
+            invalidate_subscription_feed(user_id)
+
+
+# ============================================================================
+# SIMILAR COURSES INDEX - Refresh a course when it enters or leaves the catalog
+# ============================================================================
+
+@receiver(post_save, sender=Course)
+def refresh_similar_courses_index(sender, instance, created, **kwargs):
+    old_status = getattr(instance, '_old_status', None)
+    if instance.status != old_status and 1 in (instance.status, old_status):
+        from .tasks import enqueue_task, refresh_similar_course
+        enqueue_task(refresh_similar_course, instance.pk)
+
+@receiver(post_delete, sender=Course)
+def drop_course_from_similar_index(sender, instance, **kwargs):
+    if instance.status == 1:
+        from .tasks import enqueue_task, refresh_similar_course
+        enqueue_task(refresh_similar_course, instance.pk)
+
+
+# ============================================================================
+# SEARCH SUGGEST INDEX - Notify workers when a searchable title changes
+# ============================================================================
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Module)
+@receiver(post_save, sender=CourseContent)
+def notify_search_suggest_on_save(sender, instance, created, **kwargs):
+    title = instance.title_of_course if sender is Course else instance.title
+    old_title = getattr(instance, '_old_title', None)
+    old_status = getattr(instance, '_old_status', None)
+    if created or title != old_title or instance.status != old_status:
+        from .suggest import notify_suggest_index_changed
+        transaction.on_commit(notify_suggest_index_changed)
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Module)
+@receiver(post_delete, sender=CourseContent)
+def notify_search_suggest_on_delete(sender, instance, **kwargs):
+    from .suggest import notify_suggest_index_changed
+    transaction.on_commit(notify_suggest_index_changed)
+
+
+# ============================================================================
+# PDF TEXT EXTRACTION - Process uploaded documents in the background
+# ============================================================================
+
+@receiver(pre_save, sender=PDFContent)
+def store_old_pdf_file(sender, instance, **kwargs):
+    instance._old_pdf_file = None
+    if instance.pk:
+        instance._old_pdf_file = PDFContent.objects.filter(
+            pk=instance.pk
+        ).values_list('pdf_file', flat=True).first()
+
+@receiver(post_save, sender=PDFContent)
+def queue_pdf_text_extraction(sender, instance, created, **kwargs):
+    if instance.pdf_file and (created or instance.pdf_file.name != getattr(instance, '_old_pdf_file', None)):
+        from .tasks import enqueue_task, extract_pdf_text
+        enqueue_task(extract_pdf_text, instance.pk)
+
+
+# ============================================================================
+# VIDEO METADATA PROBE - Read duration and resolution after upload
+# ============================================================================
+
+@receiver(pre_save, sender=VideoContent)
+def store_old_video_file(sender, instance, **kwargs):
+    instance._old_video_file = None
+    if instance.pk:
+        instance._old_video_file = VideoContent.objects.filter(
+            pk=instance.pk
+        ).values_list('video_file', flat=True).first()
+
+@receiver(post_save, sender=VideoContent)
+def queue_video_metadata_probe(sender, instance, created, **kwargs):
+    if instance.video_file and (created or instance.video_file.name != getattr(instance, '_old_video_file', None)):
+        from .tasks import enqueue_task, probe_video_metadata
+        enqueue_task(probe_video_metadata, instance.pk)
+
+
+# ============================================================================
+# COURSE IMAGE VARIANTS - Generate thumbnails after an image upload
+# ============================================================================
+
+@receiver(post_save, sender=Course)
+def queue_course_image_variants(sender, instance, created, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if instance.image.name == old_image:
+        return
+
+    stale_paths = [
+        path
+        for paths in (getattr(instance, '_old_image_variants', None) or {}).values()
+        for path in paths.values()
+    ]
+    if instance.image or stale_paths:
+        from .tasks import enqueue_task, generate_course_image_variants
+        enqueue_task(generate_course_image_variants, instance.pk, stale_paths)
+
+
+# ============================================================================
+# MEDIA BLOB REFERENCES - Keep content-addressed blob reference counts
+# ============================================================================
+
+@receiver(post_save, sender=PDFContent)
+@receiver(post_save, sender=VideoContent)
+def update_media_blob_references(sender, instance, created, **kwargs):
+    from .storage import adjust_blob_references
+
+    field = instance.pdf_file if sender is PDFContent else instance.video_file
+    old_name = getattr(instance, '_old_pdf_file' if sender is PDFContent else '_old_video_file', None)
+    if created or field.name != old_name:
+        adjust_blob_references(field.name, 1)
+        if not created:
+            adjust_blob_references(old_name, -1)
+
+@receiver(post_delete, sender=PDFContent)
+@receiver(post_delete, sender=VideoContent)
+def release_media_blob_reference(sender, instance, **kwargs):
+    from .storage import adjust_blob_references
+
+    field = instance.pdf_file if sender is PDFContent else instance.video_file
+    adjust_blob_references(field.name, -1)
+
+
+# ============================================================================
+# NOTIFICATION COUNTERS - Count new notifications and push them over WebSocket
+# ============================================================================
+
+@receiver(post_save, sender=Notification)
+@receiver(post_save, sender=BroadcastNotification)
+def announce_new_notification(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if sender is Notification:
+        from .notifications import announce_notification
+        transaction.on_commit(lambda: announce_notification(instance), robust=True)
+    else:
+        # The audience can be every user: counted off the request
+        from .tasks import announce_broadcast_notification, enqueue_task
+        enqueue_task(announce_broadcast_notification, instance.pk)
@@ -0,0 +1,332 @@
+# user/similarity.py
+"""
+Content-based "similar courses" index.
+
+Every active course becomes a TF-IDF vector built from its title, description,
+module titles and content captions. Cosine nearest neighbours are precomputed
+and stored with a small card of each course, so a lookup is a dictionary read
+with no database access.
+
+The index is persisted to SIMILARITY_INDEX_PATH. Each worker keeps it in
+memory and reloads it when the file changes; activating or deactivating a
+course updates it incrementally, and a nightly job rebuilds it from scratch
+(which also refreshes the vocabulary and IDF weights).
+"""
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+
+from .models import Course, Module, CourseContent
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'[a-z0-9]{2,}')
+
+STOP_WORDS = {
+    # English
+    'the', 'and', 'for', 'with', 'this', 'that', 'from', 'are', 'you', 'your',
+    'how', 'what', 'into', 'our', 'all', 'can', 'will', 'not', 'but', 'its',
+    'of', 'to', 'in', 'on', 'is', 'an', 'by', 'be', 'or', 'as', 'at', 'it',
+    # French
+    'le', 'la', 'les', 'un', 'une', 'des', 'du', 'de', 'et', 'en', 'au', 'aux',
+    'pour', 'par', 'sur', 'dans', 'avec', 'ce', 'ces', 'cette', 'est', 'sont',
+    'qui', 'que', 'vous', 'nous', 'votre', 'vos', 'son', 'sa', 'ses', 'il', 'elle',
+}
+
+# Title tokens count more than body text
+TITLE_WEIGHT = 2
+
+# Rows scored per sparse product when building, bounds the dense block size
+BUILD_CHUNK_SIZE = 1000
+
+
+def normalize_text(text):
+    """Lowercase and strip accents"""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(normalize_text(text)) if token not in STOP_WORDS]
+
+
+def course_card(course):
+    """Minimal payload returned for a similar course"""
+    return {
+        'id': course.id,
+        'title_of_course': course.title_of_course,
+        'department': course.department,
+        'image_url': course.image.url if course.image else None,
+    }
+
+
+def load_course_documents(course_ids=None):
+    """
+    Return {course_id: (tokens, card)} for active courses, using one query
+    per source (courses, module titles, content captions).
+    """
+    courses = Course.objects.filter(status=1)
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+
+    documents = {}
+    for course in courses.only('id', 'title_of_course', 'description', 'department', 'image'):
+        tokens = tokenize(course.title_of_course) * TITLE_WEIGHT + tokenize(course.description)
+        documents[course.id] = (tokens, course_card(course))
+
+    for course_id, title in Module.objects.filter(
+        course_id__in=documents
+    ).values_list('course_id', 'title'):
+        documents[course_id][0].extend(tokenize(title))
+
+    for course_id, title, caption in CourseContent.objects.filter(
+        module__course_id__in=documents
+    ).values_list('module__course_id', 'title', 'caption'):
+        documents[course_id][0].extend(tokenize(f"{title} {caption}"))
+
+    return documents
+
+
+def top_neighbours(scores, course_ids, k, exclude=None):
+    """[(course_id, score)] of the k highest positive scores"""
+    candidates = np.flatnonzero(scores > 0)
+    if exclude is not None:
+        candidates = candidates[candidates != exclude]
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return [(int(course_ids[i]), round(float(scores[i]), 4)) for i in candidates]
+
+
+class SimilarCoursesIndex:
+    def __init__(self, course_ids, vocabulary, idf, matrix, neighbours, cards, top_k):
+        self.course_ids = course_ids        # row -> course id
+        self.vocabulary = vocabulary        # term -> column
+        self.idf = idf
+        self.matrix = matrix                # L2-normalized TF-IDF rows (CSR)
+        self.neighbours = neighbours        # course id -> [(course id, score)]
+        self.cards = cards                  # course id -> course card
+        self.top_k = top_k
+
+    @classmethod
+    def build(cls, top_k=None):
+        top_k = top_k or getattr(settings, 'SIMILARITY_INDEX_TOP_K', 10)
+        documents = load_course_documents()
+        course_ids = np.fromiter(documents, dtype=np.int64, count=len(documents))
+
+        document_frequency = Counter()
+        for tokens, _ in documents.values():
+            document_frequency.update(set(tokens))
+        vocabulary = {term: column for column, term in enumerate(sorted(document_frequency))}
+
+        # Smoothed IDF, as in scikit-learn
+        n_documents = len(documents)
+        idf = np.zeros(len(vocabulary), dtype=np.float32)
+        for term, column in vocabulary.items():
+            idf[column] = math.log((1 + n_documents) / (1 + document_frequency[term])) + 1
+
+        index = cls(course_ids, vocabulary, idf, None, {}, {}, top_k)
+        index.matrix = sparse.vstack(
+            [index.vectorize(tokens) for tokens, _ in documents.values()]
+            or [sparse.csr_matrix((0, len(vocabulary)), dtype=np.float32)]
+        ).tocsr()
+        index.cards = {course_id: card for course_id, (_, card) in documents.items()}
+
+        for start in range(0, n_documents, BUILD_CHUNK_SIZE):
+            similarities = (index.matrix[start:start + BUILD_CHUNK_SIZE] @ index.matrix.T).toarray()
+            for offset, scores in enumerate(similarities):
+                index.neighbours[int(course_ids[start + offset])] = top_neighbours(
+                    scores, course_ids, top_k, exclude=start + offset
+                )
+        return index
+
+    def vectorize(self, tokens):
+        """1 x V L2-normalized TF-IDF row; terms outside the vocabulary are ignored"""
+        counts = Counter(self.vocabulary[token] for token in tokens if token in self.vocabulary)
+        columns = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        values = np.array([1 + math.log(counts[column]) for column in columns], dtype=np.float32)
+        values *= self.idf[columns]
+        norm = np.linalg.norm(values)
+        if norm > 0:
+            values /= norm
+        return sparse.csr_matrix(
+            (values, (np.zeros(len(columns), dtype=np.int64), columns)),
+            shape=(1, len(self.vocabulary))
+        )
+
+    def similar(self, course_id, limit=None):
+        neighbours = self.neighbours.get(course_id, [])[:limit or self.top_k]
+        return [
+            {**self.cards[neighbour_id], 'score': score}
+            for neighbour_id, score in neighbours
+            if neighbour_id in self.cards
+        ]
+
+    def remove(self, course_id):
+        rows = np.flatnonzero(self.course_ids == course_id)
+        if len(rows):
+            keep = np.ones(len(self.course_ids), dtype=bool)
+            keep[rows] = False
+            self.course_ids = self.course_ids[keep]
+            self.matrix = self.matrix[keep]
+        self.neighbours.pop(course_id, None)
+        self.cards.pop(course_id, None)
+        for course_neighbours in self.neighbours.values():
+            course_neighbours[:] = [item for item in course_neighbours if item[0] != course_id]
+
+    def upsert(self, course_id, tokens, card):
+        """Add or replace one course and update the neighbour lists it enters"""
+        self.remove(course_id)
+        vector = self.vectorize(tokens)
+        scores = (self.matrix @ vector.T).toarray().ravel()
+
+        self.neighbours[course_id] = top_neighbours(scores, self.course_ids, self.top_k)
+        for row in np.flatnonzero(scores > 0):
+            other_neighbours = self.neighbours.setdefault(int(self.course_ids[row]), [])
+            other_neighbours.append((course_id, round(float(scores[row]), 4)))
+            other_neighbours.sort(key=lambda item: -item[1])
+            del other_neighbours[self.top_k:]
+
+        self.course_ids = np.append(self.course_ids, np.int64(course_id))
+        self.matrix = sparse.vstack([self.matrix, vector]).tocsr()
+        self.cards[course_id] = card
+
+    def save(self, path):
+        """Write the index atomically (temporary file + rename)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {
+            'vocabulary': self.vocabulary,
+            'neighbours': {str(key): value for key, value in self.neighbours.items()},
+            'cards': {str(key): value for key, value in self.cards.items()},
+            'top_k': self.top_k,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    course_ids=self.course_ids,
+                    idf=self.idf,
+                    data=self.matrix.data,
+                    indices=self.matrix.indices,
+                    indptr=self.matrix.indptr,
+                    shape=np.array(self.matrix.shape),
+                    meta=np.array(json.dumps(meta)),
+                )
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            matrix = sparse.csr_matrix(
+                (arrays['data'], arrays['indices'], arrays['indptr']),
+                shape=tuple(arrays['shape'])
+            )
+            return cls(
+                course_ids=arrays['course_ids'],
+                vocabulary=meta['vocabulary'],
+                idf=arrays['idf'],
+                matrix=matrix,
+                neighbours={
+                    int(key): [tuple(item) for item in value]
+                    for key, value in meta['neighbours'].items()
+                },
+                cards={int(key): value for key, value in meta['cards'].items()},
+                top_k=meta['top_k'],
+            )
+
+
+# ============================================================================
+# Per-process copy of the index
+# ============================================================================
+
+_index = None
+_index_mtime = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_index_path():
+    return getattr(settings, 'SIMILARITY_INDEX_PATH', os.path.join(settings.BASE_DIR, 'indexes', 'similar_courses.npz'))
+
+
+def get_index():
+    """
+    In-memory index of this worker, reloaded when the file on disk changes.
+    The file is stat'ed at most once per SIMILARITY_INDEX_CHECK_INTERVAL.
+    """
+    global _index, _index_mtime, _index_checked_at
+
+    now = time.monotonic()
+    if _index is not None and now - _index_checked_at < getattr(settings, 'SIMILARITY_INDEX_CHECK_INTERVAL', 5):
+        return _index
+
+    with _index_lock:
+        _index_checked_at = now
+        path = get_index_path()
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return _index
+        if mtime != _index_mtime:
+            _index = SimilarCoursesIndex.load(path)
+            _index_mtime = mtime
+    return _index
+
+
+class index_write_lock:
+    """Serialize writers across processes with an exclusive file lock"""
+
+    def __enter__(self):
+        path = get_index_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock_file = open(f"{path}.lock", 'w')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+
+
+def rebuild_index():
+    """Rebuild the whole index from the database and persist it"""
+    with index_write_lock():
+        index = SimilarCoursesIndex.build()
+        index.save(get_index_path())
+    logger.info(f"Similar courses index rebuilt with {len(index.course_ids)} courses")
+    return len(index.course_ids)
+
+
+def refresh_course(course_id):
+    """Incrementally add, update or drop one course depending on its status"""
+    with index_write_lock():
+        path = get_index_path()
+        if not os.path.exists(path):
+            index = SimilarCoursesIndex.build()
+        else:
+            index = SimilarCoursesIndex.load(path)
+            documents = load_course_documents([course_id])
+            if course_id in documents:
+                tokens, card = documents[course_id]
+                index.upsert(course_id, tokens, card)
+            else:
+                index.remove(course_id)
+        index.save(path)
@@ -0,0 +1,122 @@
+# user/storage.py
+"""
+Storage backends for course media (VideoContent.video_file, PDFContent.pdf_file).
+
+The backend is picked by the MEDIA_STORAGE setting through the 'course_media'
+entry of STORAGES ('s3' is implemented in user/storage_s3.py). With MEDIA_STORAGE=content_addressed, uploads are hashed
+while they are written and stored once per SHA-256 digest under blobs/;
+re-uploading a file an instructor already used only adds a reference to the
+existing blob. MediaBlob rows keep a reference count per blob and the
+gc_media_blobs command deletes blobs nobody references anymore.
+
+Files saved before the switch keep their names and are served as before.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs'
+
+
+def course_media_storage():
+    """Callable storage of the course media file fields"""
+    return storages['course_media']
+
+
+def open_for_ranged_reads(field_file):
+    """
+    Open a stored file for parsers that seek and read small parts of it.
+    Remote storages providing open_range_reader fetch only those ranges.
+    """
+    storage = field_file.storage
+    if hasattr(storage, 'open_range_reader'):
+        return storage.open_range_reader(field_file.name)
+    return field_file.open('rb')
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f'{BLOB_PREFIX}/')
+
+
+def blob_name(digest, extension):
+    """blobs/ab/cd/abcd....pdf - two fan-out levels keep directories small"""
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names every file after its content digest"""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        blobs_root = self.path(BLOB_PREFIX)
+        os.makedirs(blobs_root, exist_ok=True)
+
+        # Hash and write in a single pass over the upload
+        digest, size = hashlib.sha256(), 0
+        fd, tmp_path = tempfile.mkstemp(dir=blobs_root, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            # The blob row is locked while the file is put in place, so that
+            # gc_media_blobs cannot delete it under this upload
+            with transaction.atomic():
+                blob = MediaBlob.objects.select_for_update().filter(digest=digest.hexdigest()).first()
+                if blob is None:
+                    blob, created = MediaBlob.objects.get_or_create(
+                        digest=digest.hexdigest(),
+                        defaults={'name': blob_name(digest.hexdigest(), os.path.splitext(name)[1]), 'size': size},
+                    )
+                    if not created:
+                        blob = MediaBlob.objects.select_for_update().get(pk=blob.pk)
+                # Restarts the grace period until the content referencing it is saved
+                MediaBlob.objects.filter(pk=blob.pk).update(last_uploaded_at=timezone.now())
+
+                # One name per digest: a copy uploaded under another extension
+                # reuses the blob already stored
+                final_name = blob.name
+                final_path = self.path(final_name)
+                if os.path.exists(final_path):
+                    # Duplicate: the blob is already stored, drop the new copy
+                    os.remove(tmp_path)
+                else:
+                    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(tmp_path, self.file_permissions_mode)
+                    os.replace(tmp_path, final_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return final_name
+
+
+def adjust_blob_references(name, delta):
+    """Add delta to the reference count of the blob stored under name"""
+    from .models import MediaBlob
+
+    if is_blob_name(name):
+        with transaction.atomic():
+            # Same row lock as ContentAddressedStorage._save and gc_media_blobs
+            blobs = MediaBlob.objects.select_for_update().filter(name=name)
+            list(blobs.values('pk'))
+            blobs.update(ref_count=Greatest(F('ref_count') + delta, 0))
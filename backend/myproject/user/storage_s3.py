@@ -0,0 +1,153 @@
+# user/storage_s3.py
+"""
+S3-compatible storage for course media (MEDIA_STORAGE=s3), e.g. AWS S3 or a
+MinIO container (see the minio service in docker-compose.yml).
+
+Files never go through the Django workers:
+- instructors upload straight to the bucket with a presigned POST
+  (presigned_upload) and then call the upload-complete endpoint, which
+  creates the VideoContent/PDFContent pointing to the uploaded key;
+- serializers get short-lived presigned GET URLs from url(), cached per
+  object so a catalog page doesn't sign the same key over and over;
+- background jobs read only the byte ranges they need (open_range_reader).
+"""
+import io
+import logging
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+from django.core.cache import cache
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+logger = logging.getLogger(__name__)
+
+
+class PresignedS3Storage(S3Storage):
+    def __init__(self, **settings_overrides):
+        # Endpoint used in URLs handed to browsers, when the storage endpoint
+        # is only reachable from inside the deployment (http://minio:9000)
+        self.public_endpoint_url = settings_overrides.pop('public_endpoint_url', None)
+        super().__init__(**settings_overrides)
+        self._signing_client = None
+
+    @property
+    def signing_client(self):
+        """Client used to sign URLs; signing is local, no request is sent"""
+        if self._signing_client is None:
+            if self.public_endpoint_url:
+                self._signing_client = boto3.client(
+                    's3',
+                    aws_access_key_id=self.access_key,
+                    aws_secret_access_key=self.secret_key,
+                    region_name=self.region_name,
+                    endpoint_url=self.public_endpoint_url,
+                    config=self.client_config or Config(signature_version='s3v4'),
+                )
+            else:
+                self._signing_client = self.connection.meta.client
+        return self._signing_client
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if parameters or http_method or self.custom_domain:
+            return super().url(name, parameters, expire, http_method)
+
+        expire = expire or self.querystring_expire
+        key = self._normalize_name(clean_name(name))
+        cache_key = f'presigned_url:{self.bucket_name}:{expire}:{key}'
+        url = cache.get(cache_key)
+        if url is None:
+            url = self.signing_client.generate_presigned_url(
+                'get_object', Params={'Bucket': self.bucket_name, 'Key': key}, ExpiresIn=expire
+            )
+            # Hand out a cached URL only while it has a useful lifetime left
+            margin = getattr(settings, 'PRESIGNED_URL_CACHE_MARGIN', 60)
+            if expire > margin:
+                cache.set(cache_key, url, timeout=expire - margin)
+        return url
+
+    def presigned_upload(self, name, content_type_prefix, max_size, expire=None):
+        """
+        Presigned POST letting a browser upload one object under name, limited
+        to max_size bytes and to Content-Type values starting with
+        content_type_prefix. Returns {'url': ..., 'fields': {...}}.
+        """
+        key = self._normalize_name(clean_name(name))
+        return self.signing_client.generate_presigned_post(
+            Bucket=self.bucket_name,
+            Key=key,
+            Conditions=[
+                ['content-length-range', 1, max_size],
+                ['starts-with', '$Content-Type', content_type_prefix],
+            ],
+            ExpiresIn=expire or getattr(settings, 'DIRECT_UPLOAD_EXPIRE', 3600),
+        )
+
+    def open_range_reader(self, name):
+        return S3RangeFile(
+            self.connection.meta.client, self.bucket_name,
+            self._normalize_name(clean_name(name)), self.size(name)
+        )
+
+
+class S3RangeFile(io.RawIOBase):
+    """
+    Read-only, seekable view of an object that fetches only the ranges read,
+    block by block. Lets header parsers (video probe, pypdf) work on large
+    objects without downloading them.
+    """
+
+    BLOCK_SIZE = 256 * 1024
+
+    def __init__(self, client, bucket, key, size):
+        self.client, self.bucket, self.key, self.size = client, bucket, key, size
+        self.position = 0
+        self.block_start, self.block = 0, b''
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def fetch(self, start):
+        end = min(start + self.BLOCK_SIZE, self.size) - 1
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f'bytes={start}-{end}')
+        self.block_start, self.block = start, response['Body'].read()
+        self.requests += 1
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        size = min(size, self.size - self.position)
+        chunks = []
+        while size > 0:
+            offset = self.position - self.block_start
+            if not 0 <= offset < len(self.block):
+                self.fetch(self.position)
+                offset = 0
+                if not self.block:
+                    break
+            chunk = self.block[offset:offset + size]
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
@@ -0,0 +1,191 @@
+# user/suggest.py
+"""
+In-memory prefix index for search autocomplete.
+
+Titles of active courses, modules and contents are split into normalized
+tokens kept in a sorted array, each pointing to the entries that contain it.
+A query token matches every indexed token it prefixes, found with two
+binary searches, so suggestions are answered without touching the database.
+
+Each worker loads the index at startup (see preload_suggest_index, called
+from the ASGI/WSGI entry points) or on first use. Saving or deleting a course,
+module or content bumps a version number in the shared cache; workers notice
+the new version (checked at most once per SEARCH_SUGGEST_CHECK_INTERVAL) and
+rebuild in a background thread while still serving the previous index.
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import Course, Module, CourseContent
+from .similarity import normalize_text
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_VERSION_KEY = 'search_suggest:version'
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Courses are suggested before modules, modules before contents
+TYPE_RANK = {'course': 0, 'module': 1, 'content': 2}
+
+
+def suggest_tokens(text):
+    return WORD_RE.findall(normalize_text(text))
+
+
+class SuggestIndex:
+    def __init__(self, entries):
+        # entries: [(type, id, title, course_id)]
+        self.entries = entries
+        self.normalized_titles = [normalize_text(entry[2]) for entry in entries]
+
+        postings = {}
+        for position, entry in enumerate(entries):
+            for token in set(suggest_tokens(entry[2])):
+                postings.setdefault(token, []).append(position)
+        self.tokens = sorted(postings)
+        self.postings = [tuple(postings[token]) for token in self.tokens]
+
+    @classmethod
+    def from_database(cls):
+        entries = [
+            ('course', course_id, title, course_id)
+            for course_id, title in Course.objects.filter(status=1).values_list('id', 'title_of_course')
+        ]
+        entries.extend(
+            ('module', module_id, title, course_id)
+            for module_id, title, course_id in Module.objects.filter(
+                status=1, course__status=1
+            ).values_list('id', 'title', 'course_id')
+        )
+        entries.extend(
+            ('content', content_id, title, course_id)
+            for content_id, title, course_id in CourseContent.objects.filter(
+                status=1, module__status=1, module__course__status=1
+            ).values_list('id', 'title', 'module__course_id')
+        )
+        return cls(entries)
+
+    def match_prefix(self, prefix):
+        """Positions of the entries having a token that starts with prefix"""
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + '\uffff', start)
+        matches = set()
+        for postings in self.postings[start:end]:
+            matches.update(postings)
+        return matches
+
+    def suggest(self, query, limit=10, types=None):
+        query_tokens = suggest_tokens(query)
+        if not query_tokens:
+            return []
+
+        # Longest tokens first: they have the fewest matches
+        query_tokens.sort(key=len, reverse=True)
+        matches = self.match_prefix(query_tokens[0])
+        for token in query_tokens[1:]:
+            if not matches:
+                break
+            matches &= self.match_prefix(token)
+
+        if types:
+            matches = [position for position in matches if self.entries[position][0] in types]
+
+        normalized_query = normalize_text(query).strip()
+        ranked = sorted(
+            matches,
+            key=lambda position: (
+                not self.normalized_titles[position].startswith(normalized_query),
+                TYPE_RANK[self.entries[position][0]],
+                len(self.entries[position][2]),
+                position,
+            )
+        )[:limit]
+
+        return [
+            {'id': entry_id, 'type': entry_type, 'title': title, 'course_id': course_id}
+            for entry_type, entry_id, title, course_id in (self.entries[position] for position in ranked)
+        ]
+
+
+# ============================================================================
+# Per-process copy of the index
+# ============================================================================
+
+_index = None
+_index_version = None
+_checked_at = 0.0
+_refreshing = False
+_lock = threading.Lock()
+
+
+def get_suggest_version():
+    return cache.get(SUGGEST_VERSION_KEY, 0)
+
+
+def notify_suggest_index_changed():
+    """Tell every worker that its suggest index is stale"""
+    cache.add(SUGGEST_VERSION_KEY, 0, timeout=None)
+    try:
+        cache.incr(SUGGEST_VERSION_KEY)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(SUGGEST_VERSION_KEY, 1, timeout=None)
+
+
+def refresh_suggest_index():
+    """Rebuild this worker's index from the database"""
+    global _index, _index_version
+    version = get_suggest_version()
+    index = SuggestIndex.from_database()
+    with _lock:
+        _index, _index_version = index, version
+    logger.info(f"Search suggest index loaded: {len(index.entries)} entries, {len(index.tokens)} tokens")
+    return index
+
+
+def _refresh_in_background():
+    global _refreshing
+    try:
+        refresh_suggest_index()
+    except Exception as e:
+        logger.error(f"Search suggest index refresh failed: {str(e)}")
+    finally:
+        _refreshing = False
+        connections.close_all()
+
+
+def preload_suggest_index():
+    """Load the index in the background when a server worker starts"""
+    global _refreshing
+    with _lock:
+        if _refreshing or _index is not None:
+            return
+        _refreshing = True
+    threading.Thread(target=_refresh_in_background, daemon=True).start()
+
+
+def get_suggest_index():
+    global _checked_at, _refreshing
+
+    if _index is None:
+        return refresh_suggest_index()
+
+    now = time.monotonic()
+    if now - _checked_at >= getattr(settings, 'SEARCH_SUGGEST_CHECK_INTERVAL', 2):
+        _checked_at = now
+        with _lock:
+            stale = not _refreshing and get_suggest_version() != _index_version
+            if stale:
+                _refreshing = True
+        if stale:
+            threading.Thread(target=_refresh_in_background, daemon=True).start()
+
+    return _index
@@ -0,0 +1,123 @@
+# user/tasks.py
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_task(task, *args, **kwargs):
+    """
+    Queue a task once the current transaction commits. A broker outage is
+    logged instead of failing the request or signal that triggered it.
+    """
+    def send():
+        try:
+            task.delay(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Could not queue {task.name}: {str(e)}")
+
+    transaction.on_commit(send)
+
+
+def enqueue_coalesced(task, key, *args):
+    """
+    Queue task to run TASK_COALESCE_SECONDS from now, unless a run for the
+    same key is already pending: bursts of events trigger a single run.
+    """
+    countdown = getattr(settings, 'TASK_COALESCE_SECONDS', 30)
+    lock_key = f'coalesce:{task.name}:{key}'
+
+    def send():
+        if not cache.add(lock_key, 1, timeout=countdown):
+            return
+        try:
+            task.apply_async(args, countdown=countdown)
+        except Exception as e:
+            cache.delete(lock_key)
+            logger.error(f"Could not queue {task.name}: {str(e)}")
+
+    transaction.on_commit(send)
+
+
+@shared_task
+def rebuild_course_recommendations():
+    """Nightly rebuild of the precomputed course recommendations, from the read replica"""
+    from .dbrouting import use_replica
+    from .recommendations import rebuild_recommendations
+    with use_replica():
+        return rebuild_recommendations()
+
+
+@shared_task
+def rebuild_similar_courses_index():
+    """Nightly rebuild of the TF-IDF similar courses index, from the read replica"""
+    from .dbrouting import use_replica
+    from .similarity import rebuild_index
+    with use_replica():
+        return rebuild_index()
+
+
+@shared_task
+def maintain_time_tracking():
+    """Nightly: create the coming partitions, roll up the past days and apply the retention of TimeTracking"""
+    from .timetracking import maintain_time_tracking
+    return maintain_time_tracking()
+
+
+@shared_task
+def refresh_similar_course(course_id):
+    """Add, update or drop one course in the similar courses index"""
+    from .similarity import refresh_course
+    refresh_course(course_id)
+
+
+@shared_task
+def extract_pdf_text(pdf_content_id):
+    """Extract the text, page count and reading time of an uploaded PDF"""
+    from .media_processing import extract_pdf_text as extract
+    return extract(pdf_content_id)
+
+
+@shared_task
+def probe_video_metadata(video_content_id):
+    """Read duration, resolution and bitrate from an uploaded video's header"""
+    from .media_processing import probe_video_metadata as probe
+    from .models import VideoContent
+
+    metadata = probe(video_content_id)
+    course_id = VideoContent.objects.filter(
+        pk=video_content_id
+    ).values_list('course_content__module__course_id', flat=True).first()
+    if metadata and course_id:
+        enqueue_coalesced(recompute_course_durations, course_id, course_id)
+    return metadata
+
+
+@shared_task
+def recompute_course_durations(course_id):
+    """Coalesced recompute of module and course durations"""
+    from .media_processing import recompute_course_durations as recompute
+    cache.delete(f'coalesce:{recompute_course_durations.name}:{course_id}')
+    return recompute(course_id)
+
+
+@shared_task
+def generate_course_image_variants(course_id, stale_paths=()):
+    """Generate responsive WebP/JPEG variants of a course image"""
+    from .media_processing import generate_course_image_variants as generate
+    return generate(course_id, stale_paths)
+
+
+@shared_task
+def announce_broadcast_notification(broadcast_id):
+    """Increment the unread counters of a broadcast's audience and push it"""
+    from .models import BroadcastNotification
+    from .notifications import announce_broadcast
+
+    broadcast = BroadcastNotification.objects.filter(pk=broadcast_id).first()
+    if broadcast is not None:
+        announce_broadcast(broadcast)
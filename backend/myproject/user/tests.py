@@ -3,13 +3,16 @@ from django.test import TestCase
 # Create your tests here.
 import tempfile
 import os
-from django.test import TestCase
+from unittest import skipUnless
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.db import connection
 from django.core.files.uploadedfile import SimpleUploadedFile
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from .models import Course, ContentType, CourseContent, VideoContent, PDFContent, QCM, QCMOption
+from .querybudget import QueryBudgetTestMixin
 
 User = get_user_model()
 
@@ -396,4 +399,2299 @@ class SubscriptionTests(APITestCase):
             )
         )
 
-        return course_content
\ No newline at end of file
+        return course_content
+class ModuleContentStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='statsuser', password='testpass123')
+        self.pdf_type, _ = ContentType.objects.get_or_create(name='pdf')
+        self.video_type, _ = ContentType.objects.get_or_create(name='video')
+        self.course = Course.objects.create(title_of_course='Stats Course', creator=self.user)
+
+    def add_modules(self, count):
+        from .models import Module
+        for i in range(count):
+            module = Module.objects.create(course=self.course, title=f'Module {i}', order=i)
+            CourseContent.objects.create(module=module, content_type=self.pdf_type, title=f'PDF {i}', order=0)
+            CourseContent.objects.create(module=module, content_type=self.video_type, title=f'Video {i}', order=1)
+
+    def count_stats_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import Module
+        from .serializers import ModuleWithContentsSerializer
+
+        modules = list(Module.objects.filter(course=self.course))
+        serializer = ModuleWithContentsSerializer(modules, many=True)
+        with CaptureQueriesContext(connection) as ctx:
+            stats = [serializer.child.get_content_stats(module) for module in modules]
+        return len(ctx.captured_queries), stats
+
+    def test_content_stats_values(self):
+        """Test per-module and course-wide figures"""
+        self.add_modules(2)
+        _, stats = self.count_stats_queries()
+
+        self.assertEqual(len(stats), 2)
+        for module_stats in stats:
+            self.assertEqual(module_stats['total_modules'], 2)
+            self.assertEqual(module_stats['total_contents_course'], 4)
+            self.assertEqual(module_stats['total_contents_module'], 2)
+            self.assertEqual(module_stats['pdf_count'], 1)
+            self.assertEqual(module_stats['video_count'], 1)
+            self.assertEqual(module_stats['qcm_count'], 0)
+
+    def test_content_stats_query_count_is_constant(self):
+        """Test that the number of queries does not grow with the module count"""
+        self.add_modules(2)
+        small_count, _ = self.count_stats_queries()
+
+        self.add_modules(8)
+        large_count, _ = self.count_stats_queries()
+
+        self.assertEqual(small_count, large_count)
+
+class MySubscriptionsFeedTests(APITestCase):
+    def setUp(self):
+        from .models import Module, Subscription, FavoriteCourse
+        self.user = User.objects.create_user(username='feeduser', password='testpass123')
+        self.creator = User.objects.create_user(username='feedcreator', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.pdf_type, _ = ContentType.objects.get_or_create(name='pdf')
+        self.course = Course.objects.create(title_of_course='Feed Course', creator=self.creator, status=1)
+        module = Module.objects.create(course=self.course, title='Module', status=1)
+        self.first = CourseContent.objects.create(
+            module=module, content_type=self.pdf_type, title='First', order=0, estimated_duration=30
+        )
+        CourseContent.objects.create(
+            module=module, content_type=self.pdf_type, title='Second', order=1, estimated_duration=60
+        )
+        self.subscription = Subscription.objects.create(user=self.user, course=self.course)
+        FavoriteCourse.objects.create(user=self.user, course=self.course)
+
+    def test_feed_payload(self):
+        """Test the annotated feed returns the dashboard fields"""
+        self.subscription.completed_contents.add(self.first)
+
+        response = self.client.get(reverse('my-subscriptions'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        course_data = response.data[0]
+        self.assertEqual(course_data['id'], self.course.id)
+        self.assertEqual(course_data['progress_percentage'], 50)
+        self.assertTrue(course_data['is_favorited'])
+        self.assertEqual(course_data['module_count'], 1)
+        self.assertEqual(course_data['total_time_required_minutes'], 90)
+        self.assertEqual(course_data['total_time_required_hours'], 1.5)
+        self.assertEqual(course_data['subscriber_count'], 1)
+
+    def test_feed_cache_invalidated_on_progress(self):
+        """Test completing content refreshes the cached feed"""
+        first = self.client.get(reverse('my-subscriptions'))
+        self.assertEqual(first.data[0]['progress_percentage'], 0)
+
+        self.subscription.completed_contents.add(self.first)
+
+        second = self.client.get(reverse('my-subscriptions'))
+        self.assertEqual(second.data[0]['progress_percentage'], 50)
+
+    def test_feed_query_count_is_constant(self):
+        """Test that the feed does not issue queries per subscribed course"""
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import Subscription
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(reverse('my-subscriptions'))
+
+        for i in range(5):
+            course = Course.objects.create(title_of_course=f'Extra {i}', creator=self.creator, status=1)
+            Subscription.objects.create(user=self.user, course=course)
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('my-subscriptions'))
+
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(len(single.captured_queries), len(many.captured_queries))
+
+@override_settings(HOME_FEED_CONCURRENT=False)
+class HomeFeedTests(APITestCase):
+    def setUp(self):
+        from .models import Subscription, FavoriteCourse, Notification
+        self.user = User.objects.create_user(username='homeuser', password='testpass123')
+        self.creator = User.objects.create_user(username='homecreator', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        subscribed = Course.objects.create(title_of_course='Subscribed', creator=self.creator, status=1)
+        self.recommended = Course.objects.create(title_of_course='Recommended', creator=self.creator, status=1)
+        Subscription.objects.create(user=self.user, course=subscribed)
+        FavoriteCourse.objects.create(user=self.user, course=subscribed)
+        Notification.objects.create(
+            user=self.user, notification_type='system', title='Hello', message='World'
+        )
+
+    def test_home_feed_sections(self):
+        """Test the home feed returns every section"""
+        response = self.client.get(reverse('home-feed'))
+        data = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['partial'], {})
+        self.assertEqual(data['user']['username'], 'homeuser')
+        self.assertEqual([c['title_of_course'] for c in data['subscriptions']], ['Subscribed'])
+        self.assertEqual([c['id'] for c in data['recommendations']], [self.recommended.id])
+        self.assertEqual(data['favorites']['count'], 1)
+        self.assertTrue(data['favorites']['results'][0]['is_subscribed'])
+        self.assertEqual(data['notifications']['unread_count'], 1)
+
+    def test_home_feed_requires_authentication(self):
+        """Test anonymous requests are rejected"""
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('home-feed'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(HOME_FEED_SECTION_TIMEOUT=0.5)
+    def test_home_feed_returns_partial_results_on_timeout(self):
+        """Test a slow section is dropped instead of failing the whole feed"""
+        import time
+        from unittest import mock
+        from .views import HomeFeedView
+
+        def slow_notifications(*args):
+            time.sleep(1)
+            return {'unread_count': 0}
+
+        with mock.patch.object(HomeFeedView, 'build_notifications', side_effect=slow_notifications):
+            response = self.client.get(reverse('home-feed'))
+        data = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['partial'], {'notifications': 'timeout'})
+        self.assertIsNone(data['notifications'])
+        self.assertEqual(len(data['subscriptions']), 1)
+
+class RecommendationTests(APITestCase):
+    def setUp(self):
+        from .models import Subscription
+        self.creator = User.objects.create_user(username='recocreator', password='testpass123')
+        self.courses = [
+            Course.objects.create(title_of_course=f'Course {i}', creator=self.creator, status=1)
+            for i in range(4)
+        ]
+        # Learners who took course 0 also took course 1; course 2 is taken alone
+        self.learners = [
+            User.objects.create_user(username=f'learner{i}', password='testpass123')
+            for i in range(3)
+        ]
+        for learner in self.learners[:2]:
+            Subscription.objects.create(user=learner, course=self.courses[0])
+            Subscription.objects.create(user=learner, course=self.courses[1])
+        Subscription.objects.create(user=self.learners[2], course=self.courses[0])
+        Subscription.objects.create(user=self.creator, course=self.courses[2])
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.learners[2])
+
+    def test_item_similarities(self):
+        """Test cosine similarity between course columns"""
+        import numpy as np
+        from .recommendations import build_interaction_matrix, item_similarities
+
+        matrix, user_ids, course_ids = build_interaction_matrix([
+            (1, 10, 1.0), (1, 11, 1.0), (2, 10, 1.0), (2, 11, 1.0), (3, 12, 1.0),
+        ])
+        similarities = item_similarities(matrix).toarray()
+
+        self.assertEqual(list(course_ids), [10, 11, 12])
+        self.assertAlmostEqual(similarities[0, 1], 1.0, places=5)
+        self.assertEqual(similarities[0, 2], 0)
+        self.assertTrue(np.all(np.diag(similarities) == 0))
+
+    def test_rebuild_and_lookup(self):
+        """Test precomputed recommendations are served by the endpoint"""
+        from .models import CourseRecommendation, UserRecommendation
+        from .recommendations import rebuild_recommendations
+
+        rebuild_recommendations()
+
+        self.assertEqual(
+            list(CourseRecommendation.objects.filter(course=self.courses[0])
+                 .values_list('recommended_course_id', flat=True)),
+            [self.courses[1].id]
+        )
+        self.assertEqual(
+            list(UserRecommendation.objects.filter(user=self.learners[2])
+                 .values_list('course_id', flat=True)),
+            [self.courses[1].id]
+        )
+
+        response = self.client.get(reverse('recommended-courses'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['id'] for c in response.data], [self.courses[1].id])
+
+    def test_popularity_fallback(self):
+        """Test users without precomputed recommendations get popular courses"""
+        response = self.client.get(reverse('recommended-courses'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [c['id'] for c in response.data]
+        self.assertNotIn(self.courses[0].id, ids)
+        self.assertEqual(ids[0], self.courses[1].id)
+
+class SimilarCoursesIndexTests(APITestCase):
+    def setUp(self):
+        from . import similarity
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            SIMILARITY_INDEX_PATH=os.path.join(self.tmpdir.name, 'similar_courses.npz'),
+            SIMILARITY_INDEX_CHECK_INTERVAL=0,
+        )
+        self.settings_override.enable()
+        similarity._index = similarity._index_mtime = None
+
+        self.creator = User.objects.create_user(username='similarcreator', password='testpass123')
+        self.python = Course.objects.create(
+            title_of_course='Python programming', description='Learn python functions and classes',
+            creator=self.creator, status=1
+        )
+        self.django = Course.objects.create(
+            title_of_course='Django web programming', description='Build web apps with python',
+            creator=self.creator, status=1
+        )
+        self.cooking = Course.objects.create(
+            title_of_course='Cuisine française', description='Recettes de pâtisserie',
+            creator=self.creator, status=1
+        )
+        self.cooking.modules.create(title='Pâtisserie et desserts')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def test_build_and_lookup(self):
+        """Test the endpoint serves precomputed neighbours"""
+        from .similarity import rebuild_index
+
+        self.assertEqual(rebuild_index(), 3)
+        response = self.client.get(reverse('similar-courses', kwargs={'pk': self.python.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([course['id'] for course in response.data['results']], [self.django.pk])
+        self.assertGreater(response.data['results'][0]['score'], 0)
+
+    def test_incremental_refresh(self):
+        """Test activating and deactivating a course updates the index"""
+        from .similarity import rebuild_index, refresh_course, get_index
+
+        rebuild_index()
+        flask = Course.objects.create(
+            title_of_course='Flask python web', description='Python web programming',
+            creator=self.creator, status=1
+        )
+        refresh_course(flask.pk)
+        self.assertIn(flask.pk, [course['id'] for course in get_index().similar(self.django.pk)])
+        self.assertNotIn(self.cooking.pk, [course['id'] for course in get_index().similar(flask.pk)])
+
+        flask.status = 2
+        flask.save()
+        refresh_course(flask.pk)
+        self.assertNotIn(flask.pk, [course['id'] for course in get_index().similar(self.django.pk)])
+        self.assertEqual(get_index().similar(flask.pk), [])
+
+    def test_missing_index(self):
+        """Test the endpoint answers with no results before the first build"""
+        response = self.client.get(reverse('similar-courses', kwargs={'pk': self.python.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+class SearchSuggestTests(APITestCase):
+    def setUp(self):
+        from . import suggest
+        suggest._index = suggest._index_version = None
+
+        self.creator = User.objects.create_user(username='suggestcreator', password='testpass123')
+        self.course = Course.objects.create(title_of_course='Introduction à Python', creator=self.creator, status=1)
+        self.draft = Course.objects.create(title_of_course='Python avancé', creator=self.creator, status=0)
+        self.module = self.course.modules.create(title='Programmation objet', status=1)
+
+    def test_prefix_suggestions(self):
+        """Test prefixes of any title word match, ignoring accents and drafts"""
+        response = self.client.get(reverse('search-suggest'), {'q': 'pyt'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['type'], item['id']) for item in response.data['results']],
+            [('course', self.course.id)]
+        )
+
+        response = self.client.get(reverse('search-suggest'), {'q': 'intro a'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.course.id])
+
+        response = self.client.get(reverse('search-suggest'), {'q': 'prog', 'type': 'module'})
+        self.assertEqual(response.data['results'][0]['course_id'], self.course.id)
+
+    def test_title_change_refreshes_index(self):
+        """Test saving a title bumps the shared version and the index reloads"""
+        from .suggest import get_suggest_index, get_suggest_version, refresh_suggest_index
+
+        get_suggest_index()
+        version = get_suggest_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title_of_course = 'Introduction à Django'
+            self.course.save()
+        self.assertGreater(get_suggest_version(), version)
+
+        refresh_suggest_index()
+        response = self.client.get(reverse('search-suggest'), {'q': 'djan'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.course.id])
+        response = self.client.get(reverse('search-suggest'), {'q': 'pyt'})
+        self.assertEqual(response.data['results'], [])
+
+def make_pdf(pages):
+    """Minimal PDF with one line of text per page"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_refs = []
+    for text in pages:
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode()
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects))
+        )
+        page_refs.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(page_refs), len(pages))
+
+    pdf, offsets = b'%PDF-1.4\n', []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return pdf
+
+class PDFTextExtractionTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user(username='pdfsearcher', password='testpass123')
+        course = Course.objects.create(title_of_course='Biology', creator=self.user, status=1)
+        module = course.modules.create(title='Plants', status=1)
+        pdf_type, _ = ContentType.objects.get_or_create(name='pdf')
+        self.content = CourseContent.objects.create(module=module, content_type=pdf_type, title='Chapter 1')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_upload_queues_extraction(self):
+        """Test extraction fills page count and reading time and makes the text searchable"""
+        from unittest import mock
+        from .models import PDFText
+
+        pdf_file = SimpleUploadedFile('chapter.pdf', make_pdf(['Photosynthesis basics', 'Chlorophyll']))
+        with mock.patch('user.tasks.extract_pdf_text.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                pdf = PDFContent.objects.create(course_content=self.content, pdf_file=pdf_file)
+            delay.assert_called_once_with(pdf.pk)
+
+        from .media_processing import extract_pdf_text
+        self.assertEqual(extract_pdf_text(pdf.pk), {'page_count': 2, 'word_count': 3})
+
+        pdf.refresh_from_db()
+        self.assertEqual(pdf.page_count, 2)
+        self.assertEqual(pdf.estimated_reading_time, 1)
+        self.assertIn('Chlorophyll', PDFText.objects.get(pdf_content=pdf).text)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('global-search'), {'q': 'chlorophyll', 'type': 'content'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.content.id])
+
+def mp4_box(box_type, payload):
+    return (8 + len(payload)).to_bytes(4, 'big') + box_type + payload
+
+def make_mp4(duration_seconds, width, height, mdat_size=1_000_000):
+    """MP4 with an audio and a video track, moov stored after a large mdat"""
+    mvhd = mp4_box(b'mvhd', bytes(12) + (1000).to_bytes(4, 'big') + (duration_seconds * 1000).to_bytes(4, 'big') + bytes(80))
+
+    def trak(handler, track_width, track_height):
+        tkhd = mp4_box(b'tkhd', bytes(76) + (track_width << 16).to_bytes(4, 'big') + (track_height << 16).to_bytes(4, 'big'))
+        hdlr = mp4_box(b'hdlr', bytes(8) + handler + bytes(13))
+        return mp4_box(b'trak', tkhd + mp4_box(b'mdia', hdlr))
+
+    moov = mp4_box(b'moov', mvhd + trak(b'soun', 0, 0) + trak(b'vide', width, height))
+    return mp4_box(b'ftyp', b'isom' + bytes(4)) + mp4_box(b'mdat', bytes(mdat_size)) + moov
+
+def ebml(element_id, payload):
+    size = len(payload)
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + (0x10000000 | size).to_bytes(4, 'big') + payload
+
+def make_webm(duration_ms, width, height):
+    import struct
+    info = ebml(0x1549A966, ebml(0x2AD7B1, (1_000_000).to_bytes(3, 'big')) + ebml(0x4489, struct.pack('>d', duration_ms)))
+    video = ebml(0xE0, ebml(0xB0, width.to_bytes(2, 'big')) + ebml(0xBA, height.to_bytes(2, 'big')))
+    tracks = ebml(0x1654AE6B, ebml(0xAE, ebml(0x83, b'\x01') + video))
+    cluster = ebml(0x1F43B675, bytes(10_000))
+    return ebml(0x1A45DFA3, ebml(0x4282, b'webm')) + ebml(0x18538067, info + tracks + cluster)
+
+class VideoMetadataProbeTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+
+        creator = User.objects.create_user(username='videocreator', password='testpass123')
+        self.course = Course.objects.create(title_of_course='Film', creator=creator, status=1)
+        self.module = self.course.modules.create(title='Editing', status=1)
+        video_type, _ = ContentType.objects.get_or_create(name='video')
+        self.content = CourseContent.objects.create(module=self.module, content_type=video_type, title='Cuts')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_probe_reads_only_headers(self):
+        """Test MP4 and WebM headers are parsed without reading the media data"""
+        import io
+        from .media_processing import probe_video
+
+        class CountingFile(io.BytesIO):
+            bytes_read = 0
+
+            def read(self, size=-1):
+                data = super().read(size)
+                self.bytes_read += len(data)
+                return data
+
+        mp4 = make_mp4(125, 1280, 720)
+        file = CountingFile(mp4)
+        metadata = probe_video(file, len(mp4))
+        self.assertEqual(
+            (metadata['duration'], metadata['width'], metadata['height']), (125, 1280, 720)
+        )
+        self.assertEqual(metadata['bitrate'], int(len(mp4) * 8 / 125))
+        self.assertLess(file.bytes_read, 1000)
+
+        webm = make_webm(5000.0, 640, 360)
+        metadata = probe_video(CountingFile(webm), len(webm))
+        self.assertEqual((metadata['duration'], metadata['width'], metadata['height']), (5, 640, 360))
+
+    def test_upload_fills_metadata_and_recomputes_durations(self):
+        """Test uploading a video queues the probe, which queues one duration recompute"""
+        from unittest import mock
+        from .tasks import probe_video_metadata, recompute_course_durations
+
+        video_file = SimpleUploadedFile('cuts.mp4', make_mp4(600, 1920, 1080, mdat_size=1000))
+        with mock.patch('user.tasks.probe_video_metadata.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                video = VideoContent.objects.create(course_content=self.content, video_file=video_file)
+            delay.assert_called_once_with(video.pk)
+
+        with mock.patch('user.tasks.recompute_course_durations.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                probe_video_metadata(video.pk)
+                probe_video_metadata(video.pk)
+            apply_async.assert_called_once()
+
+        video.refresh_from_db()
+        self.assertEqual((video.duration, video.width, video.height), (600, 1920, 1080))
+
+        recompute_course_durations(self.course.pk)
+        self.module.refresh_from_db()
+        self.course.refresh_from_db()
+        self.assertEqual(self.module.estimated_duration, 10)
+        self.assertEqual(self.course.estimated_duration, 10)
+
+class CourseImageVariantTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name, COURSE_IMAGE_WIDTHS=[320, 640, 1280])
+        self.settings_override.enable()
+        self.creator = User.objects.create_user(username='imagecreator', password='testpass123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def make_image(self, name, width, height):
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_variants_generated_and_exposed(self):
+        """Test upload queues variant generation and serializers expose a srcset"""
+        from unittest import mock
+        from django.core.files.storage import default_storage
+        from .serializers import CourseSerializer
+        from .media_processing import generate_course_image_variants
+
+        with mock.patch('user.tasks.generate_course_image_variants.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                course = Course.objects.create(
+                    title_of_course='Painting', creator=self.creator, image=self.make_image('cover.png', 1000, 500)
+                )
+            delay.assert_called_once_with(course.pk, [])
+
+        variants = generate_course_image_variants(course.pk)
+        self.assertEqual(sorted(variants['webp']), ['320', '640'])
+        self.assertTrue(default_storage.exists(variants['jpeg']['320']))
+
+        course.refresh_from_db()
+        data = CourseSerializer(course).data
+        self.assertEqual(data['image_variants']['webp']['640'], default_storage.url(variants['webp']['640']))
+        self.assertTrue(data['image_srcset']['jpeg'].endswith(' 640w'))
+
+        # Replacing the image drops the old variants
+        with mock.patch('user.tasks.generate_course_image_variants.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                course.image = self.make_image('new.png', 400, 400)
+                course.save()
+        self.assertEqual(course.image_variants, {})
+        stale_paths = delay.call_args[0][1]
+        self.assertEqual(len(stale_paths), 4)
+
+        generate_course_image_variants(course.pk, stale_paths)
+        self.assertFalse(default_storage.exists(variants['jpeg']['320']))
+        course.refresh_from_db()
+        self.assertEqual(list(course.image_variants['webp']), ['320'])
+
+    def test_jpeg_sources_are_decoded_at_a_reduced_scale(self):
+        import io
+        from unittest import mock
+        from PIL import Image, JpegImagePlugin
+        from .media_processing import generate_course_image_variants
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (4000, 3000), (30, 30, 200)).save(buffer, 'JPEG')
+        with mock.patch('user.tasks.generate_course_image_variants.delay'):
+            course = Course.objects.create(
+                title_of_course='Photo', creator=self.creator,
+                image=SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            )
+
+        draft = JpegImagePlugin.JpegImageFile.draft
+        with mock.patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True, side_effect=draft) as patched:
+            variants = generate_course_image_variants(course.pk)
+        image = patched.call_args.args[0]
+        # Decoded at half scale, still wider than the largest variant
+        self.assertEqual(image.size, (2000, 1500))
+        self.assertEqual(sorted(variants['webp'], key=int), ['320', '640', '1280'])
+
+class ContentAddressedStorageTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+
+        from .storage import ContentAddressedStorage
+        self.storage = ContentAddressedStorage(location=self.media_root.name)
+        creator = User.objects.create_user(username='blobcreator', password='testpass123')
+        course = Course.objects.create(title_of_course='Storage', creator=creator)
+        module = course.modules.create(title='Blobs')
+        pdf_type, _ = ContentType.objects.get_or_create(name='pdf')
+        self.contents = [
+            CourseContent.objects.create(module=module, content_type=pdf_type, title=f'Copy {i}')
+            for i in range(2)
+        ]
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_duplicates_share_one_blob(self):
+        """Test identical uploads are stored once and reference counted"""
+        import io
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+        from .models import MediaBlob
+
+        names = [self.storage.save('pdfs/notes.pdf', ContentFile(b'%PDF same bytes')) for _ in range(2)]
+        self.assertEqual(names[0], names[1])
+        self.assertTrue(names[0].startswith('blobs/'))
+        self.assertEqual(MediaBlob.objects.count(), 1)
+
+        with mock.patch('user.tasks.extract_pdf_text.delay'):
+            pdfs = [
+                PDFContent.objects.create(course_content=content, pdf_file=names[0])
+                for content in self.contents
+            ]
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+
+        pdfs[0].delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+
+        # Still referenced: kept even past the grace period
+        call_command('gc_media_blobs', grace_hours=0, stdout=io.StringIO())
+        self.assertTrue(self.storage.exists(names[0]))
+
+        pdfs[1].delete()
+        call_command('gc_media_blobs', grace_hours=0, stdout=io.StringIO())
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(self.storage.exists(names[0]))
+
+    def test_same_bytes_under_another_extension_reuse_the_blob(self):
+        """Test a copy with another extension gets the stored name and referenced files are never orphans"""
+        import io
+        import os
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+        from .models import MediaBlob
+
+        first = self.storage.save('videos/clip.mp4', ContentFile(b'same video bytes'))
+        second = self.storage.save('videos/clip.mov', ContentFile(b'same video bytes'))
+        self.assertEqual(first, second)
+        self.assertEqual(len(os.listdir(os.path.dirname(self.storage.path(first)))), 1)
+
+        # A referenced file whose row was lost is kept by the orphan scan
+        with mock.patch('user.tasks.extract_pdf_text.delay'):
+            PDFContent.objects.create(course_content=self.contents[0], pdf_file=first)
+        MediaBlob.objects.all().delete()
+        call_command('gc_media_blobs', grace_hours=0, stdout=io.StringIO())
+        self.assertTrue(self.storage.exists(first))
+
+    def test_gc_checks_each_blob_again_before_deleting_it(self):
+        """Test blobs referenced or saved again after the snapshot are kept and counts are fixed"""
+        import io
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import MediaBlob
+
+        referenced = self.storage.save('pdfs/a.pdf', ContentFile(b'%PDF referenced'))
+        reuploaded = self.storage.save('pdfs/b.pdf', ContentFile(b'%PDF reuploaded'))
+        with mock.patch('user.tasks.extract_pdf_text.delay'):
+            PDFContent.objects.create(course_content=self.contents[0], pdf_file=referenced)
+        MediaBlob.objects.update(last_uploaded_at=timezone.now() - timedelta(days=2))
+        # Saving the same bytes again restarts the grace period
+        self.storage.save('pdfs/c.pdf', ContentFile(b'%PDF reuploaded'))
+        MediaBlob.objects.filter(name=referenced).update(ref_count=5)
+
+        # Stale snapshot: nothing referenced
+        with mock.patch(
+            'user.management.commands.gc_media_blobs.Command.count_references', return_value={}
+        ):
+            output = io.StringIO()
+            call_command('gc_media_blobs', grace_hours=1, stdout=output)
+        self.assertTrue(self.storage.exists(referenced))
+        self.assertTrue(self.storage.exists(reuploaded))
+        self.assertEqual(MediaBlob.objects.get(name=referenced).ref_count, 1)
+        self.assertIn('deleted 0 blobs', output.getvalue())
+
+    def test_gc_skips_the_file_scan_on_remote_storage(self):
+        import io
+        from unittest import mock
+        from django.core.management import call_command
+
+        storage = make_s3_storage()
+        with mock.patch('user.management.commands.gc_media_blobs.course_media_storage', return_value=storage):
+            output = io.StringIO()
+            call_command('gc_media_blobs', grace_hours=0, stdout=output)
+        self.assertIn('0 orphan files', output.getvalue())
+
+def make_s3_storage(**options):
+    from .storage_s3 import PresignedS3Storage
+    return PresignedS3Storage(**{
+        'bucket_name': 'course-media',
+        'endpoint_url': 'http://minio:9000',
+        'access_key': 'test-access-key',
+        'secret_key': 'test-secret-key',
+        'region_name': 'us-east-1',
+        'addressing_style': 'path',
+        'signature_version': 's3v4',
+        'querystring_expire': 900,
+        'file_overwrite': False,
+        **options,
+    })
+
+class S3StorageTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_presigned_urls_are_cached_per_object(self):
+        """Test GET URLs are signed once per object and use the public endpoint"""
+        storage = make_s3_storage(public_endpoint_url='http://localhost:9000')
+
+        first_url = storage.url('pdfs/notes.pdf')
+        self.assertTrue(first_url.startswith('http://localhost:9000/course-media/pdfs/notes.pdf?'))
+        self.assertIn('X-Amz-Expires=900', first_url)
+        self.assertEqual(storage.url('pdfs/notes.pdf'), first_url)
+        self.assertNotEqual(storage.url('pdfs/other.pdf'), first_url)
+
+        upload = storage.presigned_upload('videos/25/clip.mp4', 'video/', 1000)
+        self.assertEqual(upload['fields']['key'], 'videos/25/clip.mp4')
+        self.assertIn('policy', upload['fields'])
+
+    def test_range_reader_fetches_only_read_blocks(self):
+        """Test the video probe reads a remote object through a few range requests"""
+        import io
+        from unittest import mock
+        from .storage_s3 import S3RangeFile
+        from .media_processing import probe_video
+
+        data = make_mp4(30, 640, 480, mdat_size=5_000_000)
+
+        def get_object(Bucket, Key, Range):
+            start, end = map(int, Range.split('=')[1].split('-'))
+            return {'Body': io.BytesIO(data[start:end + 1])}
+
+        client = mock.Mock(get_object=mock.Mock(side_effect=get_object))
+        reader = S3RangeFile(client, 'course-media', 'videos/clip.mp4', len(data))
+        metadata = probe_video(reader, len(data))
+
+        self.assertEqual((metadata['duration'], metadata['width']), (30, 640))
+        self.assertLessEqual(reader.requests, 3)
+
+class DirectUploadTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.creator = User.objects.create_user(username='uploader', password='testpass123', privilege='F')
+        course = Course.objects.create(title_of_course='Direct uploads', creator=self.creator)
+        self.module = course.modules.create(title='Files')
+        self.storage = make_s3_storage()
+        self.client.force_authenticate(user=self.creator)
+
+    def upload_url(self, kind):
+        return reverse('direct-upload-url', kwargs={'course_id': self.module.course_id, 'module_id': self.module.id, 'kind': kind})
+
+    def complete_url(self, kind):
+        return reverse('direct-upload-complete', kwargs={'course_id': self.module.course_id, 'module_id': self.module.id, 'kind': kind})
+
+    def test_presign_then_complete(self):
+        """Test a content is created from the uploaded object without receiving the file"""
+        from unittest import mock
+
+        with mock.patch('user.views.course_media_storage', return_value=self.storage):
+            response = self.client.post(self.upload_url('pdf'), {'filename': 'notes.pdf', 'size': 1000}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        key = response.data['key']
+        self.assertTrue(key.startswith('pdfs/') and key.endswith('_notes.pdf'))
+        self.assertEqual(response.data['upload']['fields']['key'], key)
+
+        payload = {'upload_token': response.data['upload_token'], 'title': 'Notes', 'order': 1}
+        with mock.patch('user.views.course_media_storage', return_value=self.storage), \
+                mock.patch.object(self.storage, 'exists', return_value=True), \
+                mock.patch.object(self.storage, 'size', return_value=1000), \
+                mock.patch('user.tasks.extract_pdf_text.delay'):
+            response = self.client.post(self.complete_url('pdf'), payload, format='json')
+            # The token is bound to its content kind
+            wrong_kind = self.client.post(self.complete_url('video'), payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(PDFContent.objects.get(course_content_id=response.data['id']).pdf_file.name, key)
+        self.assertEqual(wrong_kind.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rejects_missing_object_and_bad_token(self):
+        """Test completion fails when the object is absent or the token is forged"""
+        from unittest import mock
+        from django.core import signing
+
+        token = signing.dumps({'key': 'pdfs/x.pdf', 'module_id': self.module.id, 'kind': 'pdf'}, salt='other')
+        with mock.patch('user.views.course_media_storage', return_value=self.storage), \
+                mock.patch.object(self.storage, 'exists', return_value=False):
+            forged = self.client.post(self.complete_url('pdf'), {'upload_token': token, 'title': 'X', 'order': 1}, format='json')
+            response = self.client.post(self.upload_url('pdf'), {'filename': 'x.pdf'}, format='json')
+            missing = self.client.post(
+                self.complete_url('pdf'),
+                {'upload_token': response.data['upload_token'], 'title': 'X', 'order': 1}, format='json'
+            )
+
+        self.assertEqual(forged.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(missing.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PDFContent.objects.exists())
+
+    def test_module_must_belong_to_the_course(self):
+        """Test the module is looked up within the course of the URL"""
+        from unittest import mock
+
+        other = Course.objects.create(title_of_course='Other course', creator=self.creator)
+        kwargs = {'course_id': other.id, 'module_id': self.module.id, 'kind': 'pdf'}
+        with mock.patch('user.views.course_media_storage', return_value=self.storage):
+            upload = self.client.post(reverse('direct-upload-url', kwargs=kwargs), {'filename': 'x.pdf'}, format='json')
+            complete = self.client.post(reverse('direct-upload-complete', kwargs=kwargs), {'upload_token': 'x'}, format='json')
+        self.assertEqual(upload.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(complete.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filesystem_mode_has_no_direct_uploads(self):
+        """Test the endpoints explain direct uploads need the S3 mode"""
+        response = self.client.post(self.upload_url('pdf'), {'filename': 'x.pdf'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+@skipUnless(os.getenv('S3_TEST_ENDPOINT_URL'), 'Set S3_TEST_ENDPOINT_URL to run against MinIO')
+class S3StorageMinIOTests(APITestCase):
+    """Round trip against a real S3-compatible server (docker compose --profile s3 up minio minio-setup)"""
+
+    def test_presigned_upload_and_download(self):
+        import requests
+
+        storage = make_s3_storage(
+            endpoint_url=os.environ['S3_TEST_ENDPOINT_URL'],
+            access_key=os.getenv('S3_ACCESS_KEY_ID', 'minioadmin'),
+            secret_key=os.getenv('S3_SECRET_ACCESS_KEY', 'minioadmin'),
+            bucket_name=os.getenv('S3_BUCKET_NAME', 'course-media'),
+        )
+        upload = storage.presigned_upload('pdfs/minio-test.pdf', 'application/pdf', 1000)
+        response = requests.post(
+            upload['url'], data={**upload['fields'], 'Content-Type': 'application/pdf'},
+            files={'file': ('minio-test.pdf', b'%PDF-1.4 test')}
+        )
+        self.assertIn(response.status_code, (200, 204))
+
+        self.assertTrue(storage.exists('pdfs/minio-test.pdf'))
+        self.assertEqual(requests.get(storage.url('pdfs/minio-test.pdf')).content, b'%PDF-1.4 test')
+        with storage.open_range_reader('pdfs/minio-test.pdf') as reader:
+            reader.seek(5)
+            self.assertEqual(reader.read(3), b'1.4')
+        storage.delete('pdfs/minio-test.pdf')
+
+class MetricsTests(APITestCase):
+    def sample(self, name, **labels):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_recorded_per_route(self):
+        """Test latency, status and SQL usage are recorded under the URL name"""
+        before = self.sample('http_requests_total', route='course-list', method='GET', status='200')
+        queries_before = self.sample('http_request_db_queries_count', route='course-list')
+
+        self.client.force_authenticate(user=User.objects.create_user(username='metrics_user', password='testpass123'))
+        response = self.client.get(reverse('course-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.sample('http_requests_total', route='course-list', method='GET', status='200'), before + 1)
+        self.assertEqual(self.sample('http_request_db_queries_count', route='course-list'), queries_before + 1)
+        self.assertGreater(self.sample('http_request_duration_seconds_sum', route='course-list', method='GET'), 0)
+
+        with self.settings(DEBUG=True):
+            stats = self.client.get(reverse('metrics'))
+        self.assertEqual(stats.status_code, status.HTTP_200_OK)
+        self.assertIn(b'http_requests_total{method="GET",route="course-list",status="200"}', stats.content)
+
+    def test_middleware_runs_in_async_mode(self):
+        """Test the middleware awaits an async handler instead of adapting it"""
+        from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from django.urls import resolve
+        from .metrics import MetricsMiddleware
+
+        async def get_response(request):
+            request.resolver_match = resolve(reverse('course-list'))
+            await sync_to_async(Course.objects.count)()
+            return HttpResponse(status=204)
+
+        middleware = MetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        before = self.sample('http_requests_total', route='course-list', method='GET', status='204')
+        queries_before = self.sample('http_request_db_queries_sum', route='course-list')
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.sample('http_requests_total', route='course-list', method='GET', status='204'), before + 1)
+        self.assertEqual(self.sample('http_request_db_queries_sum', route='course-list'), queries_before + 1)
+
+    def test_api_exceptions_and_cache_reads(self):
+        """Test DRF exceptions and cache hits/misses are counted"""
+        from django.core.cache import cache
+        from .metrics import current_route
+
+        before = self.sample('api_exceptions_total', route='system-health', exception='NotAuthenticated')
+        self.client.get(reverse('system-health'))
+        self.assertEqual(self.sample('api_exceptions_total', route='system-health', exception='NotAuthenticated'), before + 1)
+
+        token = current_route.set('test-route')
+        try:
+            cache.set('metrics-test', None)
+            self.assertIsNone(cache.get('metrics-test', 'default'))
+            self.assertEqual(cache.get('metrics-test-missing', 'default'), 'default')
+        finally:
+            current_route.reset(token)
+        self.assertEqual(self.sample('cache_requests_total', route='test-route', result='hit'), 1)
+        self.assertEqual(self.sample('cache_requests_total', route='test-route', result='miss'), 1)
+
+    def test_metrics_endpoint_token(self):
+        # No token: only served with DEBUG
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with self.settings(METRICS_AUTH_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_only_the_configured_cache_counts_reads(self):
+        from django.core.cache import caches
+        from django.core.cache.backends.locmem import LocMemCache
+        from .cache_backends import MetricsLocMemCache
+
+        self.assertIsInstance(caches['default'], MetricsLocMemCache)
+        # Django's backend classes are left untouched
+        self.assertEqual(LocMemCache.get.__qualname__, 'LocMemCache.get')
+
+    def test_system_health_reads_the_registry(self):
+        """Test the dashboard performance chart comes from recorded requests"""
+        admin = User.objects.create_superuser(username='metrics_admin', password='testpass123', email='m@example.com')
+        self.client.force_authenticate(user=admin)
+        self.client.get(reverse('course-list'))
+
+        from unittest import mock
+        with mock.patch('user.health.redis_stats', return_value=None), \
+                mock.patch('user.health.celery_queue_depth', return_value=None):
+            response = self.client.get(reverse('system-health'))
+        stats = response.data['performance_stats']
+        self.assertIn('course-list', stats['labels'])
+        position = stats['labels'].index('course-list')
+        self.assertGreater(stats['request_counts'][position], 0)
+        self.assertTrue(response.data['system_metrics']['error_rate'].endswith('%'))
+
+    def test_consumer_and_task_metrics(self):
+        """Test consumer messages and Celery task outcomes are recorded"""
+        from asgiref.sync import async_to_sync
+        from celery import signals
+        from channels.generic.websocket import AsyncWebsocketConsumer
+        from channels.testing import WebsocketCommunicator
+        from .metrics import ConsumerMetricsMixin
+        from .tasks import extract_pdf_text
+
+        class EchoConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
+            async def receive(self, text_data=None, bytes_data=None):
+                await self.send(text_data=text_data)
+
+        async def exchange():
+            communicator = WebsocketCommunicator(EchoConsumer.as_asgi(), '/ws/echo/')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_to(text_data='ping')
+            self.assertEqual(await communicator.receive_from(), 'ping')
+            await communicator.disconnect()
+
+        with override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}):
+            async_to_sync(exchange)()
+        self.assertEqual(self.sample('websocket_messages_total', consumer='EchoConsumer', direction='in'), 1)
+        self.assertEqual(self.sample('websocket_messages_total', consumer='EchoConsumer', direction='out'), 1)
+        self.assertEqual(self.sample('websocket_connections_active', consumer='EchoConsumer'), 0)
+
+        before = self.sample('celery_tasks_total', task=extract_pdf_text.name, state='SUCCESS')
+        signals.task_prerun.send(sender=extract_pdf_text, task_id='metrics-test', task=extract_pdf_text)
+        signals.task_postrun.send(sender=extract_pdf_text, task_id='metrics-test', task=extract_pdf_text, state='SUCCESS')
+        self.assertEqual(self.sample('celery_tasks_total', task=extract_pdf_text.name, state='SUCCESS'), before + 1)
+        self.assertEqual(self.sample('celery_task_duration_seconds_count', task=extract_pdf_text.name), 1)
+
+class SystemHealthSamplingTests(APITestCase):
+    def setUp(self):
+        from . import health
+        health._samples.clear()
+        health._last_sampled_at = None
+        admin = User.objects.create_superuser(username='health_admin', password='testpass123', email='h@example.com')
+        self.client.force_authenticate(user=admin)
+
+    def test_health_is_served_from_samples(self):
+        """Test the view reuses recent samples and never waits on CPU measurement"""
+        from unittest import mock
+
+        with mock.patch('user.health.redis_stats', return_value={'used_memory': 1024}), \
+                mock.patch('user.health.celery_queue_depth', return_value={'celery': 3}), \
+                mock.patch('user.health.psutil.cpu_percent', return_value=12.5) as cpu_percent:
+            first = self.client.get(reverse('system-health'))
+            second = self.client.get(reverse('system-health'))
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['system_metrics']['celery_queues'], {'celery': 3})
+        self.assertEqual(second.data['sampled_at'], first.data['sampled_at'])
+        self.assertEqual(len(second.data['history']), 1)
+        for call in cpu_percent.call_args_list:
+            self.assertIsNone(call.kwargs.get('interval'))
+
+    @override_settings(HEALTH_SAMPLE_INTERVAL=0)
+    def test_ring_buffer_keeps_last_samples(self):
+        """Test failing sources are reported as unavailable and history is bounded"""
+        from unittest import mock
+        from . import health
+
+        with mock.patch('user.health.redis_stats', side_effect=ConnectionError('down')), \
+                mock.patch('user.health.celery_queue_depth', side_effect=ConnectionError('down')):
+            for _ in range(health._samples.maxlen + 5):
+                response = self.client.get(reverse('system-health'))
+
+        self.assertEqual(len(response.data['history']), health._samples.maxlen)
+        self.assertIsNone(response.data['system_metrics']['redis'])
+
+class ProbeTests(APITestCase):
+    def setUp(self):
+        from . import health
+        health._readiness = None
+
+    def test_livez_does_no_io(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('livez'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(
+        MEDIA_ROOT=tempfile.mkdtemp(),
+        CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+        READINESS_CHECKS=['database', 'cache', 'channel_layer', 'media'],
+    )
+    def test_readyz_ready_and_cached(self):
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(set(response.data['checks']), {'database', 'cache', 'channel_layer', 'media'})
+        self.assertFalse(response.data['cached'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('readyz'))
+        self.assertTrue(response.data['cached'])
+
+    @override_settings(READINESS_CHECKS=['database', 'celery_broker'], READINESS_CHECK_TIMEOUT=0.2)
+    def test_readyz_checks_run_concurrently_with_timeout(self):
+        """Test a hung dependency makes the probe fail fast with 503"""
+        import time
+        from unittest import mock
+
+        def hung_broker():
+            time.sleep(1)
+
+        with mock.patch.dict('user.health.READINESS_CHECKS', {'celery_broker': hung_broker}):
+            started = time.monotonic()
+            response = self.client.get(reverse('readyz'))
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data['checks']['celery_broker']['status'], 'timeout')
+        self.assertEqual(response.data['checks']['database']['status'], 'ok')
+        self.assertLess(elapsed, 0.9)
+
+# (url name, method, url kwargs, data, user) of one representative request per
+# route of user/urls.py; {name} values refer to QueryBudgetTests.ids
+QUERY_BUDGET_REQUESTS = [
+    ('user-detail', 'GET', {'pk': '{student}'}, None, 'student'),
+    ('user-detail', 'PATCH', {'pk': '{student}'}, {'first_name': 'Budget'}, 'student'),
+    ('login', 'POST', {}, {'email': 'budget_student@example.com', 'password': 'testpass123'}, None),
+    ('logout', 'POST', {}, None, 'student'),
+    ('CheckAuthentification', 'GET', {}, None, 'student'),
+    ('RegisterwithoutFile', 'POST', {}, {'email': 'new@example.com', 'firstName': 'New', 'lastName': 'User'}, 'admin'),
+    ('user-update-status', 'PATCH', {'user_id': '{student}'}, {'status': 1}, 'admin'),
+    ('Dashboard', 'GET', {}, None, 'admin'),
+    ('CSVUpload', 'POST', {}, None, 'admin'),
+    ('notification-list', 'GET', {}, None, 'student'),
+    ('notification-mark-read', 'POST', {'notification_id': '{notification}'}, None, 'student'),
+    ('broadcast-notification-mark-read', 'POST', {'notification_id': '{broadcast}'}, None, 'student'),
+    ('notification-mark-all-read', 'POST', {}, None, 'student'),
+    ('notification-unread-count', 'GET', {}, None, 'student'),
+    ('course-list', 'GET', {}, None, 'student'),
+    ('course-list', 'POST', {}, {'title_of_course': 'Budget course 2', 'description': 'New'}, 'creator'),
+    ('courses', 'GET', {}, None, 'creator'),
+    ('course-detail', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('course-detail', 'PATCH', {'pk': '{course}'}, {'description': 'Updated'}, 'creator'),
+    ('my-courses', 'GET', {}, None, 'creator'),
+    ('update-course-image', 'PATCH', {'pk': '{course}'}, None, 'creator'),
+    ('course-statistics', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('course-progress-overview', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('qcm-performance', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('enrollment-trend', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('subscription-stats', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('leaderboard', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('course-time-stats', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('time-tracking-record', 'POST', {'pk': '{course}'}, {'content_id': '{pdf}', 'duration': 60}, 'student'),
+    ('module-list-create', 'GET', {'course_id': '{course}'}, None, 'creator'),
+    ('module-list-create', 'POST', {'course_id': '{course}'}, {'title': 'Budget module 3', 'order': 3}, 'creator'),
+    ('module-detail', 'GET', {'course_id': '{course}', 'module_id': '{module}'}, None, 'creator'),
+    ('module-detail', 'PATCH', {'course_id': '{course}', 'module_id': '{module}'}, {'title': 'Renamed'}, 'creator'),
+    ('course-contents', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('course-content-detail', 'GET', {'course_pk': '{course}', 'content_pk': '{pdf}'}, None, 'student'),
+    ('course-content-detail', 'PATCH', {'course_pk': '{course}', 'content_pk': '{pdf}'}, {'title': 'Renamed'}, 'creator'),
+    ('create-pdf-content', 'POST', {'course_id': '{course}', 'module_id': '{module}'}, None, 'creator'),
+    ('create-video-content', 'POST', {'course_id': '{course}', 'module_id': '{module}'}, None, 'creator'),
+    ('create-qcm-content', 'POST', {'course_id': '{course}', 'module_id': '{module}'}, {
+        'title': 'Quiz 2', 'order': 9, 'questions': [{
+            'question': 'Budget?', 'order': 1,
+            'options': [{'text': 'Yes', 'is_correct': True}, {'text': 'No', 'is_correct': False}],
+        }],
+    }, 'creator'),
+    ('direct-upload-url', 'POST', {'course_id': '{course}', 'module_id': '{module}', 'kind': 'pdf'}, {'filename': 'a.pdf'}, 'creator'),
+    ('direct-upload-complete', 'POST', {'course_id': '{course}', 'module_id': '{module}', 'kind': 'pdf'}, {'upload_token': 'x'}, 'creator'),
+    ('module-update-status', 'PATCH', {'course_id': '{course}', 'module_id': '{module}'}, {'status': 1}, 'creator'),
+    ('content-update-status', 'PATCH', {'course_id': '{course}', 'content_id': '{pdf}'}, {'status': 1}, 'creator'),
+    ('mark_video_completed', 'POST', {'pk': '{course}'}, {'content_id': '{video}'}, 'student'),
+    ('mark_pdf_completed', 'POST', {'pk': '{course}'}, {'content_id': '{pdf}'}, 'student'),
+    ('course-update-status', 'PATCH', {'pk': '{course}'}, {'status': 1}, 'creator'),
+    ('complete-content', 'POST', {'pk': '{video}'}, None, 'student'),
+    ('check-completion', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('recommended-courses', 'GET', {}, None, 'student'),
+    ('similar-courses', 'GET', {'pk': '{course}'}, None, None),
+    ('home-feed', 'GET', {}, None, 'student'),
+    ('async-course-detail', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('async-is-subscribed', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('async-my-subscriptions', 'GET', {}, None, 'student'),
+    ('async-notification-list', 'GET', {}, None, 'student'),
+    ('async-admin-dashboard', 'GET', {}, None, 'admin'),
+    ('course-subscribers', 'GET', {}, None, 'student'),
+    ('my-subscriptions', 'GET', {}, None, 'student'),
+    ('course-subscribers-list', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('subscribe', 'POST', {'pk': '{course}'}, None, 'newcomer'),
+    ('unsubscribe', 'POST', {'pk': '{course}'}, None, 'student'),
+    ('is-subscribed', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('update-progress', 'POST', {'pk': '{course}'}, {'progress_percentage': 50}, 'student'),
+    ('my-progress', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('qcm-progress', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('course-time-calculation', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('chat-messages', 'GET', {'user_id': '{creator}'}, None, 'student'),
+    ('chat-send', 'POST', {}, {'receiver_id': '{creator}', 'message': 'Hello'}, 'student'),
+    ('mark-message-read', 'PATCH', {'message_id': '{message}'}, None, 'creator'),
+    ('submit-qcm', 'POST', {'pk': '{course}'}, {'content_id': '{qcm}', 'question_answers': {}}, 'student'),
+    ('check-access', 'GET', {'pk': '{course}'}, None, 'student'),
+    ('update-pdf-content', 'PUT', {'course_id': '{course}', 'content_id': '{pdf}'}, {'title': 'Renamed'}, 'creator'),
+    ('update-video-content', 'PUT', {'course_id': '{course}', 'content_id': '{video}'}, {'title': 'Renamed'}, 'creator'),
+    ('update-qcm-content', 'PUT', {'course_id': '{course}', 'content_id': '{qcm}'}, {'title': 'Renamed'}, 'creator'),
+    ('admin-dashboard', 'GET', {}, None, 'admin'),
+    ('admin-users', 'GET', {}, None, 'admin'),
+    ('admin-user-detail', 'GET', {'user_id': '{student}'}, None, 'admin'),
+    ('admin-courses', 'GET', {}, None, 'admin'),
+    ('admin-analytics', 'GET', {}, None, 'admin'),
+    ('admin-contents', 'GET', {}, None, 'admin'),
+    ('system-health', 'GET', {}, None, 'admin'),
+    ('CourseList', 'GET', {}, None, 'admin'),
+    ('course-students', 'GET', {'course_id': '{course}'}, None, 'creator'),
+    ('course-subscribe', 'POST', {'course_id': '{course}'}, None, 'newcomer'),
+    ('course-stats-debug', 'GET', {'pk': '{course}'}, None, 'creator'),
+    ('global-search', 'GET', {}, {'q': 'budget'}, 'student'),
+    ('search-suggest', 'GET', {}, {'q': 'bud'}, None),
+    ('favorite-courses-list', 'GET', {}, None, 'student'),
+    ('favorite-courses-list', 'POST', {}, {'course': '{course}'}, 'newcomer'),
+    ('favorite-courses-toggle-favorite', 'POST', {}, {'course_id': '{course}'}, 'student'),
+    ('favorite-courses-remove-by-course', 'DELETE', {'course_id': '{course}'}, None, 'student'),
+    ('favorite-courses-detail', 'GET', {'pk': '{favorite}'}, None, 'student'),
+    ('api-root', 'GET', {}, None, 'student'),
+]
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import (
+            BroadcastNotification, ChatMessage, FavoriteCourse, Notification, QCMAttempt, QCMCompletion,
+            QCMQuestion, Subscription, TimeTracking,
+        )
+
+        cls.users = {
+            'admin': User.objects.create_superuser(
+                username='budget_admin', email='budget_admin@example.com', password='testpass123', privilege='A'
+            ),
+            'creator': User.objects.create_user(
+                username='budget_creator', email='budget_creator@example.com', password='testpass123', privilege='F'
+            ),
+            'student': User.objects.create_user(
+                username='budget_student', email='budget_student@example.com', password='testpass123'
+            ),
+            'newcomer': User.objects.create_user(
+                username='budget_newcomer', email='budget_newcomer@example.com', password='testpass123'
+            ),
+        }
+        course = Course.objects.create(title_of_course='Budget course', creator=cls.users['creator'], status=1)
+        types = {name: ContentType.objects.create(name=name) for name in ('pdf', 'video', 'qcm')}
+
+        contents = {}
+        for module_order in (1, 2):
+            module = course.modules.create(title=f'Budget module {module_order}', order=module_order, status=1)
+            for order, kind in enumerate(('pdf', 'video', 'qcm'), start=1):
+                content = CourseContent.objects.create(
+                    module=module, content_type=types[kind], title=f'{kind} {module_order}', order=order
+                )
+                if kind == 'pdf':
+                    PDFContent.objects.create(course_content=content, pdf_file='pdfs/budget.pdf')
+                elif kind == 'video':
+                    VideoContent.objects.create(course_content=content, video_file='videos/budget.mp4')
+                else:
+                    qcm = QCM.objects.create(course_content=content)
+                    for question_order in (1, 2):
+                        question = QCMQuestion.objects.create(qcm=qcm, question='Budget?', order=question_order)
+                        for option_order in (1, 2, 3):
+                            QCMOption.objects.create(
+                                question=question, text=f'Option {option_order}', is_correct=option_order == 1
+                            )
+                contents.setdefault(kind, content)
+
+        student = cls.users['student']
+        subscription = Subscription.objects.create(user=student, course=course)
+        subscription.completed_contents.add(contents['pdf'])
+        qcm = contents['qcm'].qcm
+        QCMCompletion.objects.create(subscription=subscription, qcm=qcm, best_score=50, attempts_count=1)
+        QCMAttempt.objects.create(user=student, qcm=qcm, score=50)
+        now = timezone.now()
+        TimeTracking.objects.bulk_create([
+            TimeTracking(
+                user=student, course=course, module=contents['pdf'].module, content=contents['pdf'],
+                start_time=now - timedelta(minutes=10 * i + 5), end_time=now - timedelta(minutes=10 * i), duration=300,
+            )
+            for i in range(5)
+        ])
+        notification = Notification.objects.create(
+            user=student, notification_type='system', title='Budget', message='Budget', related_course=course
+        )
+        broadcast = BroadcastNotification.objects.create(
+            notification_type='course_activated', title='Budget', message='Budget', related_course=course,
+            department=student.department,
+        )
+        message = ChatMessage.objects.create(sender=student, receiver=cls.users['creator'], message='Hi')
+        favorite = FavoriteCourse.objects.create(user=student, course=course)
+
+        cls.ids = {
+            'course': course.id, 'module': contents['pdf'].module_id, 'pdf': contents['pdf'].id,
+            'video': contents['video'].id, 'qcm': contents['qcm'].id, 'notification': notification.id,
+            'broadcast': broadcast.id,
+            'message': message.id, 'favorite': favorite.id,
+            **{name: user.id for name, user in cls.users.items()},
+        }
+
+    def resolve(self, value):
+        if isinstance(value, str) and value.startswith('{') and value.endswith('}'):
+            return self.ids[value[1:-1]]
+        if isinstance(value, dict):
+            return {key: self.resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(item) for item in value]
+        return value
+
+    def measure(self, name, method, kwargs, data, user):
+        """Queries run by one request, rolled back afterwards"""
+        from django.core.cache import cache
+        from django.db import transaction
+        from .querybudget import QueryRecorder
+        from contextlib import ExitStack
+
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        cache.clear()
+        # Real cookie authentication, so its user lookup counts like in production
+        self.client.cookies.clear()
+        if user:
+            self.client.cookies['accessToken'] = str(AccessToken.for_user(self.users[user]))
+        self.client.raise_request_exception = False
+        url = reverse(name, kwargs=self.resolve(kwargs))
+        with transaction.atomic():
+            with ExitStack() as stack:
+                recorder = QueryRecorder().track(stack)
+                if method == 'GET':
+                    self.client.get(url, self.resolve(data))
+                else:
+                    getattr(self.client, method.lower())(url, self.resolve(data), format='json')
+            transaction.set_rollback(True)
+        return recorder.count
+
+    def test_every_route_has_a_budget(self):
+        from . import urls
+        from .querybudget import DEFAULT_BUDGET_FILE, load_budgets
+
+        budgets = load_budgets(DEFAULT_BUDGET_FILE)
+        names = {pattern.name for pattern in urls.urlpatterns if getattr(pattern, 'name', None)}
+        names.update(pattern.name for pattern in urls.router.urls)
+        self.assertEqual(names - set(budgets), set())
+        self.assertEqual(names - {request[0] for request in QUERY_BUDGET_REQUESTS}, set())
+
+    def test_endpoints_stay_within_budget(self):
+        """Test each route against query_budgets.json (UPDATE_QUERY_BUDGETS=1 rewrites it)"""
+        import json
+        from unittest import mock
+        from .querybudget import DEFAULT_BUDGET_FILE, load_budgets
+
+        # Home feed sections and async views run in the request thread so that their queries are counted
+        with mock.patch('user.health.redis_stats', return_value=None), \
+                mock.patch('user.health.celery_queue_depth', return_value=None), \
+                self.settings(HOME_FEED_CONCURRENT=False, ASYNC_VIEWS_CONCURRENT=False):
+            measured = {}
+            for name, method, kwargs, data, user in QUERY_BUDGET_REQUESTS:
+                measured.setdefault(name, {})[method] = self.measure(name, method, kwargs, data, user)
+
+        if os.getenv('UPDATE_QUERY_BUDGETS'):
+            with open(DEFAULT_BUDGET_FILE, 'w') as f:
+                json.dump(dict(sorted(measured.items())), f, indent=2)
+                f.write('\n')
+            load_budgets.cache_clear()
+            return
+
+        budgets = load_budgets(DEFAULT_BUDGET_FILE)
+        for name, methods in measured.items():
+            for method, count in methods.items():
+                with self.subTest(route=name, method=method):
+                    self.assertLessEqual(count, budgets[name][method], f"{method} {name} ran {count} queries")
+
+    def test_budget_helper(self):
+        """Test assertQueryBudget passes within budget and reports repeated SQL otherwise"""
+        self.client.force_authenticate(user=self.users['student'])
+
+        with self.assertQueryBudget('my-subscriptions'):
+            self.client.get(reverse('my-subscriptions'))
+
+        with self.assertRaises(AssertionError) as failure:
+            with self.assertQueryBudget('course-contents', budget=3):
+                self.client.get(reverse('course-contents', kwargs={'pk': self.ids['course']}))
+        self.assertIn('budget is 3', str(failure.exception))
+        self.assertIn('user/', str(failure.exception))
+
+    def test_middleware_headers_and_n_plus_one_warning(self):
+        self.client.force_authenticate(user=self.users['student'])
+        with self.assertLogs('user.querybudget', level='WARNING') as logs:
+            response = self.client.get(reverse('course-contents', kwargs={'pk': self.ids['course']}))
+
+        self.assertGreater(int(response['X-DB-Queries']), 5)
+        self.assertGreaterEqual(float(response['X-DB-Time']), 0)
+        self.assertIn('(course-contents)', logs.output[0])
+        self.assertRegex(logs.output[0], r'from user/\w+\.py:\d+ in \w+')
+
+    def test_middleware_runs_in_async_mode(self):
+        from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from .querybudget import QueryBudgetMiddleware
+
+        async def get_response(request):
+            await sync_to_async(Course.objects.count)()
+            return HttpResponse()
+
+        middleware = QueryBudgetMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertEqual(response['X-DB-Queries'], '1')
+
+    def test_sql_shape(self):
+        from .querybudget import sql_shape
+
+        self.assertEqual(
+            sql_shape('SELECT "a"."id" FROM "a" WHERE "a"."id" IN (%s, %s, %s) AND "a"."n" = \'x\' LIMIT 21'),
+            'SELECT "a"."id" FROM "a" WHERE "a"."id" IN (...) AND "a"."n" = ? LIMIT ?'
+        )
+
+class SeedLoadCommandTests(TestCase):
+    def seed(self, **options):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command(
+            'seed_load', users_per_department=4, courses=6, modules_per_course=2, contents_per_module=3,
+            questions_per_qcm=2, options_per_question=3, subscriptions_per_user=3, time_tracking_rows=500,
+            chunk_size=64, stdout=StringIO(), **options
+        )
+
+    def snapshot(self):
+        from django.db.models import Sum
+        from .models import LearningSession, QCMAttempt, QCMQuestion, Subscription, TimeTracking
+
+        return {
+            'users': User.objects.filter(username__startswith='load_').count(),
+            'courses': Course.objects.count(),
+            'contents': CourseContent.objects.count(),
+            'questions': QCMQuestion.objects.count(),
+            'options': QCMOption.objects.count(),
+            'subscriptions': Subscription.objects.count(),
+            'completed': Subscription.completed_contents.through.objects.count(),
+            'attempts': QCMAttempt.objects.count(),
+            'tracking': TimeTracking.objects.count(),
+            'seconds': TimeTracking.objects.aggregate(total=Sum('duration'))['total'],
+            'time_spent': Subscription.objects.aggregate(total=Sum('total_time_spent'))['total'],
+            'sessions': LearningSession.objects.count(),
+            'session_seconds': LearningSession.objects.aggregate(total=Sum('duration'))['total'],
+        }
+
+    def test_generates_consistent_reproducible_data(self):
+        self.seed()
+        first = self.snapshot()
+
+        self.assertEqual(first['users'], 20)
+        self.assertEqual(first['courses'], 6)
+        self.assertEqual(first['contents'], 36)
+        self.assertEqual(first['options'], first['questions'] * 3)
+        self.assertEqual(first['tracking'], 500)
+        # Subscription times come from the sessions, where overlapping intervals count once
+        self.assertGreater(first['sessions'], 0)
+        self.assertEqual(first['session_seconds'], first['time_spent'])
+        self.assertLessEqual(first['time_spent'], first['seconds'])
+        self.assertGreater(first['completed'], 0)
+
+        # Same seed, same data
+        self.seed(flush=True)
+        self.assertEqual(self.snapshot(), first)
+
+
+class BenchmarkTests(TestCase):
+    def test_compare_reports_regressions_beyond_tolerance(self):
+        from .benchmarks import compare
+
+        reference = {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 5, 'peak_memory_kb': 100.0}
+        baseline = {'scale=0.1': {'CourseList': reference, 'CourseDetail': reference}}
+        current = {
+            'scale=0.1': {
+                'CourseList': {**reference, 'p50_ms': 12.0, 'p95_ms': 24.9},
+                'CourseDetail': {**reference, 'p95_ms': 26.0, 'queries': 6},
+                'MySubscriptions': {**reference, 'p95_ms': 500.0},
+            },
+        }
+
+        regressions = compare(baseline, current, tolerance=0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all('CourseDetail' in regression for regression in regressions))
+        self.assertEqual(compare(baseline, current, tolerance=0.5, query_tolerance=1), [])
+
+    def test_percentile(self):
+        from .benchmarks import percentile
+
+        self.assertEqual(percentile([4, 1, 3, 2, 5], 0.5), 3)
+        self.assertAlmostEqual(percentile(range(1, 101), 0.95), 95.05)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_suite_measures_every_endpoint_on_seeded_data(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .benchmarks import ENDPOINTS, run_suite
+        from .models import QCMAttempt, TimeTracking
+
+        call_command(
+            'seed_load', users_per_department=3, courses=4, modules_per_course=2, contents_per_module=4,
+            questions_per_qcm=2, options_per_question=3, subscriptions_per_user=3, time_tracking_rows=200,
+            stdout=StringIO(),
+        )
+        attempts, tracking = QCMAttempt.objects.count(), TimeTracking.objects.count()
+
+        results = run_suite(iterations=2, warmup=1, memory_iterations=1)
+
+        self.assertEqual(set(results), {endpoint.name for endpoint in ENDPOINTS})
+        for name, result in results.items():
+            self.assertTrue(all(code < 400 for code in result['status']), (name, result['status']))
+            self.assertGreater(result['queries'], 0, name)
+            self.assertGreater(result['peak_memory_kb'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+        # Writing endpoints are rolled back
+        self.assertEqual(QCMAttempt.objects.count(), attempts)
+        self.assertEqual(TimeTracking.objects.count(), tracking)
+
+
+class WebSocketLoadTests(TestCase):
+    def test_harness_reports_latency_fanout_and_memory(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .wsload import run_load
+
+        call_command(
+            'seed_load', users_per_department=3, courses=3, modules_per_course=2, contents_per_module=4,
+            questions_per_qcm=2, options_per_question=3, subscriptions_per_user=3, time_tracking_rows=0,
+            stdout=StringIO(),
+        )
+
+        report = run_load(
+            course_connections=20, chat_connections=6, messages=2, senders=2, broadcasts=2,
+            connect_concurrency=5, timeout=10,
+        )
+
+        self.assertEqual(report['connections']['course'], 20)
+        self.assertEqual(report['connections']['chat'], 6)
+        self.assertEqual(report['connections']['failed'], 0)
+        self.assertGreater(report['connections']['memory_per_connection_kb'], 0)
+        self.assertEqual(report['fanout']['group_size'], 20)
+        self.assertEqual(report['fanout']['errors'], 0)
+        self.assertEqual(report['fanout']['last_receiver']['count'], 2)
+        messages = report['messages']
+        self.assertEqual(messages['progress_request']['count'], 4)
+        self.assertEqual(messages['content_completed']['count'], 4)
+        self.assertEqual(messages['qcm_submission']['count'] + messages['qcm_submission']['errors'], 4)
+        self.assertEqual(messages['chat_message']['count'], 4)
+        self.assertEqual(messages['chat_delivery']['count'], 4)
+
+
+@override_settings(ASYNC_VIEWS_CONCURRENT=False)
+class AsyncViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from io import StringIO
+        from django.core.management import call_command
+        from .benchmarks import load_fixture
+        from .models import Notification
+
+        call_command(
+            'seed_load', users_per_department=3, courses=4, modules_per_course=2, contents_per_module=4,
+            questions_per_qcm=2, options_per_question=3, subscriptions_per_user=3, time_tracking_rows=200,
+            stdout=StringIO(),
+        )
+        cls.fixture = load_fixture()
+        for number in range(3):
+            Notification.objects.create(
+                user=cls.fixture['student'], notification_type='system', title=f'N{number}', message='Hello',
+                is_read=number == 0,
+            )
+
+    def assertSameResponse(self, sync_name, async_name, kwargs=None, user='student', ignore=()):
+        self.client.force_authenticate(user=self.fixture[user])
+        sync_response = self.client.get(reverse(sync_name, kwargs=kwargs))
+        async_response = self.client.get(reverse(async_name, kwargs=kwargs))
+
+        self.assertEqual(sync_response.status_code, 200, sync_name)
+        self.assertEqual(async_response.status_code, 200, async_name)
+        sync_data, async_data = sync_response.json(), async_response.json()
+        for key in ignore:
+            sync_data.pop(key, None)
+            async_data.pop(key, None)
+        self.assertEqual(async_data, sync_data)
+        return async_data
+
+    def test_async_variants_return_the_sync_payloads(self):
+        course = {'pk': self.fixture['course'].pk}
+        self.assertSameResponse('course-detail', 'async-course-detail', course)
+        self.assertSameResponse('is-subscribed', 'async-is-subscribed', course)
+        self.assertTrue(self.assertSameResponse('my-subscriptions', 'async-my-subscriptions'))
+        notifications = self.assertSameResponse('notification-list', 'async-notification-list')
+        self.assertEqual((notifications['total_count'], notifications['unread_count']), (3, 2))
+        self.assertSameResponse('admin-dashboard', 'async-admin-dashboard', user='admin', ignore=['timestamp'])
+
+    def test_course_detail_runs_bounded_query_groups(self):
+        from unittest import mock
+        from . import views
+
+        groups = []
+        real = views.run_orm
+
+        async def spy(function, *args):
+            groups.append([field.field_name for field in args[0]])
+            return await real(function, *args)
+
+        self.client.force_authenticate(user=self.fixture['student'])
+        with mock.patch('user.views.run_orm', spy), self.settings(ASYNC_SERIALIZE_BATCHES=3):
+            response = self.client.get(reverse('async-course-detail', kwargs={'pk': self.fixture['course'].pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(groups), 3)
+        grouped = {name for group in groups for name in group}
+        self.assertIn('modules', grouped)
+        self.assertNotIn('status_display', grouped)
+        self.assertNotIn('image_url', grouped)
+
+    def test_admin_dashboard_runs_bounded_query_groups(self):
+        from unittest import mock
+        from . import views
+
+        calls = []
+        real = views.run_orm
+
+        async def spy(function, *args):
+            calls.append(function)
+            return await real(function, *args)
+
+        self.client.force_authenticate(user=self.fixture['admin'])
+        with mock.patch('user.views.run_orm', spy), self.settings(ASYNC_SERIALIZE_BATCHES=3):
+            response = self.client.get(reverse('async-admin-dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(calls), 3)
+
+    def test_async_variants_check_permissions(self):
+        self.assertEqual(self.client.get(reverse('async-my-subscriptions')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('async-notification-list')).status_code, 401)
+        self.client.force_authenticate(user=self.fixture['student'])
+        self.assertEqual(self.client.get(reverse('async-admin-dashboard')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('async-course-detail', kwargs={'pk': 999999})).status_code, 404)
+
+    def test_throughput_comparison(self):
+        from .benchmarks import run_throughput
+
+        results = run_throughput(names=['CheckSubscription', 'NotificationListView'], concurrency=2, requests=4)
+
+        self.assertEqual(set(results), {'CheckSubscription', 'NotificationListView'})
+        for result in results.values():
+            self.assertEqual(result['sync']['status'], [200])
+            self.assertEqual(result['async']['status'], [200])
+            self.assertGreater(result['speedup'], 0)
+
+
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        from unittest import mock
+        patcher = mock.patch('user.dbrouting.replica_alias', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_router_reads_from_replica_until_a_write(self):
+        from .dbrouting import ReplicaRouter, use_replica
+
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Course))
+        with use_replica():
+            self.assertEqual(router.db_for_read(Course), 'replica')
+            self.assertEqual(router.db_for_write(Course), 'default')
+            # Read-your-writes within the block
+            self.assertIsNone(router.db_for_read(Course))
+        self.assertFalse(router.allow_migrate('replica', 'user'))
+        self.assertIsNone(router.allow_migrate('default', 'user'))
+
+        on_replica, on_default = Course(), Course()
+        on_replica._state.db, on_default._state.db = 'replica', 'default'
+        self.assertTrue(router.allow_relation(on_replica, on_default))
+
+    def routed_reads(self, url, **extra):
+        """Aliases returned by the router for the reads of a request"""
+        from unittest import mock
+        from .dbrouting import ReplicaRouter
+
+        aliases = []
+        real = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            alias = real(router, model, **hints)
+            aliases.append(alias)
+            # Serve the replica reads from the test database
+            return 'default' if alias == 'replica' else alias
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy), \
+                mock.patch('user.health.redis_stats', return_value=None), \
+                mock.patch('user.health.celery_queue_depth', return_value=None):
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return aliases
+
+    def test_analytics_views_read_from_replica_unless_sticky(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        admin = User.objects.create_superuser('replica_admin', 'replica_admin@test.com', 'pass', privilege='A')
+        Course.objects.create(title_of_course='Replicated', creator=admin, status=1)
+        self.client.cookies['accessToken'] = str(AccessToken.for_user(admin))
+
+        for name in ('admin-analytics', 'admin-dashboard', 'admin-contents'):
+            with self.subTest(view=name):
+                self.assertIn('replica', self.routed_reads(reverse(name)))
+                self.assertNotIn('replica', self.routed_reads(reverse(name), HTTP_X_READ_YOUR_WRITES='1'))
+
+        self.client.cookies['read_primary'] = '1'
+        self.assertNotIn('replica', self.routed_reads(reverse('admin-dashboard')))
+        # Other views always read from default
+        del self.client.cookies['read_primary']
+        self.assertNotIn('replica', self.routed_reads(reverse('course-list')))
+
+    def test_writes_make_the_client_sticky(self):
+        from .models import Notification
+
+        user = User.objects.create_user(username='replica_writer', password='pass')
+        Notification.objects.create(user=user, notification_type='system', title='Hi', message='There')
+        self.client.force_authenticate(user=user)
+
+        self.assertNotIn('read_primary', self.client.get(reverse('notification-list')).cookies)
+        response = self.client.post(reverse('notification-mark-all-read'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies['read_primary']['max-age'], 10)
+
+    def test_middleware_runs_in_async_mode(self):
+        from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from .dbrouting import ReplicaStickinessMiddleware
+
+        user = User.objects.create_user(username='replica_async', password='pass')
+
+        async def get_response(request):
+            await sync_to_async(user.save)()
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        # A safe request that wrote still makes its client sticky
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertIn('read_primary', response.cookies)
+
+
+class ConnectionPoolTests(TestCase):
+    def test_pool_stats_are_exported(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from .metrics import DB_POOL_SATURATION, DB_POOL_WAIT, collect_samples, record_pool_stats
+
+        stats = {
+            'pool_min': 2, 'pool_max': 10, 'pool_size': 8, 'pool_available': 2, 'requests_waiting': 1,
+            'requests_num': 50, 'requests_queued': 5, 'requests_wait_ms': 1500,
+        }
+        pool = mock.Mock(closed=False, pop_stats=mock.Mock(return_value=stats))
+        wait_before = DB_POOL_WAIT.labels('default')._value.get()
+
+        with mock.patch('user.metrics.connections', {'default': SimpleNamespace(pool=pool), 'other': object()}):
+            summary = record_pool_stats()
+
+        self.assertEqual(summary, {'default': {'in_use': 6, 'max_size': 10, 'waiting': 1, 'saturation': 0.6}})
+        self.assertEqual(DB_POOL_SATURATION.labels('default')._value.get(), 0.6)
+        self.assertAlmostEqual(DB_POOL_WAIT.labels('default')._value.get() - wait_before, 1.5)
+        self.assertIn('db_pool_requests', collect_samples())
+
+    def test_connection_mode_alias_is_removed(self):
+        from django.db import connections
+        from .benchmarks import connection_mode
+
+        with connection_mode('persistent', pool_size=2) as alias:
+            self.assertEqual(connections[alias].settings_dict['CONN_MAX_AGE'], 600)
+            self.assertTrue(connections[alias].settings_dict['CONN_HEALTH_CHECKS'])
+        self.assertNotIn(alias, connections.settings)
+
+
+class TimeTrackingRollupTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Subscription, TimeTracking
+
+        cls.student = User.objects.create_user(username='rollup_student', password='pass')
+        creator = User.objects.create_user(username='rollup_creator', password='pass', privilege='F')
+        cls.course = Course.objects.create(title_of_course='Rollups', creator=creator, status=1)
+        module = cls.course.modules.create(title='Rollup module', order=1, status=1)
+        types = {name: ContentType.objects.create(name=name) for name in ('pdf', 'video')}
+        contents = [
+            CourseContent.objects.create(module=module, content_type=types[kind], title=kind, order=order, status=1)
+            for order, kind in enumerate(('pdf', 'video'), start=1)
+        ]
+        Subscription.objects.create(user=cls.student, course=cls.course)
+
+        now = timezone.now()
+        records = []
+        for days_ago in (70, 3, 2, 0):
+            for index, content in enumerate(contents):
+                start = now - timedelta(days=days_ago, minutes=30 * index + 10)
+                records.append(TimeTracking(
+                    user=cls.student, course=cls.course, module=module, content=content,
+                    start_time=start, end_time=start + timedelta(minutes=5), duration=300 + index * 60,
+                    session_type='content',
+                ))
+        records.append(TimeTracking(
+            user=cls.student, course=cls.course, start_time=now - timedelta(days=2), end_time=now - timedelta(days=2),
+            duration=120, session_type='course',
+        ))
+        TimeTracking.objects.bulk_create(records)
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    @skipUnless(connection.vendor == 'postgresql', 'TimeTracking is only partitioned on PostgreSQL')
+    def test_new_partitions_take_their_rows_from_default(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import TimeTracking
+        from .timetracking import add_months, ensure_partitions, month_start, partitions
+
+        ahead = len([month for month in partitions() if month > month_start(timezone.now())])
+        # Beyond the partitions created ahead: lands in DEFAULT
+        later = add_months(month_start(timezone.now()), ahead + 1) + timedelta(days=3)
+        TimeTracking.objects.create(
+            user=self.student, course=self.course, start_time=later, end_time=later, duration=60,
+        )
+
+        def count(table):
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT count(*) FROM {table}')
+                return cursor.fetchone()[0]
+
+        in_default = count('user_timetracking_default')
+        created = ensure_partitions(ahead=ahead + 1)
+        self.assertEqual(created, [f'user_timetracking_p{later:%Y_%m}'])
+        self.assertEqual(count(created[0]), 1)
+        self.assertEqual(count('user_timetracking_default'), in_default - 1)
+        self.assertTrue(TimeTracking.objects.filter(start_time=later).exists())
+
+    def responses(self):
+        self.client.force_authenticate(user=self.student)
+        stats = self.client.get(reverse('course-time-stats', kwargs={'pk': self.course.pk})).data
+        contents = self.client.get(reverse('course-contents', kwargs={'pk': self.course.pk})).data
+        return stats, contents
+
+    def test_stats_from_rollups_match_the_raw_records(self):
+        from django.utils import timezone
+        from .models import TimeTrackingDaily
+        from .timetracking import rollup_time_tracking
+
+        expected = self.responses()
+        first, last, written = rollup_time_tracking()
+        # Complete days only: today stays in the raw records
+        self.assertLess(last, timezone.now().date())
+        self.assertEqual(written, TimeTrackingDaily.objects.count())
+        self.assertEqual(written, 7)  # 3 past days x 2 contents + the course session
+
+        with override_settings(TIME_STATS_FROM_ROLLUPS=True):
+            stats, contents = self.responses()
+        self.assertEqual(stats['total_time_spent'], expected[0]['total_time_spent'])
+        self.assertEqual(stats['session_count'], expected[0]['session_count'])
+        for key in ('time_by_session_type', 'time_by_content_type', 'module_time_distribution', 'daily_time_spent'):
+            with self.subTest(key=key):
+                self.assertCountEqual(stats[key], expected[0][key])
+        self.assertEqual(contents, expected[1])
+
+    def test_rollup_recomputes_recent_days(self):
+        from datetime import timedelta
+        from django.db.models import Sum
+        from django.utils import timezone
+        from .models import TimeTracking, TimeTrackingDaily
+        from .timetracking import rollup_time_tracking
+
+        rollup_time_tracking()
+        late = timezone.now() - timedelta(days=1)
+        TimeTracking.objects.create(
+            user=self.student, course=self.course, start_time=late, end_time=late, duration=60, session_type='course',
+        )
+        rollup_time_tracking()
+        self.assertEqual(
+            TimeTrackingDaily.objects.filter(day=late.date()).aggregate(total=Sum('total_duration'))['total'], 60,
+        )
+        self.assertEqual(TimeTrackingDaily.objects.filter(day=late.date()).count(), 1)
+
+    def test_retention_only_drops_rolled_up_rows_read_from_rollups(self):
+        from .models import TimeTracking
+        from .timetracking import prune_time_tracking, rollup_time_tracking, total_time
+
+        records = TimeTracking.objects.count()
+        with override_settings(TIME_TRACKING_RETENTION_MONTHS=1):
+            # Neither before the first rollup nor while the stats read the raw records
+            with override_settings(TIME_STATS_FROM_ROLLUPS=True):
+                self.assertEqual(prune_time_tracking(), ([], 0))
+            rollup_time_tracking()
+            self.assertEqual(prune_time_tracking(), ([], 0))
+
+            with override_settings(TIME_STATS_FROM_ROLLUPS=True):
+                before = total_time(user=self.student)
+                # The records of 70 days ago are older than a month
+                self.assertEqual(prune_time_tracking(), ([], 2))
+                self.assertEqual(total_time(user=self.student), before)
+        self.assertEqual(TimeTracking.objects.count(), records - 2)
+
+
+class SessionizationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Subscription
+
+        cls.student = User.objects.create_user(username='session_student', password='pass')
+        creator = User.objects.create_user(username='session_creator', password='pass', privilege='F')
+        cls.course = Course.objects.create(title_of_course='Sessions', creator=creator, status=1)
+        cls.subscription = Subscription.objects.create(user=cls.student, course=cls.course)
+
+    def track(self, *intervals):
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from .models import TimeTracking
+
+        origin = datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc)
+        TimeTracking.objects.bulk_create(
+            TimeTracking(
+                user=self.student, course=self.course, start_time=origin + timedelta(seconds=start),
+                end_time=origin + timedelta(seconds=end), duration=end - start, session_type='course',
+            )
+            for start, end in intervals
+        )
+
+    def test_vectorized_merge_matches_the_linear_pass(self):
+        import random
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        import numpy as np
+        from .sessionization import merge_intervals, merge_intervals_vectorized
+
+        generator = random.Random(7)
+        rows = sorted(
+            (key, start, start + generator.randint(0, 900))
+            for key in range(20)
+            for start in (generator.randint(0, 20_000) for _ in range(generator.randint(1, 30)))
+        )
+        keys, starts, ends = (np.array(column, dtype=np.int64) for column in zip(*rows))
+        merged = merge_intervals_vectorized(keys, starts, ends, 300)
+
+        origin = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        expected = []
+        for key in range(20):
+            intervals = [
+                (origin + timedelta(seconds=start), origin + timedelta(seconds=end))
+                for row_key, start, end in rows if row_key == key
+            ]
+            for start, end, covered, count in merge_intervals(intervals, timedelta(seconds=300)):
+                expected.append((
+                    key, (start - origin).total_seconds(), (end - origin).total_seconds(), covered, count,
+                ))
+        self.assertEqual([tuple(map(float, session)) for session in zip(*merged)], expected)
+
+    def test_overlapping_heartbeats_are_counted_once(self):
+        from .sessionization import sessionize
+
+        # Two tabs sending heartbeats, then a new session after an idle hour
+        self.track((0, 60), (30, 90), (60, 120), (100, 110), (300, 360), (4000, 4060))
+        self.assertEqual(sessionize(self.student.id, self.course.id), (240, 2))
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.total_time_spent, 240)
+        self.assertEqual(self.subscription.average_time_per_session, 120)
+        sessions = list(self.student.learning_sessions.order_by('start_time').values_list('duration', 'record_count'))
+        self.assertEqual(sessions, [(180, 5), (60, 1)])
+
+    def test_recording_time_extends_the_current_session(self):
+        from .models import LearningSession
+
+        self.client.force_authenticate(user=self.student)
+        url = reverse('time-tracking-record', kwargs={'pk': self.course.pk})
+        for _ in range(3):
+            response = self.client.post(url, {'duration': 60}, format='json')
+            self.assertEqual(response.status_code, 200)
+        # Heartbeats sent in a row overlap: the session covers a bit more than one of them
+        session = LearningSession.objects.get(user=self.student, course=self.course)
+        self.assertEqual(session.record_count, 3)
+        self.assertLess(session.duration, 70)
+        self.assertEqual(response.data['total_time_spent'], session.duration)
+
+    @override_settings(TIME_TRACKING_MAX_DURATION_SECONDS=3600)
+    def test_recording_rejects_out_of_range_durations(self):
+        from .models import TimeTracking
+
+        self.client.force_authenticate(user=self.student)
+        url = reverse('time-tracking-record', kwargs={'pk': self.course.pk})
+        for duration in (-60, 0, 3601, 10 ** 12, 'soon'):
+            response = self.client.post(url, {'duration': duration}, format='json')
+            self.assertEqual(response.status_code, 400, duration)
+        self.assertFalse(TimeTracking.objects.filter(user=self.student).exists())
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.total_time_spent, 0)
+
+        response = self.client.post(url, {'duration': 3600}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_backfill_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import LearningSession, Subscription
+
+        self.track((0, 60), (30, 90), (4000, 4060))
+        other = User.objects.create_user(username='session_other', password='pass')
+        untracked = Subscription.objects.create(user=other, course=self.course, total_time_spent=500)
+        call_command('sessionize_time_tracking', '--chunk-size', '1', stdout=StringIO())
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.total_time_spent, 150)
+        self.assertEqual(self.subscription.average_time_per_session, 75)
+        self.assertEqual(LearningSession.objects.count(), 2)
+        untracked.refresh_from_db()
+        self.assertEqual(untracked.total_time_spent, 500)
+        # Running it again rebuilds the same sessions
+        call_command('sessionize_time_tracking', '--since', '2026-03-02', stdout=StringIO())
+        self.assertEqual(LearningSession.objects.count(), 2)
+
+    def test_backfill_since_inside_a_session_rebuilds_it_whole(self):
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from .sessionization import backfill_sessions
+
+        # 120 contiguous 30s heartbeats: one hour in a single session
+        self.track(*((30 * index, 30 * (index + 1)) for index in range(120)))
+        backfill_sessions()
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.total_time_spent, 3600)
+
+        origin = datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc)
+        stats = backfill_sessions(since=origin + timedelta(minutes=30))
+        self.assertEqual(stats['since'], origin)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.total_time_spent, 3600)
+        self.assertEqual(self.student.learning_sessions.count(), 1)
+
+    def test_backfill_keeps_the_sessions_before_the_retention_cutoff(self):
+        from datetime import datetime, timezone as dt_timezone
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from .models import TimeTracking
+        from .sessionization import backfill_sessions
+
+        self.track((0, 60), (40 * 86400, 40 * 86400 + 60))
+        backfill_sessions()
+        # Retention dropped the raw rows of the first session
+        cutoff = datetime(2026, 4, 1, tzinfo=dt_timezone.utc)
+        TimeTracking.objects.filter(start_time__lt=cutoff).delete()
+        with mock.patch('user.timetracking.retention_cutoff', return_value=cutoff), \
+                self.settings(TIME_STATS_FROM_ROLLUPS=True):
+            self.assertEqual(backfill_sessions()['since'], cutoff)
+            self.subscription.refresh_from_db()
+            self.assertEqual(self.subscription.total_time_spent, 120)
+            self.assertEqual(self.student.learning_sessions.count(), 2)
+
+            # A session spanning the cutoff cannot be rebuilt
+            self.student.learning_sessions.filter(start_time__lt=cutoff).update(
+                end_time=datetime(2026, 4, 11, 9, tzinfo=dt_timezone.utc)
+            )
+            with self.assertRaises(CommandError):
+                call_command('sessionize_time_tracking', stdout=StringIO())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class BroadcastNotificationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Subscription
+
+        cls.creator = User.objects.create_user(username='broadcast_creator', password='pass', privilege='F', department='F')
+        cls.student = User.objects.create_user(username='broadcast_student', password='pass', department='F')
+        cls.outsider = User.objects.create_user(username='broadcast_outsider', password='pass', department='M')
+        cls.course = Course.objects.create(title_of_course='Broadcasts', creator=cls.creator, department='F', status=0)
+        Subscription.objects.create(user=cls.outsider, course=cls.course)
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def activate_course(self):
+        self.course.status = 1
+        self.course.save()
+
+    def listing(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.get(reverse('notification-list')).data
+
+    def test_activation_writes_one_broadcast_for_the_department(self):
+        from .models import BroadcastNotification, Notification
+
+        self.activate_course()
+        self.assertEqual(BroadcastNotification.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+        data = self.listing(self.student)
+        self.assertEqual(data['unread_count'], 1)
+        self.assertEqual(
+            [(item['kind'], item['notification_type'], item['is_read']) for item in data['notifications']],
+            [('broadcast', 'course_activated', False)],
+        )
+        # Neither the author nor another department
+        self.assertEqual(self.listing(self.creator)['total_count'], 0)
+        self.assertEqual(self.listing(self.outsider)['total_count'], 0)
+
+    def test_course_audience_and_merged_read_state(self):
+        from .models import BroadcastNotification, Notification
+
+        self.activate_course()
+        course_broadcast = BroadcastNotification.objects.create(
+            notification_type='system', title='Live session', message='Tomorrow', audience='course',
+            related_course=self.course,
+        )
+        Notification.objects.create(user=self.outsider, notification_type='qcm_result', title='QCM', message='80%')
+        data = self.listing(self.outsider)
+        self.assertEqual(
+            [(item['kind'], item['title']) for item in data['notifications']],
+            [('personal', 'QCM'), ('broadcast', 'Live session')],
+        )
+        self.assertEqual(data['unread_count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('broadcast-notification-mark-read', kwargs={'notification_id': course_broadcast.id})
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data['unread_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('notification-mark-all-read'))
+        self.assertEqual(response.data['updated_count'], 1)
+        self.assertEqual(self.outsider.broadcast_reads.count(), 0)
+        data = self.listing(self.outsider)
+        self.assertEqual(data['unread_count'], 0)
+        self.assertTrue(all(item['is_read'] for item in data['notifications']))
+
+        # Broadcasts of other audiences cannot be marked
+        department_broadcast = BroadcastNotification.objects.get(audience='department')
+        response = self.client.post(
+            reverse('broadcast-notification-mark-read', kwargs={'notification_id': department_broadcast.id})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_migration_collapses_per_user_rows(self):
+        from importlib import import_module
+        from django.apps import apps
+        from .models import BroadcastNotification, Notification
+
+        migration = import_module('user.migrations.0039_notifications_to_broadcasts')
+        for user, is_read in ((self.student, True), (self.outsider, False)):
+            Notification.objects.create(
+                user=user, notification_type='course_activated', title='New course available',
+                message='Broadcasts is available', related_course=self.course, is_read=is_read,
+            )
+        Notification.objects.create(user=self.student, notification_type='qcm_result', title='QCM', message='80%')
+
+        migration.collapse_notifications(apps, None)
+        broadcast = BroadcastNotification.objects.get()
+        self.assertEqual((broadcast.department, broadcast.excluded_user_id), ('F', self.creator.id))
+        self.assertEqual(list(broadcast.reads.values_list('user_id', flat=True)), [self.student.id])
+        self.assertEqual(list(Notification.objects.values_list('notification_type', flat=True)), ['qcm_result'])
+        self.assertEqual(self.listing(self.student)['unread_count'], 1)
+
+        migration.fan_out_broadcasts(apps, None)
+        fanned_out = Notification.objects.filter(notification_type='course_activated')
+        self.assertEqual(list(fanned_out.values_list('user_id', 'is_read')), [(self.student.id, True)])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationCounterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(username='counter_creator', password='pass', privilege='F', department='F')
+        cls.student = User.objects.create_user(username='counter_student', password='pass', department='F')
+        cls.outsider = User.objects.create_user(username='counter_outsider', password='pass', department='M')
+        cls.course = Course.objects.create(title_of_course='Counters', creator=cls.creator, department='F', status=1)
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def notify(self, user, title='QCM'):
+        from .models import Notification
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(user=user, notification_type='qcm_result', title=title, message='80%')
+
+    def broadcast(self):
+        from unittest import mock
+        from .models import BroadcastNotification
+        from .tasks import announce_broadcast_notification
+
+        with mock.patch(
+            'user.tasks.announce_broadcast_notification.delay', side_effect=announce_broadcast_notification
+        ), self.captureOnCommitCallbacks(execute=True):
+            return BroadcastNotification.objects.create(
+                notification_type='course_activated', title='New course', message='Counters', department='F',
+                related_course=self.course, excluded_user=self.creator,
+            )
+
+    def unread(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.get(reverse('notification-unread-count')).data['unread_count']
+
+    def test_counters_follow_creations_and_reads(self):
+        from django.core.cache import cache
+        from .notifications import UNREAD_COUNT_CACHE_KEY
+
+        self.notify(self.student)
+        # No counter yet: nothing to increment, the first read counts
+        self.assertIsNone(cache.get(UNREAD_COUNT_CACHE_KEY.format(user_id=self.student.id)))
+        self.assertEqual(self.unread(self.student), 1)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('notification-unread-count'))
+
+        notification = self.notify(self.student)
+        broadcast = self.broadcast()
+        self.assertEqual(self.unread(self.student), 3)
+        self.assertIsNone(cache.get(UNREAD_COUNT_CACHE_KEY.format(user_id=self.creator.id)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notification-mark-read', kwargs={'notification_id': notification.id}))
+            self.client.post(reverse('broadcast-notification-mark-read', kwargs={'notification_id': broadcast.id}))
+        self.assertEqual(self.unread(self.student), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notification-mark-all-read'))
+        self.assertEqual(cache.get(UNREAD_COUNT_CACHE_KEY.format(user_id=self.student.id)), 0)
+        self.assertEqual(self.unread(self.student), 0)
+
+    def test_broadcast_counters_are_updated_off_the_request(self):
+        from unittest import mock
+        from .models import BroadcastNotification
+
+        self.assertEqual(self.unread(self.student), 0)
+        with mock.patch('user.tasks.announce_broadcast_notification.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            broadcast = BroadcastNotification.objects.create(
+                notification_type='course_activated', title='New course', message='Counters', department='',
+                related_course=self.course, excluded_user=self.creator,
+            )
+        delay.assert_called_once_with(broadcast.pk)
+        # Incremented by the task
+        self.assertEqual(self.unread(self.student), 0)
+
+    def test_total_count_is_not_the_page_size(self):
+        from .models import Notification
+
+        Notification.objects.bulk_create(
+            Notification(user=self.student, notification_type='system', title=f'N{number}', message='Hello')
+            for number in range(52)
+        )
+        self.broadcast()
+        self.client.force_authenticate(user=self.student)
+        data = self.client.get(reverse('notification-list')).data
+        self.assertEqual(len(data['notifications']), 50)
+        self.assertEqual((data['total_count'], data['unread_count']), (53, 53))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationConsumerTests(APITransactionTestCase):
+    """Consumers close the connection they run on, which would end a TestCase transaction"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.creator = User.objects.create_user(username='push_creator', password='pass', privilege='F', department='F')
+        self.student = User.objects.create_user(username='push_student', password='pass', department='F')
+        # bulk_create: no post_save task queued on commit
+        self.course, = Course.objects.bulk_create([
+            Course(title_of_course='Pushes', creator=self.creator, department='F', status=1)
+        ])
+
+    def test_consumer_pushes_notifications_and_counts(self):
+        import json
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from channels.db import database_sync_to_async
+        from channels.testing import WebsocketCommunicator
+        from .consumers import NotificationConsumer
+        from .models import BroadcastNotification, Notification
+
+        async def receive(communicator):
+            return json.loads(await communicator.receive_from())
+
+        async def exchange():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = self.student
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertEqual(await receive(communicator), {'type': 'unread_count', 'unread_count': 0})
+
+            await database_sync_to_async(Notification.objects.create)(
+                user=self.student, notification_type='qcm_result', title='Pushed', message='80%'
+            )
+            message = await receive(communicator)
+            self.assertEqual((message['type'], message['notification']['title']), ('notification', 'Pushed'))
+            self.assertEqual(message['notification']['kind'], 'personal')
+            self.assertEqual(await receive(communicator), {'type': 'unread_count', 'unread_count': 1})
+
+            # Broadcasts of the department reach it, other departments' do not
+            await database_sync_to_async(BroadcastNotification.objects.create)(
+                notification_type='course_activated', title='New course', message='Counters', department='F',
+                related_course=self.course, excluded_user=self.creator,
+            )
+            message = await receive(communicator)
+            self.assertEqual(message['notification']['kind'], 'broadcast')
+            self.assertEqual(await receive(communicator), {'type': 'unread_count', 'unread_count': 2})
+
+            def mark_all_read():
+                self.client.force_authenticate(user=self.student)
+                self.client.post(reverse('notification-mark-all-read'))
+
+            await database_sync_to_async(mark_all_read)()
+            self.assertEqual(await receive(communicator), {'type': 'unread_count', 'unread_count': 0})
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+
+            anonymous = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            from django.contrib.auth.models import AnonymousUser
+            anonymous.scope['user'] = AnonymousUser()
+            connected, code = await anonymous.connect()
+            self.assertEqual((connected, code), (False, 4001))
+
+        from .tasks import announce_broadcast_notification
+        # The broadcast task runs in place of a Celery worker
+        with mock.patch(
+            'user.tasks.announce_broadcast_notification.delay', side_effect=announce_broadcast_notification
+        ):
+            async_to_sync(exchange)()
@@ -0,0 +1,328 @@
+# user/timetracking.py
+"""
+Storage of the tracked time: partitions, daily rollups and retention.
+
+TimeTracking gets one row per heartbeat. On PostgreSQL the table is
+partitioned by month of start_time (migration 0036): ensure_partitions()
+creates the partitions of the coming months, a DEFAULT partition catches
+the rest until the partition of their month exists.
+
+rollup_time_tracking() sums the rows of every complete day into
+TimeTrackingDaily, one row per (day, user, course, module, content, session
+type). The last TIME_TRACKING_ROLLUP_RECOMPUTE_DAYS days are rolled up again
+on every run to pick up late heartbeats. Days are UTC days (TIME_ZONE).
+
+With TIME_STATS_FROM_ROLLUPS, aggregate_time() reads the rolled-up days from
+TimeTrackingDaily and only the days since from TimeTracking; otherwise it
+aggregates TimeTracking directly.
+
+prune_time_tracking() drops the raw rows older than
+TIME_TRACKING_RETENTION_MONTHS months (whole partitions on PostgreSQL), only
+once they are rolled up and the stats read from the rollups.
+
+maintain_time_tracking() runs the three steps; the Celery beat job calls it
+nightly.
+"""
+import logging
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import TimeTracking, TimeTrackingDaily
+
+logger = logging.getLogger(__name__)
+
+TABLE = TimeTracking._meta.db_table
+
+# TimeTracking value -> TimeTrackingDaily value when aggregating
+RAW_AGGREGATES = {
+    'total_time': Sum('duration'),
+    'record_count': Count('id'),
+    'last_end_time': Max('end_time'),
+}
+ROLLUP_AGGREGATES = {
+    'total_time': Sum('total_duration'),
+    'record_count': Sum('record_count'),
+    'last_end_time': Max('last_end_time'),
+}
+
+
+def rollups_enabled():
+    return getattr(settings, 'TIME_STATS_FROM_ROLLUPS', False)
+
+
+def day_start(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return datetime(value.year + month // 12, month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+# ============================================================================
+# Reads
+# ============================================================================
+
+ROLLED_UP_UNTIL_KEY = 'timetracking:rolled_up_until'
+
+
+def rolled_up_until():
+    """
+    Last day of TimeTrackingDaily, None before the first rollup. Cached: a
+    stale value only moves reads of the latest days back to TimeTracking.
+    """
+    until = cache.get(ROLLED_UP_UNTIL_KEY, 0)
+    if until == 0:
+        until = TimeTrackingDaily.objects.aggregate(day=Max('day'))['day']
+        cache.set(ROLLED_UP_UNTIL_KEY, until, getattr(settings, 'TIME_TRACKING_ROLLUP_CACHE_SECONDS', 300))
+    return until
+
+
+def aggregate_time(group_by=(), **filters):
+    """
+    Tracked time grouped by group_by: a list of {**group values, 'total_time',
+    'record_count', 'last_end_time'}. group_by and filters use the field names
+    shared by TimeTracking and TimeTrackingDaily (user, course, module,
+    content and their relations, session_type) and 'day'.
+    """
+    group_by = list(group_by)
+    raw = TimeTracking.objects.annotate(day=TruncDate('start_time')).filter(**filters)
+    sources = [(raw, RAW_AGGREGATES)]
+
+    if rollups_enabled():
+        until = rolled_up_until()
+        if until is not None:
+            raw = raw.filter(start_time__gte=day_start(until + timedelta(days=1)))
+            rollups = TimeTrackingDaily.objects.filter(day__lte=until).filter(**filters)
+            sources = [(raw, RAW_AGGREGATES), (rollups, ROLLUP_AGGREGATES)]
+
+    merged = {}
+    for queryset, aggregates in sources:
+        if group_by:
+            rows = queryset.values(*group_by).annotate(**aggregates).order_by()
+        else:
+            rows = [queryset.aggregate(**aggregates)]
+        for row in rows:
+            key = tuple(row[field] for field in group_by)
+            current = merged.get(key)
+            if current is None:
+                merged[key] = {**row, 'total_time': row['total_time'] or 0, 'record_count': row['record_count'] or 0}
+                continue
+            current['total_time'] += row['total_time'] or 0
+            current['record_count'] += row['record_count'] or 0
+            if row['last_end_time'] and (not current['last_end_time'] or row['last_end_time'] > current['last_end_time']):
+                current['last_end_time'] = row['last_end_time']
+    return list(merged.values())
+
+
+def total_time(**filters):
+    """{'total_time', 'record_count', 'last_end_time'} of the time tracked matching filters"""
+    return aggregate_time(**filters)[0]
+
+
+# ============================================================================
+# Partitions (PostgreSQL)
+# ============================================================================
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partitions():
+    """{month start: partition table name} of the monthly partitions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = {}
+    for name in names:
+        suffix = name[len(TABLE) + 2:]
+        try:
+            months[datetime.strptime(suffix, '%Y_%m').replace(tzinfo=dt_timezone.utc)] = name
+        except ValueError:
+            continue  # The DEFAULT partition
+    return months
+
+
+def ensure_partitions(ahead=None):
+    """
+    Create the partitions of this month and of the next `ahead` months;
+    returns the new ones. Rows of such a month that landed in the DEFAULT
+    partition meanwhile are moved to the new partition.
+    """
+    if not is_partitioned():
+        return []
+    if ahead is None:
+        ahead = getattr(settings, 'TIME_TRACKING_PARTITIONS_AHEAD', 3)
+
+    existing = partitions()
+    created = []
+    current = month_start(timezone.now())
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        name = f'{TABLE}_p{month:%Y_%m}'
+        try:
+            moved = create_partition(name, month, add_months(month, 1))
+        except Exception as e:
+            logger.error(f"Could not create partition {name}: {str(e)}")
+            continue
+        if moved:
+            logger.info(f"Moved {moved} time tracking rows from the DEFAULT partition to {name}")
+        created.append(name)
+    return created
+
+
+def create_partition(name, start, end):
+    """
+    Create the partition name of [start, end). PostgreSQL refuses it while
+    the DEFAULT partition holds rows of that range: DEFAULT is then detached,
+    its rows of the range moved to the new partition and DEFAULT attached
+    again, in one transaction (writes to the table wait meanwhile). Returns
+    the number of rows moved.
+    """
+    default = f'{TABLE}_default'
+    bounds = [start, end]
+    in_range = 'start_time >= %s AND start_time < %s'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})', bounds)
+        misplaced = cursor.fetchone()[0]
+        if misplaced:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {default}')
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        if not misplaced:
+            return 0
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {default} WHERE {in_range}', bounds)
+        cursor.execute(f'DELETE FROM {default} WHERE {in_range}', bounds)
+        moved = cursor.rowcount
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {default} DEFAULT')
+    return moved
+
+
+# ============================================================================
+# Rollups
+# ============================================================================
+
+def rollup_days(first, last):
+    """Replace the rollups of the days first..last (inclusive) with sums of TimeTracking; returns the rows written"""
+    rows = (
+        TimeTracking.objects
+        .filter(start_time__gte=day_start(first), start_time__lt=day_start(last + timedelta(days=1)))
+        .annotate(day=TruncDate('start_time'))
+        .values('day', 'user_id', 'course_id', 'module_id', 'content_id', 'session_type')
+        .annotate(total_duration=Sum('duration'), record_count=Count('id'), last_end_time=Max('end_time'))
+        .order_by()
+    )
+    with transaction.atomic():
+        TimeTrackingDaily.objects.filter(day__gte=first, day__lte=last).delete()
+        created = TimeTrackingDaily.objects.bulk_create(
+            (TimeTrackingDaily(**row) for row in rows.iterator()), batch_size=2000,
+        )
+    cache.delete(ROLLED_UP_UNTIL_KEY)
+    return len(created)
+
+
+def rollup_time_tracking(today=None):
+    """
+    Roll up every complete day not rolled up yet, and again the last
+    TIME_TRACKING_ROLLUP_RECOMPUTE_DAYS days. Returns (first day, last day,
+    rows written), or None when there is nothing to roll up.
+    """
+    last = (today or timezone.now().date()) - timedelta(days=1)
+    until = rolled_up_until()
+    if until is not None:
+        first = until - timedelta(days=getattr(settings, 'TIME_TRACKING_ROLLUP_RECOMPUTE_DAYS', 2) - 1)
+    else:
+        oldest = TimeTracking.objects.order_by('start_time').values_list('start_time', flat=True).first()
+        if oldest is None:
+            return None
+        first = oldest.astimezone(dt_timezone.utc).date()
+    if first > last:
+        return None
+
+    # One transaction per chunk of days bounds the locks and memory of a backfill
+    written, start = 0, first
+    chunk = timedelta(days=getattr(settings, 'TIME_TRACKING_ROLLUP_CHUNK_DAYS', 31))
+    while start <= last:
+        end = min(start + chunk - timedelta(days=1), last)
+        written += rollup_days(start, end)
+        start = end + timedelta(days=1)
+    logger.info(f"Rolled up time tracking from {first} to {last}: {written} rows")
+    return first, last, written
+
+
+# ============================================================================
+# Retention
+# ============================================================================
+
+def retention_cutoff(today=None):
+    """
+    Start of the oldest month of raw rows to keep: TIME_TRACKING_RETENTION_MONTHS
+    back, and never past the rolled-up days. None when nothing may be dropped.
+    """
+    months = getattr(settings, 'TIME_TRACKING_RETENTION_MONTHS', 0)
+    until = rolled_up_until()
+    if not months or until is None:
+        return None
+    cutoff = add_months(month_start(today or timezone.now()), -months)
+    return min(cutoff, month_start(day_start(until + timedelta(days=1))))
+
+
+def prune_time_tracking(today=None):
+    """Drop the raw rows before retention_cutoff(); returns (dropped partitions, deleted rows)"""
+    if not rollups_enabled():
+        if getattr(settings, 'TIME_TRACKING_RETENTION_MONTHS', 0):
+            logger.warning("Time tracking retention skipped: the stats do not read from the rollups")
+        return [], 0
+    cutoff = retention_cutoff(today)
+    if cutoff is None:
+        return [], 0
+
+    dropped = []
+    if is_partitioned():
+        for month, name in sorted(partitions().items()):
+            if add_months(month, 1) <= cutoff:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP TABLE {name}')
+                dropped.append(name)
+
+    # Rows outside of the dropped partitions (the DEFAULT one, or an unpartitioned table)
+    deleted, _ = TimeTracking.objects.filter(start_time__lt=cutoff).delete()
+    if dropped or deleted:
+        logger.info(f"Time tracking retention before {cutoff:%Y-%m-%d}: dropped {dropped}, deleted {deleted} rows")
+    return dropped, deleted
+
+
+def maintain_time_tracking():
+    partitions_created = ensure_partitions()
+    rollup = rollup_time_tracking()
+    dropped, deleted = prune_time_tracking()
+    return {
+        'partitions_created': partitions_created,
+        'rolled_up': rollup and {'first': str(rollup[0]), 'last': str(rollup[1]), 'rows': rollup[2]},
+        'partitions_dropped': dropped,
+        'rows_deleted': deleted,
+    }
@@ -24,7 +24,7 @@ from .views import (
     # Time Tracking Views
     CourseTimeStatsView, TimeTrackingRecordView, FavoriteCourseViewSet, UserStatusUpdateView
 )
-from .views import NotificationListView, NotificationMarkAsReadView, NotificationMarkAllAsReadView, NotificationUnreadCountView
+from .views import NotificationListView, NotificationMarkAsReadView, NotificationMarkAllAsReadView, NotificationUnreadCountView, BroadcastNotificationMarkAsReadView
 # Create router for CourseViewSet
 router = DefaultRouter()
 router.register(r'courses/(?P<pk>\d+)/subscribers', CourseSubscribersListViewSet, basename='course-subscribers')
@@ -54,6 +54,7 @@ path('admin/users/<int:user_id>/update-status/', UserStatusUpdateView.as_view(),
     # Course endpoints
     path('notifications/', NotificationListView.as_view(), name='notification-list'),
     path('notifications/<int:notification_id>/mark-read/', NotificationMarkAsReadView.as_view(), name='notification-mark-read'),
+    path('notifications/broadcast/<int:notification_id>/mark-read/', BroadcastNotificationMarkAsReadView.as_view(), name='broadcast-notification-mark-read'),
     path('notifications/mark-all-read/', NotificationMarkAllAsReadView.as_view(), name='notification-mark-all-read'),
     path('notifications/unread-count/', NotificationUnreadCountView.as_view(), name='notification-unread-count'),
     path('courses/', views.CourseList.as_view(), name='course-list'),
@@ -83,6 +84,8 @@ path('admin/users/<int:user_id>/update-status/', UserStatusUpdateView.as_view(),
     path('courses/<int:course_id>/modules/<int:module_id>/contents/pdf/', views.CreatePDFContentView.as_view(), name='create-pdf-content'),
     path('courses/<int:course_id>/modules/<int:module_id>/contents/video/', views.CreateVideoContentView.as_view(), name='create-video-content'),
     path('courses/<int:course_id>/modules/<int:module_id>/contents/qcm/', views.CreateQCMContentView.as_view(), name='create-qcm-content'),
+    path('courses/<int:course_id>/modules/<int:module_id>/contents/<str:kind>/upload-url/', views.DirectUploadURLView.as_view(), name='direct-upload-url'),
+    path('courses/<int:course_id>/modules/<int:module_id>/contents/<str:kind>/upload-complete/', views.DirectUploadCompleteView.as_view(), name='direct-upload-complete'),
     path('courses/<int:course_id>/modules/<int:module_id>/update-status/', 
          views.ModuleStatusUpdateView.as_view(), name='module-update-status'),
     
@@ -99,6 +102,17 @@ path('admin/users/<int:user_id>/update-status/', UserStatusUpdateView.as_view(),
     
     # Recommended courses
     path('courses/recommended/', RecommendedCoursesView.as_view(), name='recommended-courses'),    
+    path('courses/<int:pk>/similar/', views.SimilarCoursesView.as_view(), name='similar-courses'),
+
+    # Home feed (subscriptions, recommendations, favorites, notifications)
+    path('home/', views.HomeFeedView.as_view(), name='home-feed'),
+
+    # Async variants of read-heavy endpoints (ASGI)
+    path('async/courses/<int:pk>/', views.AsyncCourseDetail.as_view(), name='async-course-detail'),
+    path('async/courses/<int:pk>/is-subscribed/', views.AsyncCheckSubscription.as_view(), name='async-is-subscribed'),
+    path('async/courses/my-subscriptions/', views.AsyncMySubscriptions.as_view(), name='async-my-subscriptions'),
+    path('async/notifications/', views.AsyncNotificationListView.as_view(), name='async-notification-list'),
+    path('async/admin/dashboard/', views.AsyncAdminDashboardView.as_view(), name='async-admin-dashboard'),
     
     # Subscription management
     path('courses/mysubscriptions/', views.MySubscriptions.as_view(), name='course-subscribers'),
@@ -150,5 +164,6 @@ path('courses/<int:pk>/stats-debug/', CourseStatsDebugView.as_view(), name='cour
 
     # Global search - FIXED (was pointing to FavoriteCourseViewSet instead of GlobalSearchView)
     path('api/search/', views.GlobalSearchView.as_view(), name='global-search'),
+    path('api/search/suggest/', views.SearchSuggestView.as_view(), name='search-suggest'),
     path('', include(router.urls))
 ]
@@ -80,7 +80,28 @@ class HealthCheckView(APIView):
             health_status['database'] = f'error: {str(e)}'
             health_status['status'] = 'degraded'
         
-        return Response(health_status, status=status.HTTP_200_OK)
+        http_status = status.HTTP_200_OK if health_status['status'] == 'healthy' else status.HTTP_503_SERVICE_UNAVAILABLE
+        return Response(health_status, status=http_status)
+
+class LivenessView(APIView):
+    """The process answers requests; does no I/O"""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response({'status': 'alive', 'timestamp': str(timezone.now())})
+
+class ReadinessView(APIView):
+    """Dependencies reachable: 200 when every check passes, 503 otherwise"""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        from .health import get_readiness
+
+        readiness, cached = get_readiness()
+        http_status = status.HTTP_200_OK if readiness['status'] == 'ready' else status.HTTP_503_SERVICE_UNAVAILABLE
+        return Response({**readiness, 'cached': cached}, status=http_status)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -492,6 +513,21 @@ class CourseManagementView(APIView):
             print(f"Error getting enrollment stats: {e}")
             return {'labels': [], 'data': []}
 
+def serialize_authenticated_user(user):
+    """User payload returned to the frontend once authenticated"""
+    return {
+        "user_id": user.id,
+        "username": user.username,
+        "firstname": user.first_name,
+        "lastName": user.last_name,
+        "email": user.email,
+        "privilege": user.privilege,
+        "department": user.department,
+        "department_display": user.get_department_display(),
+        "status": user.status,
+        "status_display": "Actif" if user.status == 1 else "Suspendu"
+    }
+
 class CheckAuthentificationView(APIView):
     def get(self, request):
         try:
@@ -518,22 +554,9 @@ class CheckAuthentificationView(APIView):
                     'message': 'Votre compte est suspendu'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            user = {
-                "user_id": payload.get('user_id'),
-                "username": UserById_.username,
-                "firstname": UserById_.first_name,
-                "lastName": UserById_.last_name,
-                "email": UserById_.email,
-                "privilege": UserById_.privilege,
-                "department": UserById_.department,
-                "department_display": UserById_.get_department_display(),
-                "status": UserById_.status,
-                "status_display": "Actif" if UserById_.status == 1 else "Suspendu"
-            }
-            
             return Response({
                 'authenticated': True, 
-                'user': user
+                'user': serialize_authenticated_user(UserById_)
             }, status=status.HTTP_200_OK)
 
         except jwt.ExpiredSignatureError:
@@ -1175,53 +1198,58 @@ class IsSuperUser(IsAuthenticated):
     def has_permission(self, request, view):
         return super().has_permission(request, view) and request.user.privilege == 'A'
 
+def get_recommended_courses(user, subscribed_course_ids=None):
+    """
+    Courses recommended to a user, excluding the ones already subscribed.
+    Reads the recommendations precomputed by the nightly job and falls back
+    to the most popular courses of the user's department.
+    """
+    from .models import UserRecommendation
+
+    if subscribed_course_ids is None:
+        subscribed_course_ids = Subscription.objects.filter(
+            user=user,
+            is_active=True
+        ).values_list('course_id', flat=True)
+
+    limit = getattr(settings, 'RECOMMENDATIONS_TOP_K', 20)
+
+    # Base query - seulement les cours actifs pour les apprenants
+    allowed_status = [1]
+    if user.privilege in ['F', 'A']:
+        # Les formateurs et admin voient aussi les brouillons
+        allowed_status = [0, 1]
+
+    recommendations = UserRecommendation.objects.filter(
+        user=user,
+        course__status__in=allowed_status
+    ).exclude(
+        course_id__in=subscribed_course_ids
+    ).select_related('course', 'course__creator').order_by('rank')[:limit]
+    courses = [recommendation.course for recommendation in recommendations]
+    if courses:
+        return courses
+
+    popular_courses = Course.objects.filter(status__in=allowed_status).exclude(
+        id__in=subscribed_course_ids
+    ).select_related('creator').annotate(
+        active_subscribers=Count('course_subscriptions', filter=Q(course_subscriptions__is_active=True))
+    ).order_by('-active_subscribers', '-created_at')
+
+    if user.department:
+        department_courses = list(popular_courses.filter(creator__department=user.department)[:limit])
+        if department_courses:
+            return department_courses
+
+    return list(popular_courses[:limit])
+
 class RecommendedCoursesView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         """Get recommended courses based on user's department, excluding subscribed courses"""
         try:
-            user_department = request.user.department
-            print(f"DEBUG - User: {request.user.username}, Department: {user_department}")
-            
-            # Get user's subscribed course IDs first
-            subscribed_course_ids = Subscription.objects.filter(
-                user=request.user,
-                is_active=True
-            ).values_list('course_id', flat=True)
-            print(f"DEBUG - Subscribed course IDs: {list(subscribed_course_ids)}")
-            
-            # Base query - seulement les cours actifs pour les apprenants
-            base_query = Q(status=1)  # Seulement cours actifs
-            
-            if request.user.privilege in ['F', 'A']:
-                # Les formateurs et admin voient aussi les brouillons
-                base_query = Q(status__in=[0, 1])
-            
-            print(f"DEBUG - Base query status: {[0, 1] if request.user.privilege in ['F', 'A'] else [1]}")
-            
-            if not user_department:
-                print("DEBUG - No user department, fetching all courses")
-                courses = Course.objects.filter(base_query).exclude(
-                    id__in=subscribed_course_ids
-                ).order_by('-created_at')[:20]
-            else:
-                print(f"DEBUG - Looking for courses in department: {user_department}")
-                # Check department courses
-                department_courses = Course.objects.filter(
-                    base_query & Q(creator__department=user_department)
-                ).exclude(id__in=subscribed_course_ids)
-                print(f"DEBUG - Department courses found: {department_courses.count()}")
-                
-                courses = department_courses.order_by('-created_at')
-                
-                if not courses.exists():
-                    print("DEBUG - No department courses, falling back to all courses")
-                    courses = Course.objects.filter(base_query).exclude(
-                        id__in=subscribed_course_ids
-                    ).order_by('-created_at')[:20]
-            
-            print(f"DEBUG - Final courses count: {courses.count()}")
+            courses = get_recommended_courses(request.user)
             
             serializer = CourseSerializer(courses, many=True, context={'request': request})
             
@@ -1231,11 +1259,37 @@ class RecommendedCoursesView(APIView):
             return Response(serializer.data, status=status.HTTP_200_OK)
             
         except Exception as e:
-            print(f"DEBUG - Error: {str(e)}")
+            logger.error(f"Error fetching recommended courses: {str(e)}")
             return Response(
                 {'error': f'Failed to fetch recommended courses: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class SimilarCoursesView(APIView):
+    """
+    Courses with the closest content, read from the precomputed TF-IDF index.
+    Served without authentication or database access: the index only holds
+    public cards of active courses.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        from .similarity import get_index
+
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        index = get_index()
+        results = index.similar(pk, limit) if index is not None else []
+        for course in results:
+            if course['image_url']:
+                course['image_url'] = request.build_absolute_uri(course['image_url'])
+
+        return Response({'course_id': pk, 'results': results}, status=status.HTTP_200_OK)
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -1245,9 +1299,10 @@ from django.db.models import Count, Avg, Max, Min, Sum, Q
 from django.db.models.functions import TruncWeek, TruncMonth, TruncDate
 from datetime import timedelta
 import os
+from .dbrouting import ReplicaReadMixin
 
 # Fix the SystemAnalyticsView class
-class SystemAnalyticsView(APIView):
+class SystemAnalyticsView(ReplicaReadMixin, APIView):
     permission_classes = [IsSuperUser]
     
     def get(self, request):
@@ -1546,173 +1601,8 @@ class UserDetailView(APIView):
         
         return Response({'user': user_data})
 
-# Fix the SystemHealthView class
-class SystemHealthView(APIView):
-    permission_classes = [IsSuperUser]
-    
-    def get(self, request):
-        # System performance metrics
-        system_metrics = {
-            'database_size': self.get_database_size(),
-            'active_sessions': self.get_active_sessions(),
-            'server_uptime': self.get_server_uptime(),
-            'error_rate': self.get_error_rate(),
-            'database_vendor': self.get_database_vendor(),
-            'memory_usage': self.get_memory_usage(),
-            'cpu_usage': self.get_cpu_usage(),
-            'disk_usage': self.get_disk_usage()
-        }
-        
-        return Response({
-            'system_metrics': system_metrics,
-            'performance_stats': self.get_performance_stats(),
-            'timestamp': timezone.now().isoformat()
-        })
-    
-    def get_server_uptime(self):
-        """Get server uptime - works in Docker containers"""
-        try:
-            # Import inside the method
-            import datetime
-            # Method 1: Read from /proc/uptime (Linux/Docker)
-            with open('/proc/uptime', 'r') as f:
-                uptime_seconds = float(f.readline().split()[0])
-                days = int(uptime_seconds // 86400)
-                hours = int((uptime_seconds % 86400) // 3600)
-                minutes = int((uptime_seconds % 3600) // 60)
-                return f"{days} days, {hours} hours, {minutes} minutes"
-                
-        except (FileNotFoundError, PermissionError):
-            try:
-                # Method 2: Use psutil as fallback - import inside method
-                import psutil
-                import datetime
-                boot_time = datetime.datetime.fromtimestamp(psutil.boot_time())
-                uptime = datetime.datetime.now() - boot_time
-                days = uptime.days
-                hours = uptime.seconds // 3600
-                minutes = (uptime.seconds % 3600) // 60
-                return f"{days} days, {hours} hours, {minutes} minutes"
-                
-            except Exception:
-                return "Uptime unavailable"
-        except Exception as e:
-            return f"Uptime error: {str(e)}"
-    
-    def get_error_rate(self):
-        """Get error rate - placeholder for actual implementation"""
-        try:
-            # This would ideally come from your monitoring system
-            from django.core.cache import cache
-            
-            # Get from cache or use default
-            error_count = cache.get('system_error_count', 15)
-            total_requests = cache.get('system_total_requests', 5000)
-            
-            if total_requests > 0:
-                error_rate = (error_count / total_requests) * 100
-                return f"{error_rate:.2f}%"
-            
-            return "0.30%"  # Default fallback
-            
-        except Exception as e:
-            return "Error rate unavailable"
-    
-    def get_memory_usage(self):
-        """Get memory usage of the container"""
-        try:
-            # Import inside the method
-            import psutil
-            memory = psutil.virtual_memory()
-            return {
-                'total': f"{memory.total // (1024**2)} MB",
-                'available': f"{memory.available // (1024**2)} MB",
-                'used': f"{memory.used // (1024**2)} MB",
-                'percent': f"{memory.percent}%"
-            }
-        except Exception:
-            return "Memory usage unavailable"
-    
-    def get_cpu_usage(self):
-        """Get CPU usage"""
-        try:
-            # Import inside the method
-            import psutil
-            cpu_percent = psutil.cpu_percent(interval=1)
-            return f"{cpu_percent}%"
-        except Exception:
-            return "CPU usage unavailable"
-    
-    def get_disk_usage(self):
-        """Get disk usage"""
-        try:
-            # Import inside the method
-            import psutil
-            disk = psutil.disk_usage('/')
-            return {
-                'total': f"{disk.total // (1024**3)} GB",
-                'used': f"{disk.used // (1024**3)} GB",
-                'free': f"{disk.free // (1024**3)} GB",
-                'percent': f"{disk.percent}%"
-            }
-        except Exception:
-            return "Disk usage unavailable"
-    
-    def get_performance_stats(self):
-        """Get performance statistics - placeholder for real monitoring"""
-        try:
-            # This would come from your APM tool
-            stats = {
-                'labels': ['Auth', 'Courses', 'Content', 'QCM', 'Database', 'Cache'],
-                'data': [95, 210, 165, 280, 75, 40],
-                'request_counts': [1200, 650, 950, 450, 0, 0],
-                'error_rates': [0.8, 1.5, 1.2, 2.5, 0.2, 0.4]
-            }
-            return stats
-            
-        except Exception as e:
-            return {
-                'labels': ['Auth', 'Courses', 'Content', 'QCM'],
-                'data': [120, 250, 180, 300],
-                'request_counts': [0, 0, 0, 0],
-                'error_rates': [0, 0, 0, 0]
-            }
-    
-    def get_database_size(self):
-        """Get database size"""
-        from django.db import connection
-        try:
-            with connection.cursor() as cursor:
-                vendor = connection.vendor
-                
-                if vendor == 'postgresql':
-                    cursor.execute("SELECT pg_size_pretty(pg_database_size(current_database()))")
-                elif vendor == 'mysql':
-                    cursor.execute("SELECT ROUND(SUM(data_length + index_length) / 1024 / 1024, 2) FROM information_schema.tables WHERE table_schema = DATABASE()")
-                elif vendor == 'sqlite':
-                    import os
-                    from django.conf import settings
-                    db_path = settings.DATABASES['default']['NAME']
-                    size_bytes = os.path.getsize(db_path)
-                    return f"{round(size_bytes / (1024 * 1024), 2)} MB"
-                else:
-                    return "Unknown database type"
-                
-                row = cursor.fetchone()
-                return row[0] if row else "Unknown"
-        except Exception as e:
-            return f"Error: {str(e)}"
-    
-    def get_database_vendor(self):
-        from django.db import connection
-        return connection.vendor
-    
-    def get_active_sessions(self):
-        from django.contrib.sessions.models import Session
-        return Session.objects.count()
-
 # Fix the AdminDashboardView class
-class AdminDashboardView(APIView):
+class AdminDashboardView(ReplicaReadMixin, APIView):
     permission_classes = [IsSuperUser]
     
     def get(self, request):
@@ -2128,7 +2018,7 @@ class IsSuperUser(IsAuthenticated):
         return bool(request.user and request.user.is_authenticated and request.user.is_superuser)
 
 # Add the missing view classes that were referenced but not defined
-class ContentManagementView(APIView):
+class ContentManagementView(ReplicaReadMixin, APIView):
     permission_classes = [IsSuperUser]
     
     def get(self, request):
@@ -2285,26 +2175,56 @@ class UserDetailView(APIView):
         return Response({'user': user_data})
 
 class SystemHealthView(APIView):
+    """
+    System health for the admin dashboard, read from the samples collected in
+    the background (see user/health.py) so the request never blocks.
+    """
     permission_classes = [IsSuperUser]
     
     def get(self, request):
-        # System performance metrics
+        from .health import get_health_samples
+
+        samples = get_health_samples()
+        latest = samples[-1]
+
         system_metrics = {
-            'database_size': self.get_database_size(),
-            'active_sessions': self.get_active_sessions(),
+            'database_size': self.format_size(latest['database_size'], 'MB'),
+            'active_sessions': latest['active_sessions'],
             'server_uptime': self.get_server_uptime(),
             'error_rate': self.get_error_rate(),
-            'database_vendor': self.get_database_vendor(),
-            'memory_usage': self.get_memory_usage(),
-            'cpu_usage': self.get_cpu_usage(),
-            'disk_usage': self.get_disk_usage()
+            'database_vendor': connection.vendor,
+            'memory_usage': self.format_usage(latest['memory'], 'MB', 'Memory usage unavailable'),
+            'cpu_usage': f"{latest['cpu_percent']}%" if latest['cpu_percent'] is not None else "CPU usage unavailable",
+            'disk_usage': self.format_usage(latest['disk'], 'GB', 'Disk usage unavailable'),
+            'redis': latest['redis'],
+            'celery_queues': latest['celery_queues'],
+            'db_pool': latest.get('db_pool'),
         }
         
         return Response({
             'system_metrics': system_metrics,
             'performance_stats': self.get_performance_stats(),
+            'sampled_at': latest['timestamp'],
+            'history': samples,
             'timestamp': timezone.now().isoformat()
         })
+
+    @staticmethod
+    def format_size(value, unit):
+        if value is None:
+            return "Unknown"
+        divisor = 1024 ** 2 if unit == 'MB' else 1024 ** 3
+        return f"{round(value / divisor, 2)} {unit}"
+
+    @staticmethod
+    def format_usage(usage, unit, unavailable):
+        if not usage:
+            return unavailable
+        divisor = 1024 ** 2 if unit == 'MB' else 1024 ** 3
+        return {
+            **{key: f"{value // divisor} {unit}" for key, value in usage.items() if key != 'percent'},
+            'percent': f"{usage['percent']}%",
+        }
     
     def get_server_uptime(self):
         """Get server uptime - works in Docker containers"""
@@ -2337,116 +2257,21 @@ class SystemHealthView(APIView):
             return f"Uptime error: {str(e)}"
     
     def get_error_rate(self):
-        """Get error rate - placeholder for actual implementation"""
+        """Share of 5xx responses recorded by the metrics middleware"""
         try:
-            # This would ideally come from your monitoring system
-            from django.core.cache import cache
-            
-            # Get from cache or use default
-            error_count = cache.get('system_error_count', 15)
-            total_requests = cache.get('system_total_requests', 5000)
-            
-            if total_requests > 0:
-                error_rate = (error_count / total_requests) * 100
-                return f"{error_rate:.2f}%"
-            
-            return "0.30%"  # Default fallback
-            
+            from .metrics import error_rate
+            return f"{error_rate():.2f}%"
         except Exception as e:
             return "Error rate unavailable"
     
-    def get_memory_usage(self):
-        """Get memory usage of the container"""
-        try:
-            # Import inside the method
-            import psutil
-            memory = psutil.virtual_memory()
-            return {
-                'total': f"{memory.total // (1024**2)} MB",
-                'available': f"{memory.available // (1024**2)} MB",
-                'used': f"{memory.used // (1024**2)} MB",
-                'percent': f"{memory.percent}%"
-            }
-        except Exception:
-            return "Memory usage unavailable"
-    
-    def get_cpu_usage(self):
-        """Get CPU usage"""
-        try:
-            # Import inside the method
-            import psutil
-            cpu_percent = psutil.cpu_percent(interval=1)
-            return f"{cpu_percent}%"
-        except Exception:
-            return "CPU usage unavailable"
-    
-    def get_disk_usage(self):
-        """Get disk usage"""
-        try:
-            # Import inside the method
-            import psutil
-            disk = psutil.disk_usage('/')
-            return {
-                'total': f"{disk.total // (1024**3)} GB",
-                'used': f"{disk.used // (1024**3)} GB",
-                'free': f"{disk.free // (1024**3)} GB",
-                'percent': f"{disk.percent}%"
-            }
-        except Exception:
-            return "Disk usage unavailable"
-    
     def get_performance_stats(self):
-        """Get performance statistics - placeholder for real monitoring"""
+        """Latency, request count and error rate of the busiest routes"""
         try:
-            # This would come from your APM tool
-            stats = {
-                'labels': ['Auth', 'Courses', 'Content', 'QCM', 'Database', 'Cache'],
-                'data': [95, 210, 165, 280, 75, 40],
-                'request_counts': [1200, 650, 950, 450, 0, 0],
-                'error_rates': [0.8, 1.5, 1.2, 2.5, 0.2, 0.4]
-            }
-            return stats
-            
+            from .metrics import route_performance_stats
+            return route_performance_stats()
         except Exception as e:
-            return {
-                'labels': ['Auth', 'Courses', 'Content', 'QCM'],
-                'data': [120, 250, 180, 300],
-                'request_counts': [0, 0, 0, 0],
-                'error_rates': [0, 0, 0, 0]
-            }
-    
-    def get_database_size(self):
-        """Get database size"""
-        from django.db import connection
-        try:
-            with connection.cursor() as cursor:
-                vendor = connection.vendor
-                
-                if vendor == 'postgresql':
-                    cursor.execute("SELECT pg_size_pretty(pg_database_size(current_database()))")
-                elif vendor == 'mysql':
-                    cursor.execute("SELECT ROUND(SUM(data_length + index_length) / 1024 / 1024, 2) FROM information_schema.tables WHERE table_schema = DATABASE()")
-                elif vendor == 'sqlite':
-                    import os
-                    from django.conf import settings
-                    db_path = settings.DATABASES['default']['NAME']
-                    size_bytes = os.path.getsize(db_path)
-                    return f"{round(size_bytes / (1024 * 1024), 2)} MB"
-                else:
-                    return "Unknown database type"
-                
-                row = cursor.fetchone()
-                return row[0] if row else "Unknown"
-        except Exception as e:
-            return f"Error: {str(e)}"
-    
-    def get_database_vendor(self):
-        from django.db import connection
-        return connection.vendor
-    
-    def get_active_sessions(self):
-        from django.contrib.sessions.models import Session
-        return Session.objects.count()
+            logger.error(f"Performance stats unavailable: {str(e)}")
+            return {'labels': [], 'data': [], 'p95': [], 'request_counts': [], 'error_rates': []}
 
 class ModuleStatusUpdateView(APIView):
     permission_classes = [IsAuthenticated]
@@ -2898,6 +2723,112 @@ class CreateVideoContentView(APIView):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+from uuid import uuid4
+from django.core import signing
+from .serializers import DirectUploadCompleteSerializer, DIRECT_UPLOAD_SALT
+from .storage import course_media_storage
+
+# kind -> (model, file field, accepted Content-Type prefix)
+DIRECT_UPLOAD_KINDS = {
+    'pdf': (PDFContent, 'pdf_file', 'application/pdf'),
+    'video': (VideoContent, 'video_file', 'video/'),
+}
+
+def get_direct_upload_target(request, course_id, module_id, kind):
+    """Return (module, storage) for a direct upload, or an error Response"""
+    if kind not in DIRECT_UPLOAD_KINDS:
+        return None, Response({'error': f'Unsupported content kind: {kind}'}, status=status.HTTP_404_NOT_FOUND)
+
+    module = get_object_or_404(Module.objects.select_related('course'), pk=module_id, course_id=course_id)
+    if module.course.creator != request.user and request.user.privilege != 'A':
+        return None, Response(
+            {'error': 'You are not the creator of this course'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    storage = course_media_storage()
+    if not hasattr(storage, 'presigned_upload'):
+        return None, Response(
+            {'error': 'Direct uploads are only available with MEDIA_STORAGE=s3'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return (module, storage), None
+
+class DirectUploadURLView(APIView):
+    """Issue a presigned POST so the client uploads a PDF/video straight to the object store"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, course_id, module_id, kind):
+        target, error = get_direct_upload_target(request, course_id, module_id, kind)
+        if error:
+            return error
+        module, storage = target
+
+        filename = os.path.basename(request.data.get('filename', '')).strip()
+        if not filename:
+            return Response({'error': 'filename is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        model, field_name, content_type_prefix = DIRECT_UPLOAD_KINDS[kind]
+        max_size = settings.DIRECT_UPLOAD_MAX_SIZE[kind]
+        try:
+            size = int(request.data.get('size', 0))
+        except (TypeError, ValueError):
+            size = 0
+        if size > max_size:
+            return Response(
+                {'error': f'File too large (max {max_size} bytes)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Same layout as regular uploads (upload_to), made unique per upload
+        key = model._meta.get_field(field_name).generate_filename(None, f"{uuid4().hex}_{filename}")
+        upload = storage.presigned_upload(key, content_type_prefix, max_size)
+        upload_token = signing.dumps(
+            {'key': key, 'module_id': module.id, 'kind': kind}, salt=DIRECT_UPLOAD_SALT
+        )
+
+        return Response({
+            'upload': upload,
+            'key': key,
+            'upload_token': upload_token,
+            'max_size': max_size,
+            'expires_in': settings.DIRECT_UPLOAD_EXPIRE,
+        }, status=status.HTTP_200_OK)
+
+class DirectUploadCompleteView(APIView):
+    """Create the content once the client has uploaded the file to the object store"""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser]
+
+    def post(self, request, course_id, module_id, kind):
+        target, error = get_direct_upload_target(request, course_id, module_id, kind)
+        if error:
+            return error
+        module, storage = target
+
+        model, field_name, _ = DIRECT_UPLOAD_KINDS[kind]
+        content_type, created = ContentType.objects.get_or_create(name=kind)
+
+        serializer = DirectUploadCompleteSerializer(
+            data=request.data,
+            context={
+                'request': request,
+                'module': module,
+                'kind': kind,
+                'storage': storage,
+                'model': model,
+                'field_name': field_name,
+                'content_type': content_type,
+            }
+        )
+        if serializer.is_valid():
+            content = serializer.save()
+            return Response(
+                CourseContentSerializer(content, context={'request': request}).data,
+                status=status.HTTP_201_CREATED
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 class CreateQCMContentView(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = [JSONParser]
@@ -3220,85 +3151,139 @@ class CheckSubscription(APIView):
         }
 # In your Django views.py, update the MySubscriptions view:
 
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Subquery, Func, IntegerField
+from .media_processing import image_variant_fields
+from django.db.models.functions import Coalesce
+
+MY_SUBSCRIPTIONS_CACHE_KEY = 'my_subscriptions:{user_id}'
+
+
+def subquery_aggregate(queryset, field='id', function='COUNT'):
+    """Correlated scalar subquery (COUNT/SUM) defaulting to 0"""
+    return Coalesce(
+        Subquery(
+            queryset.order_by().annotate(
+                _aggregate=Func(F(field), function=function, output_field=IntegerField())
+            ).values('_aggregate')[:1],
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def get_subscription_feed_queryset(user):
+    """
+    Active subscriptions of a user annotated with everything the dashboard
+    feed needs, so the whole payload is fetched in a single query.
+    """
+    active_contents = CourseContent.objects.filter(
+        module__course=OuterRef('course_id'),
+        module__status=1,
+        status=1
+    )
+    completed_contents = Subscription.completed_contents.through.objects.filter(
+        subscription_id=OuterRef('pk'),
+        coursecontent__module__course=OuterRef('course_id'),
+        coursecontent__module__status=1,
+        coursecontent__status=1
+    )
+
+    return Subscription.objects.filter(
+        user=user,
+        is_active=True
+    ).select_related('course', 'course__creator').annotate(
+        feed_total_contents=subquery_aggregate(active_contents),
+        feed_completed_contents=subquery_aggregate(completed_contents),
+        feed_is_favorited=Exists(
+            FavoriteCourse.objects.filter(user=user, course=OuterRef('course_id'))
+        ),
+        feed_module_count=subquery_aggregate(
+            Module.objects.filter(course=OuterRef('course_id'), status=1)
+        ),
+        feed_time_required_minutes=subquery_aggregate(
+            active_contents, field='estimated_duration', function='SUM'
+        ),
+        feed_subscriber_count=subquery_aggregate(
+            Subscription.objects.filter(course=OuterRef('course_id'), is_active=True)
+        ),
+    )
+
+
+def build_subscription_feed_item(subscription):
+    """Serialize one annotated subscription into a dashboard course card"""
+    course = subscription.course
+    total_contents = subscription.feed_total_contents
+    completed_contents = subscription.feed_completed_contents
+    progress_percentage = (completed_contents / total_contents * 100) if total_contents > 0 else 0
+    time_required_minutes = subscription.feed_time_required_minutes
+
+    return {
+        'id': course.id,
+        'title_of_course': course.title_of_course,
+        'description': course.description or '',
+        'image_url': course.image.url if course.image else None,
+        **image_variant_fields(course),
+        'creator_username': course.creator.username,
+        'creator_first_name': course.creator.first_name or '',
+        'creator_last_name': course.creator.last_name or '',
+        'created_at': course.created_at,
+        'updated_at': course.updated_at,
+        'department': course.department,
+        'status': course.status,
+        'status_display': course.get_status_display(),
+        'is_subscribed': True,
+        'is_favorited': subscription.feed_is_favorited,
+        'progress_percentage': progress_percentage,
+        'total_score': subscription.total_score or 0,
+        'is_completed': subscription.is_completed or False,
+        'total_time_spent': subscription.total_time_spent or 0,
+        'module_count': subscription.feed_module_count,
+        'total_time_required_minutes': time_required_minutes,
+        'total_time_required_hours': round(time_required_minutes / 60, 1) if time_required_minutes > 0 else 0,
+        'subscriber_count': subscription.feed_subscriber_count
+    }
+
+
+def get_subscription_feed(user):
+    """
+    Dashboard feed for a user, cached per user.
+    The cache entry is dropped by the progress/favorite signals and
+    otherwise expires after MY_SUBSCRIPTIONS_CACHE_TIMEOUT seconds.
+    """
+    timeout = getattr(settings, 'MY_SUBSCRIPTIONS_CACHE_TIMEOUT', 0)
+    cache_key = MY_SUBSCRIPTIONS_CACHE_KEY.format(user_id=user.id)
+
+    if timeout:
+        courses_data = cache.get(cache_key)
+        if courses_data is not None:
+            return courses_data
+
+    courses_data = [
+        build_subscription_feed_item(subscription)
+        for subscription in get_subscription_feed_queryset(user)
+    ]
+
+    if timeout:
+        cache.set(cache_key, courses_data, timeout)
+    return courses_data
+
+
+def invalidate_subscription_feed(user_id):
+    cache.delete(MY_SUBSCRIPTIONS_CACHE_KEY.format(user_id=user_id))
+
+
 class MySubscriptions(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         """Get courses where user has active subscription with progress data"""
         try:
-            print("Starting MySubscriptions API call...")
-            
-            # Get active subscriptions with course details
-            subscriptions = Subscription.objects.filter(
-                user=request.user, 
-                is_active=True
-            ).select_related('course', 'course__creator')
-            
-            print(f"Found {subscriptions.count()} subscriptions for user {request.user.id}")
-            
-            # Prepare course data with subscription progress
-            courses_data = []
-            for subscription in subscriptions:
-                try:
-                    course = subscription.course
-                    print(f"Processing course: {course.title_of_course} (ID: {course.id})")
-                    
-                    # Calculate progress based on completed contents
-                    total_contents = CourseContent.objects.filter(
-                        module__course=course,
-                        module__status=1,
-                        status=1
-                    ).count()
-                    
-                    completed_contents = subscription.completed_contents.filter(
-                        module__course=course,
-                        module__status=1,
-                        status=1
-                    ).count()
-                    
-                    progress_percentage = (completed_contents / total_contents * 100) if total_contents > 0 else 0
-                    
-                    # Build course data with error handling for each field
-                    course_data = {
-                        'id': course.id,
-                        'title_of_course': course.title_of_course,
-                        'description': course.description or '',
-                        'image_url': course.image.url if course.image else None,
-                        'creator_username': course.creator.username,
-                        'creator_first_name': course.creator.first_name or '',
-                        'creator_last_name': course.creator.last_name or '',
-                        'created_at': course.created_at,
-                        'updated_at': course.updated_at,
-                        'department': course.department,
-                        'status': course.status,
-                        'status_display': course.get_status_display(),
-                        'is_subscribed': True,
-                        'is_favorited': course.get_is_favorited(request.user),
-                        'progress_percentage': progress_percentage,
-                        'total_score': subscription.total_score or 0,
-                        'is_completed': subscription.is_completed or False,
-                        'total_time_spent': subscription.total_time_spent or 0,
-                        # NEW FIELDS
-                        'module_count': course.get_active_module_count(),
-                        'total_time_required_minutes': course.get_total_time_required_minutes(),
-                        'total_time_required_hours': course.get_total_time_required_hours(),
-                        'subscriber_count': course.get_subscriber_count()
-                    }
-                    courses_data.append(course_data)
-                    print(f"Successfully processed course: {course.title_of_course}")
-                    
-                except Exception as course_error:
-                    print(f"Error processing course {subscription.course.id}: {str(course_error)}")
-                    # Continue with next course instead of failing entirely
-                    continue
-            
-            print(f"Successfully processed {len(courses_data)} courses")
+            courses_data = get_subscription_feed(request.user)
             return Response(courses_data, status=status.HTTP_200_OK)
             
         except Exception as e:
-            print(f"Error in MySubscriptions: {str(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
+            logger.error(f"Error in MySubscriptions: {str(e)}", exc_info=True)
             
             return Response(
                 {'error': 'Failed to fetch subscribed courses', 'details': str(e)}, 
@@ -4125,7 +4110,7 @@ from django.db.models import Count, Avg, Q
 from django.db.models.functions import TruncDate
 from datetime import timedelta
 
-class AdminDashboardView(APIView):
+class AdminDashboardView(ReplicaReadMixin, APIView):
     permission_classes = [IsSuperUser]
     
     def get(self, request):
@@ -4995,6 +4980,19 @@ class TimeTrackingRecordView(APIView):
                     {'error': 'Duration is required'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            try:
+                duration = int(duration)
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'Duration must be a number of seconds'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            max_duration = getattr(settings, 'TIME_TRACKING_MAX_DURATION_SECONDS', 4 * 3600)
+            if duration <= 0 or duration > max_duration:
+                return Response(
+                    {'error': f'Duration must be between 1 and {max_duration} seconds'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
             # Get or create subscription
             subscription, created = Subscription.objects.get_or_create(
@@ -5003,31 +5001,28 @@ class TimeTrackingRecordView(APIView):
                 defaults={'is_active': True}
             )
 
-            # Update subscription total time
-            subscription.total_time_spent = F('total_time_spent') + duration
-            subscription.save()
-
-            # Refresh to get the updated value
-            subscription.refresh_from_db()
-
-            # Create time tracking record if content_id is provided
-            time_tracking = None
+            # Every heartbeat is stored, with its content when known
+            content = None
             if content_id:
-                try:
-                    content = CourseContent.objects.get(id=content_id, module__course=course)
-                    time_tracking = TimeTracking.objects.create(
-                        user=user,
-                        course=course,
-                        module=content.module,
-                        content=content,
-                        start_time=timezone.now() - timedelta(seconds=duration),
-                        end_time=timezone.now(),
-                        duration=duration,
-                        session_type=session_type
-                    )
-                except CourseContent.DoesNotExist:
-                    # Content not found, but we still record the time in subscription
-                    pass
+                content = CourseContent.objects.filter(id=content_id, module__course=course).first()
+            now = timezone.now()
+            time_tracking = TimeTracking.objects.create(
+                user=user,
+                course=course,
+                module_id=content.module_id if content else None,
+                content=content,
+                start_time=now - timedelta(seconds=duration),
+                end_time=now,
+                duration=duration,
+                session_type=session_type
+            )
+
+            # Overlapping heartbeats are merged into learning sessions, which
+            # give the subscription time
+            from .sessionization import sessionize
+            total, sessions = sessionize(user.id, course.id, since=time_tracking.start_time)
+            subscription.total_time_spent = total
+            subscription.average_time_per_session = total // sessions
             subscription.update_completion_status()
 
             response_data = {
@@ -5035,12 +5030,10 @@ class TimeTrackingRecordView(APIView):
                 'total_time_spent': subscription.total_time_spent,
                 'progress_percentage': subscription.progress_percentage,
                 'is_completed': subscription.is_completed,
-                'completion_requirements': subscription.get_completion_requirements()
+                'completion_requirements': subscription.get_completion_requirements(),
+                'time_tracking_id': time_tracking.id,
             }
 
-            if time_tracking:
-                response_data['time_tracking_id'] = time_tracking.id
-
             return Response(response_data, status=status.HTTP_200_OK)
 
         except Course.DoesNotExist:
@@ -5062,43 +5055,50 @@ class CourseTimeStatsView(APIView):
                 course=course
             ).first()
             
-            # Get time tracking data for this course and user
-            time_records = TimeTracking.objects.filter(
-                user=user,
-                course=course
-            )
-            
-            # Calculate total time spent
-            total_time = time_records.aggregate(total=Sum('duration'))['total'] or 0
-            
-            # Calculate time by session type
-            time_by_type = time_records.values('session_type').annotate(
-                total_time=Sum('duration'),
-                session_count=Count('id')
-            )
+            # Time tracked on this course by the user (raw records, or daily
+            # rollups with TIME_STATS_FROM_ROLLUPS, see user/timetracking.py)
+            from .timetracking import aggregate_time
+            filters = {'user': user, 'course': course}
+
+            # Calculate time by session type, and the totals
+            time_by_type = [
+                {'session_type': row['session_type'], 'total_time': row['total_time'], 'session_count': row['record_count']}
+                for row in aggregate_time(['session_type'], **filters)
+            ]
+            total_time = sum(row['total_time'] for row in time_by_type)
+            session_count = sum(row['session_count'] for row in time_by_type)
             
-            # Calculate time by content type
-            time_by_content_type = time_records.exclude(content__isnull=True).values(
-                'content__content_type__name'
-            ).annotate(
-                total_time=Sum('duration'),
-                content_count=Count('content', distinct=True)
-            )
+            # Calculate time by content type and by module, with their distinct contents
+            by_content_type, by_module = {}, {}
+
+            def add(totals, key, row):
+                entry = totals.setdefault(key, {'total_time': 0, 'contents': set()})
+                entry['total_time'] += row['total_time']
+                if row['content'] is not None:
+                    entry['contents'].add(row['content'])
+
+            for row in aggregate_time(['module__title', 'content', 'content__content_type__name'], **filters):
+                if row['module__title'] is not None:
+                    add(by_module, row['module__title'], row)
+                if row['content'] is not None:
+                    add(by_content_type, row['content__content_type__name'], row)
+            time_by_content_type = [
+                {'content__content_type__name': name, 'total_time': entry['total_time'], 'content_count': len(entry['contents'])}
+                for name, entry in by_content_type.items()
+            ]
+            module_time = [
+                {'module__title': title, 'total_time': entry['total_time'], 'module_progress': len(entry['contents'])}
+                for title, entry in by_module.items()
+            ]
             
             # Calculate daily time spent (last 7 days)
             seven_days_ago = timezone.now().date() - timezone.timedelta(days=7)
-            daily_time = time_records.filter(
-                start_time__date__gte=seven_days_ago
-            ).values('start_time__date').annotate(
-                daily_total=Sum('duration')
-            ).order_by('start_time__date')
-            
-            # Calculate module-wise time distribution
-            module_time = time_records.exclude(module__isnull=True).values(
-                'module__title'
-            ).annotate(
-                total_time=Sum('duration'),
-                module_progress=Count('content', distinct=True)
+            daily_time = sorted(
+                (
+                    {'start_time__date': row['day'], 'daily_total': row['total_time']}
+                    for row in aggregate_time(['day'], day__gte=seven_days_ago, **filters)
+                ),
+                key=lambda row: row['start_time__date'],
             )
             
             # Calculate completion requirements
@@ -5114,7 +5114,7 @@ class CourseTimeStatsView(APIView):
                 'daily_time_spent': list(daily_time),
                 'module_time_distribution': list(module_time),
                 'average_daily_time': total_time / 7 if total_time > 0 else 0,
-                'session_count': time_records.count(),
+                'session_count': session_count,
                 'completion_requirements': {
                     'time_met': time_met,
                     'required_time_seconds': required_time_seconds,
@@ -5474,7 +5474,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Q
-from .models import Course, Module, CourseContent, PDFContent, VideoContent, QCM
+from .models import Course, Module, CourseContent, PDFContent, PDFText, VideoContent, QCM
 
 # REPLACE ONLY THE GlobalSearchView IN YOUR EXISTING views.py FILE
 # Keep all your other views - just replace this one class
@@ -5527,7 +5527,8 @@ class GlobalSearchView(APIView):
                         'status': course.status,
                         'status_display': course.status_display,
                         'created_at': course.created_at.isoformat() if course.created_at else None,
-                        'image_url': course.image.url if course.image else None
+                        'image_url': course.image.url if course.image else None,
+                        **image_variant_fields(course)
                     })
             
             # Search Modules
@@ -5553,9 +5554,12 @@ class GlobalSearchView(APIView):
             
             # Search Content - FIXED VERSION
             if 'content' in search_types:
+                # A subquery, so that the trigram index of PDFText serves the text match
+                matching_pdfs = PDFText.objects.filter(text__icontains=search_query).values('pdf_content')
                 contents = CourseContent.objects.filter(
                     Q(title__icontains=search_query) |
-                    Q(caption__icontains=search_query)
+                    Q(caption__icontains=search_query) |
+                    Q(pdf_content__in=matching_pdfs)
                 ).select_related(
                     'module',
                     'module__course', 
@@ -5653,6 +5657,34 @@ class GlobalSearchView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class SearchSuggestView(APIView):
+    """
+    Autocomplete for the search box, answered from the in-memory prefix index
+    of active course, module and content titles
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    MAX_LIMIT = 20
+
+    def get(self, request):
+        from .suggest import get_suggest_index
+
+        query = request.GET.get('q', '').strip()
+        try:
+            limit = min(int(request.GET.get('limit', 10)), self.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = request.GET.get('type', '').strip()
+        types = None if content_type in ['', 'all'] else {content_type}
+
+        if not query:
+            return Response({'results': [], 'query': query}, status=status.HTTP_200_OK)
+
+        results = get_suggest_index().suggest(query, limit, types)
+        return Response({'results': results, 'query': query}, status=status.HTTP_200_OK)
+
+
 # Add to your views.py
 
 from rest_framework import viewsets, status
@@ -5825,32 +5857,26 @@ class CourseStatsDebugView(APIView):
 
 # user/views.py - Add these views
 from .models import Notification
+from .notifications import (
+    broadcasts_for, mark_all_read, mark_broadcast_read, mark_notification_read, notification_feed, read_cursor,
+    total_count, unread_count,
+)
 class NotificationListView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         """Get all notifications for the authenticated user"""
         try:
-            notifications = Notification.objects.filter(
-                user=request.user
-            ).select_related(
-                'related_course',
-                'related_module', 
-                'related_content'
-            ).order_by('-created_at')[:50]  # Last 50 notifications
+            # Last 50 personal and broadcast notifications
+            cursor = read_cursor(request.user)
+            notifications = notification_feed(request.user, limit=50, cursor=cursor)
             
             serializer = NotificationSerializer(notifications, many=True)
             
-            # Get unread count
-            unread_count = Notification.objects.filter(
-                user=request.user,
-                is_read=False
-            ).count()
-            
             return Response({
                 'notifications': serializer.data,
-                'unread_count': unread_count,
-                'total_count': notifications.count()
+                'unread_count': unread_count(request.user, cursor=cursor),
+                'total_count': total_count(request.user)
             })
             
         except Exception as e:
@@ -5872,8 +5898,7 @@ class NotificationMarkAsReadView(APIView):
                 user=request.user
             )
             
-            notification.is_read = True
-            notification.save()
+            mark_notification_read(request.user, notification)
             
             return Response({
                 'message': 'Notification marked as read',
@@ -5887,16 +5912,34 @@ class NotificationMarkAsReadView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class BroadcastNotificationMarkAsReadView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, notification_id):
+        """Mark a broadcast notification as read for the user"""
+        broadcast = get_object_or_404(broadcasts_for(request.user), id=notification_id)
+        try:
+            mark_broadcast_read(request.user, broadcast)
+            
+            return Response({
+                'message': 'Notification marked as read',
+                'notification_id': broadcast.id
+            })
+            
+        except Exception as e:
+            logger.error(f"Error marking broadcast notification as read: {str(e)}")
+            return Response(
+                {'error': 'Failed to mark notification as read'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 class NotificationMarkAllAsReadView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
         """Mark all notifications as read for the user"""
         try:
-            updated_count = Notification.objects.filter(
-                user=request.user,
-                is_read=False
-            ).update(is_read=True)
+            updated_count = mark_all_read(request.user)
             
             return Response({
                 'message': f'{updated_count} notifications marked as read',
@@ -5916,13 +5959,8 @@ class NotificationUnreadCountView(APIView):
     def get(self, request):
         """Get unread notification count"""
         try:
-            unread_count = Notification.objects.filter(
-                user=request.user,
-                is_read=False
-            ).count()
-            
             return Response({
-                'unread_count': unread_count
+                'unread_count': unread_count(request.user)
             })
             
         except Exception as e:
@@ -6037,4 +6075,474 @@ class UserStatusUpdateView(APIView):
             return Response(
                 {'error': f'Erreur lors de la mise à jour: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+# Home feed - everything the frontend loads after login in a single call
+import asyncio
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+class HomeFeedView(View):
+    """
+    Combines CheckAuthentification, MySubscriptions, RecommendedCourses,
+    favorites and the unread notification count.
+
+    The user is authenticated once and the subscription map is loaded once,
+    then the sections are built concurrently. A section that fails or takes
+    longer than HOME_FEED_SECTION_TIMEOUT seconds is returned as null and
+    listed under 'partial' so the frontend can fall back to its own endpoint.
+    """
+    sections = ['subscriptions', 'recommendations', 'favorites', 'notifications']
+
+    async def get(self, request):
+        drf_request = Request(
+            request,
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        )
+
+        try:
+            user, shared = await sync_to_async(self.load_shared)(drf_request)
+        except AuthenticationFailed as e:
+            return JsonResponse({'authenticated': False, 'message': str(e.detail)}, status=401)
+
+        if user is None:
+            return JsonResponse({'authenticated': False, 'message': 'No token'}, status=401)
+        if user.status == 2:  # Suspendu
+            return JsonResponse({
+                'authenticated': False,
+                'message': 'Votre compte est suspendu'
+            }, status=403)
+
+        results = await asyncio.gather(*[
+            self.run_section(name, drf_request, user, shared) for name in self.sections
+        ])
+
+        data = {
+            'authenticated': True,
+            'user': serialize_authenticated_user(user),
+            'partial': {},
+        }
+        for name, value, error in results:
+            data[name] = value
+            if error:
+                data['partial'][name] = error
+
+        return JsonResponse(data, encoder=JSONEncoder)
+
+    def load_shared(self, request):
+        """Authenticate and load the data shared by several sections"""
+        user = request.user
+        if not user or not user.is_authenticated:
+            return None, None
+
+        subscription_progress = dict(Subscription.objects.filter(
+            user=user,
+            is_active=True
+        ).values_list('course_id', 'progress_percentage'))
+
+        return user, {'subscription_progress': subscription_progress}
+
+    async def run_section(self, name, request, user, shared):
+        builder = getattr(self, f'build_{name}')
+        concurrent = getattr(settings, 'HOME_FEED_CONCURRENT', True)
+        timeout = getattr(settings, 'HOME_FEED_SECTION_TIMEOUT', 2.0)
+
+        try:
+            value = await asyncio.wait_for(
+                sync_to_async(self.call_section, thread_sensitive=not concurrent)(
+                    builder, concurrent, request, user, shared
+                ),
+                timeout
+            )
+            return name, value, None
+        except asyncio.TimeoutError:
+            logger.warning(f"Home feed section '{name}' timed out after {timeout}s")
+            return name, None, 'timeout'
+        except Exception as e:
+            logger.error(f"Home feed section '{name}' failed: {str(e)}")
+            return name, None, 'error'
+
+    def call_section(self, builder, concurrent, request, user, shared):
+        try:
+            return builder(request, user, shared)
+        finally:
+            # Worker threads outside the request thread own their connection
+            if concurrent:
+                close_old_connections()
+
+    def build_subscriptions(self, request, user, shared):
+        return get_subscription_feed(user)
+
+    def build_recommendations(self, request, user, shared):
+        courses = get_recommended_courses(user, list(shared['subscription_progress']))
+        courses_data = CourseSerializer(courses, many=True, context={'request': request}).data
+        for course_data in courses_data:
+            course_data['is_subscribed'] = False
+        return courses_data
+
+    def build_favorites(self, request, user, shared):
+        favorites = FavoriteCourse.objects.filter(user=user).select_related(
+            'course', 'course__creator'
+        )
+        results = FavoriteCourseSerializer(favorites, many=True, context={
+            'request': request,
+            'subscription_progress': shared['subscription_progress']
+        }).data
+        return {'count': len(results), 'results': results}
+
+    def build_notifications(self, request, user, shared):
+        return {
+            'unread_count': unread_count(user)
+        }
+
+
+# ============================================================================
+# Async variants of read-heavy endpoints
+# ============================================================================
+# Native async views for ASGI workers. Django's async ORM still runs each
+# query on the single thread-sensitive executor, so independent queries only
+# overlap when they run in worker threads with their own connection: with
+# ASYNC_VIEWS_CONCURRENT (the default) every group passed to run_orm() does,
+# otherwise they run one after the other on the request's connection.
+# ASYNC_SERIALIZE_BATCHES bounds the groups, so the connections, of a request.
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+
+async def run_orm(function, *args):
+    """Run sync ORM code from an async view"""
+    concurrent = getattr(settings, 'ASYNC_VIEWS_CONCURRENT', True)
+
+    def call():
+        try:
+            return function(*args)
+        finally:
+            if concurrent:
+                close_old_connections()
+
+    return await sync_to_async(call, thread_sensitive=not concurrent)()
+
+
+async def serialize_concurrently(serializer):
+    """
+    serializer.data, with the SerializerMethodFields (the ones running
+    queries) spread over at most ASYNC_SERIALIZE_BATCHES concurrent groups,
+    the plain fields joining the first one. Method fields listed in the
+    serializer's query_free_fields are computed inline.
+    """
+    instance = serializer.instance
+    fields = list(serializer._readable_fields)
+
+    def represent(group):
+        values = {}
+        for field in group:
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            values[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+        return values
+
+    query_free = set(getattr(serializer, 'query_free_fields', ()))
+    method_fields = [field for field in fields if isinstance(field, serializers.SerializerMethodField)]
+    inline_fields = [field for field in method_fields if field.field_name in query_free]
+    query_fields = [field for field in method_fields if field.field_name not in query_free]
+    plain_fields = [field for field in fields if field not in method_fields]
+
+    batch_count = max(1, min(getattr(settings, 'ASYNC_SERIALIZE_BATCHES', 3), len(query_fields)))
+    batches = [query_fields[index::batch_count] for index in range(batch_count)]
+    batches[0] = plain_fields + batches[0]
+    parts = await asyncio.gather(*(run_orm(represent, batch) for batch in batches))
+
+    values = represent(inline_fields)
+    for part in parts:
+        values.update(part)
+    return {field.field_name: values[field.field_name] for field in fields if field.field_name in values}
+
+
+async def gather_in_batches(functions):
+    """
+    Results of the sync ORM functions, run in at most ASYNC_SERIALIZE_BATCHES
+    concurrent groups (so connections), each calling its functions in turn.
+    """
+    batch_count = max(1, min(getattr(settings, 'ASYNC_SERIALIZE_BATCHES', 3), len(functions)))
+
+    def call_all(batch):
+        return [function() for function in batch]
+
+    batches = await asyncio.gather(*(
+        run_orm(call_all, functions[index::batch_count]) for index in range(batch_count)
+    ))
+    results = [None] * len(functions)
+    for index, batch in enumerate(batches):
+        results[index::batch_count] = batch
+    return results
+
+
+class AsyncAPIView(View):
+    """Base of the async variants: DRF authentication, JSON responses"""
+
+    authentication_required = True
+
+    async def authenticate(self, request):
+        """(DRF request, user or None, error response or None)"""
+        drf_request = Request(
+            request,
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        )
+        try:
+            user = await sync_to_async(lambda: drf_request.user)()
+        except AuthenticationFailed as e:
+            return drf_request, None, self.json({'detail': str(e.detail)}, status=401)
+
+        if not user.is_authenticated:
+            if self.authentication_required:
+                return drf_request, None, self.json(
+                    {'detail': 'Authentication credentials were not provided.'}, status=401
+                )
+            user = None
+        return drf_request, user, None
+
+    def json(self, data, status=200):
+        return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+class AsyncCourseDetail(AsyncAPIView):
+    """CourseDetail.get: the serializer's statistics are computed concurrently"""
+
+    authentication_required = False
+
+    async def get(self, request, pk):
+        drf_request, user, error = await self.authenticate(request)
+        if error:
+            return error
+
+        course = await Course.objects.select_related('creator').filter(pk=pk).afirst()
+        if course is None:
+            return self.json({'detail': 'No Course matches the given query.'}, status=404)
+
+        if course.status == 0 and not (user and (user.privilege in ['F', 'A'] or user == course.creator)):
+            return self.json({'error': 'Ce cours est en brouillon et non accessible'}, status=403)
+
+        serializer = CourseDetailSerializer(course, context={'request': drf_request})
+        return self.json(await serialize_concurrently(serializer))
+
+
+class AsyncMySubscriptions(AsyncAPIView):
+    """MySubscriptions with the async ORM and the async cache API"""
+
+    async def get(self, request):
+        drf_request, user, error = await self.authenticate(request)
+        if error:
+            return error
+
+        timeout = getattr(settings, 'MY_SUBSCRIPTIONS_CACHE_TIMEOUT', 0)
+        cache_key = MY_SUBSCRIPTIONS_CACHE_KEY.format(user_id=user.id)
+        if timeout:
+            courses_data = await cache.aget(cache_key)
+            if courses_data is not None:
+                return self.json(courses_data)
+
+        courses_data = [
+            build_subscription_feed_item(subscription)
+            async for subscription in get_subscription_feed_queryset(user)
+        ]
+        if timeout:
+            await cache.aset(cache_key, courses_data, timeout)
+        return self.json(courses_data)
+
+
+class AsyncNotificationListView(AsyncAPIView):
+    """NotificationListView: the notifications and the unread count are fetched concurrently"""
+
+    async def get(self, request):
+        drf_request, user, error = await self.authenticate(request)
+        if error:
+            return error
+
+        notifications, unread, total = await asyncio.gather(
+            run_orm(notification_feed, user, 50),
+            run_orm(unread_count, user),
+            run_orm(total_count, user),
+        )
+        return self.json({
+            'notifications': NotificationSerializer(notifications, many=True).data,
+            'unread_count': unread,
+            'total_count': total,
+        })
+
+
+class AsyncCheckSubscription(AsyncAPIView):
+    """
+    CheckSubscription: the subscription and the active content counts are
+    independent aggregate queries run concurrently, instead of two queries per
+    module.
+    """
+
+    async def get(self, request, pk):
+        drf_request, user, error = await self.authenticate(request)
+        if error:
+            return self.json({'error': 'Authentication required'}, status=401)
+
+        course = await Course.objects.select_related('creator').filter(pk=pk).afirst()
+        if course is None:
+            return self.json({'detail': 'No Course matches the given query.'}, status=404)
+
+        active_contents = CourseContent.objects.filter(module__course=course, module__status=1, status=1)
+        subscription, total_active_contents, completed_active_contents, total_active_modules = await asyncio.gather(
+            run_orm(Subscription.objects.filter(user=user, course=course, is_active=True).first),
+            run_orm(active_contents.count),
+            run_orm(Subscription.completed_contents.through.objects.filter(
+                subscription__user=user,
+                subscription__course=course,
+                subscription__is_active=True,
+                coursecontent__in=active_contents,
+            ).count),
+            run_orm(Module.objects.filter(course=course, status=1).count),
+        )
+
+        is_subscribed = subscription is not None
+        if not is_subscribed:
+            completed_active_contents = 0
+        progress_percentage = (
+            round((completed_active_contents / total_active_contents) * 100, 2) if total_active_contents > 0 else 0
+        )
+
+        response_data = {
+            'id': course.id,
+            'title': course.title_of_course,
+            'description': course.description,
+            'image': course.image.url if course.image and hasattr(course.image, 'url') else None,
+            'creator_username': course.creator.username if course.creator else 'Unknown',
+            'creator_first_name': course.creator.first_name if course.creator else '',
+            'creator_last_name': course.creator.last_name if course.creator else '',
+            'created_at': course.created_at.isoformat() if course.created_at else None,
+            'updated_at': course.updated_at.isoformat() if course.updated_at else None,
+            'is_subscribed': is_subscribed,
+            'progress_percentage': progress_percentage,
+            'total_time_spent': subscription.total_time_spent if subscription else 0,
+            'estimated_duration': course.estimated_duration or 0,
+            'min_required_time': course.min_required_time or 0,
+            'active_content_stats': {
+                'total_active_contents': total_active_contents,
+                'completed_active_contents': completed_active_contents,
+                'total_active_modules': total_active_modules,
+            }
+        }
+        if is_subscribed:
+            response_data['subscription_id'] = subscription.id
+        return self.json(response_data)
+
+
+class AsyncAdminDashboardView(ReplicaReadMixin, AsyncAPIView):
+    """
+    AdminDashboardView: the overview counts (one aggregate per model) and the
+    charts are independent and computed in ASYNC_SERIALIZE_BATCHES
+    concurrent groups.
+    """
+
+    async def get(self, request):
+        drf_request, user, error = await self.authenticate(request)
+        if error:
+            return error
+        if not user.is_superuser:
+            return self.json({'detail': 'You do not have permission to perform this action.'}, status=403)
+
+        now = timezone.now()
+        week_ago = now - timedelta(days=7)
+        two_weeks_ago = now - timedelta(days=14)
+        month_ago = now - timedelta(days=30)
+        two_months_ago = now - timedelta(days=60)
+
+        # One aggregate per model instead of a query (and connection) per count
+        counts = {
+            'users': lambda: CustomUser.objects.aggregate(
+                total_users=Count('id'),
+                recent_users=Count('id', filter=Q(date_joined__gte=week_ago)),
+                previous_week_users=Count('id', filter=Q(date_joined__gte=two_weeks_ago, date_joined__lt=week_ago)),
+                active_users_30d=Count('id', filter=Q(last_login__gte=month_ago)),
+                active_users_prev_month=Count(
+                    'id', filter=Q(last_login__gte=two_months_ago, last_login__lt=month_ago)
+                ),
+                users_month_ago=Count('id', filter=Q(date_joined__lt=month_ago)),
+                users_two_months_ago=Count('id', filter=Q(date_joined__lt=two_months_ago)),
+            ),
+            'courses': lambda: Course.objects.aggregate(
+                total_courses=Count('id'),
+                recent_courses=Count('id', filter=Q(created_at__gte=month_ago)),
+                courses_month_ago=Count('id', filter=Q(created_at__lt=month_ago)),
+                courses_two_months_ago=Count('id', filter=Q(created_at__lt=two_months_ago)),
+            ),
+            'subscriptions': lambda: Subscription.objects.filter(is_active=True).aggregate(
+                total_subscriptions=Count('id'),
+                subscriptions_month_ago=Count('id', filter=Q(subscribed_at__lt=month_ago)),
+                subscriptions_two_months_ago=Count('id', filter=Q(subscribed_at__lt=two_months_ago)),
+            ),
+        }
+        dashboard = AdminDashboardView()
+        charts = {
+            'user_distribution': lambda: list(CustomUser.objects.values('privilege').annotate(count=Count('id'))),
+            'user_registration_chart': dashboard.get_user_registration_chart_data,
+            'course_statistics': dashboard.get_course_statistics,
+            'dau_weekly': dashboard.get_dau_weekly,
+            'account_status': dashboard.get_account_status_distribution,
+            'content_type_statistics': dashboard.get_content_type_statistics,
+        }
+        results = await gather_in_batches([*counts.values(), *charts.values()])
+        count = {}
+        for values in results[:len(counts)]:
+            count.update(values)
+        chart = dict(zip(charts, results[len(counts):]))
+
+        return self.json({
+            'overview': {
+                'total_users': count['total_users'],
+                'total_courses': count['total_courses'],
+                'active_subscriptions': count['total_subscriptions'],
+                'recent_users': count['recent_users'],
+                'recent_courses': count['recent_courses'],
+                'engagement_rate': (
+                    round((count['active_users_30d'] / count['total_users'] * 100), 2) if count['total_users'] > 0 else 0
+                ),
+                'trends': self.trends(dashboard, count),
+            },
+            'user_distribution': chart['user_distribution'],
+            'user_registration_chart': chart['user_registration_chart'],
+            'course_statistics': chart['course_statistics'],
+            'dau_weekly': chart['dau_weekly'],
+            'account_status': chart['account_status'],
+            'timestamp': now,
+            'content_type_statistics': chart['content_type_statistics'],
+        })
+
+    def trends(self, dashboard, count):
+        """AdminDashboardView.calculate_trends from counts already fetched"""
+        change = dashboard.calculate_percentage_change
+        users_month_ago, users_two_months_ago = count['users_month_ago'], count['users_two_months_ago']
+        courses_month_ago = count['courses_month_ago']
+        subscriptions_month_ago = count['subscriptions_month_ago']
+
+        prev_engagement = (
+            count['active_users_prev_month'] / users_two_months_ago * 100 if users_two_months_ago > 0 else 0
+        )
+        current_engagement = count['active_users_30d'] / users_month_ago * 100 if users_month_ago > 0 else 0
+        return {
+            'total_users': change(
+                count['total_users'] - users_month_ago, users_month_ago - users_two_months_ago
+            ),
+            'total_courses': change(
+                count['total_courses'] - courses_month_ago, courses_month_ago - count['courses_two_months_ago']
+            ),
+            'recent_users': change(count['recent_users'], count['previous_week_users']),
+            'active_subscriptions': change(
+                count['total_subscriptions'] - subscriptions_month_ago,
+                subscriptions_month_ago - count['subscriptions_two_months_ago']
+            ),
+            'engagement_rate': change(current_engagement, prev_engagement, is_rate=True),
+        }
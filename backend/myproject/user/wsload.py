@@ -0,0 +1,350 @@
+# user/wsload.py
+"""
+WebSocket load harness for CourseConsumer (ws/course/<id>/) and ChatConsumer
+(ws/chat/).
+
+Simulated clients are Channels WebsocketCommunicator instances on the
+project's websocket URL router, all in one event loop, with an in-memory
+channel layer: the numbers are those of the consumers themselves, without
+network or Redis. The authenticated user is put in the scope directly
+(what AuthMiddlewareStack does from the session in production).
+
+run_load() opens the connections, then reports:
+- connections: connect latency and memory per connection (Python
+  allocations traced while connecting, and process RSS growth);
+- fanout: time for a leaderboard broadcast of the course group to reach its
+  first and last member;
+- messages: round-trip latency of progress requests, content completions,
+  QCM submissions and chat messages, and the delivery latency of a chat
+  message to its receiver.
+"""
+import asyncio
+import itertools
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+
+import psutil
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test.utils import override_settings
+
+from .benchmarks import percentile
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 1000}},
+}
+
+
+def latency_summary(values, errors=0):
+    return {
+        'count': len(values),
+        'errors': errors,
+        'p50_ms': round(percentile(values, 0.50), 3) if values else None,
+        'p95_ms': round(percentile(values, 0.95), 3) if values else None,
+        'max_ms': round(max(values), 3) if values else None,
+    }
+
+
+class SimulatedClient:
+    """One WebSocket connection; a reader task files the received messages by type"""
+
+    def __init__(self, application, path, user):
+        self.user = user
+        self.communicator = WebsocketCommunicator(application, path)
+        self.communicator.scope['user'] = user
+        self.inbox = defaultdict(asyncio.Queue)
+        self.reader = None
+
+    async def connect(self, timeout):
+        connected, _ = await self.communicator.connect(timeout=timeout)
+        if connected:
+            self.reader = asyncio.create_task(self.read())
+        return connected
+
+    async def read(self):
+        # Reading the output queue directly: receive_output() stops the
+        # application when it times out
+        while True:
+            message = await self.communicator.output_queue.get()
+            if message['type'] == 'websocket.close':
+                return
+            if message['type'] == 'websocket.send':
+                payload = json.loads(message['text'])
+                self.inbox[payload.get('type')].put_nowait((time.perf_counter(), payload))
+
+    async def expect(self, *types, timeout=10.0, match=None):
+        """(arrival time, payload) of the next message of one of types, an 'error' ends the wait"""
+        async def first():
+            while True:
+                waiters = {asyncio.ensure_future(self.inbox[kind].get()): kind for kind in (*types, 'error')}
+                done, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in pending:
+                    waiter.cancel()
+                # Put back what arrived on the other queues meanwhile
+                results = [(waiters[waiter], waiter.result()) for waiter in done]
+                for kind, item in results[1:]:
+                    self.inbox[kind].put_nowait(item)
+                kind, (arrived, payload) = results[0]
+                if kind == 'error' or match is None or match(payload):
+                    return kind, arrived, payload
+        return await asyncio.wait_for(first(), timeout)
+
+    async def request(self, message, *reply_types, timeout=10.0):
+        """Round-trip latency in ms of message, None when answered by an error or not at all"""
+        sent = time.perf_counter()
+        await self.communicator.send_json_to(message)
+        try:
+            kind, arrived, _ = await self.expect(*reply_types, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        return (arrived - sent) * 1000 if kind != 'error' else None
+
+    def clear(self, kind):
+        self.inbox[kind] = asyncio.Queue()
+
+    async def close(self):
+        if self.reader is not None:
+            self.reader.cancel()
+        await self.communicator.disconnect()
+
+
+@database_sync_to_async
+def load_targets():
+    """
+    The course with the most active subscribers among those with a QCM, its
+    subscribers, completable contents and the correct options of the QCM,
+    and chat users.
+    """
+    from django.db.models import Count, Q
+    from .models import Course, CourseContent, CustomUser, Subscription
+
+    course = (
+        Course.objects
+        .filter(status=1, modules__contents__content_type__name='qcm', modules__contents__qcm__questions__isnull=False)
+        .annotate(active_subscribers=Count('course_subscriptions', filter=Q(course_subscriptions__is_active=True), distinct=True))
+        .order_by('-active_subscribers', 'pk')
+        .first()
+    )
+    if course is None:
+        raise ValueError('No active course with a QCM, run seed_load first')
+
+    subscribers = [
+        subscription.user
+        for subscription in Subscription.objects.filter(course=course, is_active=True).select_related('user').order_by('pk')
+    ]
+    contents = list(
+        CourseContent.objects.filter(module__course=course, module__status=1, status=1).order_by('module__order', 'order')
+    )
+    qcm_content = next(content for content in contents if content.content_type.name == 'qcm')
+    correct_options = [
+        option.pk
+        for question in qcm_content.qcm.questions.prefetch_related('options')
+        for option in question.options.all()
+        if option.is_correct
+    ]
+    return {
+        'course': course,
+        'subscribers': subscribers,
+        'content_ids': [content.pk for content in contents],
+        'qcm_content_id': qcm_content.pk,
+        'correct_options': correct_options,
+        'chat_users': list(CustomUser.objects.filter(is_active=True).order_by('pk')[:10_000]),
+    }
+
+
+async def open_clients(application, path, users, count, concurrency, timeout):
+    """count clients on path, cycling through users; returns (clients, connect latencies, failures)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def open_one(user):
+        nonlocal failures
+        async with semaphore:
+            client = SimulatedClient(application, path, user)
+            started = time.perf_counter()
+            try:
+                connected = await client.connect(timeout)
+            except asyncio.TimeoutError:
+                connected = False
+            if not connected:
+                failures += 1
+                return None
+            latencies.append((time.perf_counter() - started) * 1000)
+            return client
+
+    clients = await asyncio.gather(*(open_one(user) for user in itertools.islice(itertools.cycle(users), count)))
+    return [client for client in clients if client is not None], latencies, failures
+
+
+async def measure_fanout(clients, content_ids, broadcasts, timeout):
+    """Time for the leaderboard broadcast following a completion to reach the course group"""
+    first, last, errors = [], [], 0
+    sender = clients[0]
+    for number in range(broadcasts):
+        for client in clients:
+            client.clear('leaderboard_update')
+        sent = time.perf_counter()
+        await sender.communicator.send_json_to(
+            {'type': 'content_completed', 'content_id': content_ids[number % len(content_ids)]}
+        )
+        try:
+            arrivals = await asyncio.gather(
+                *(client.expect('leaderboard_update', timeout=timeout) for client in clients)
+            )
+        except asyncio.TimeoutError:
+            errors += 1
+            continue
+        times = [arrived for kind, arrived, _ in arrivals if kind == 'leaderboard_update']
+        if len(times) < len(clients):
+            errors += 1
+            continue
+        first.append((min(times) - sent) * 1000)
+        last.append((max(times) - sent) * 1000)
+    return {
+        'group_size': len(clients),
+        'broadcasts': broadcasts,
+        'errors': errors,
+        'first_receiver': latency_summary(first),
+        'last_receiver': latency_summary(last),
+    }
+
+
+async def measure_requests(senders, messages, build, reply_types, timeout):
+    """Each sender sends messages requests in turn, the senders run concurrently"""
+    latencies, errors = [], 0
+
+    async def run(index, client):
+        nonlocal errors
+        for number in range(messages):
+            latency = await client.request(build(index, number), *reply_types, timeout=timeout)
+            if latency is None:
+                errors += 1
+            else:
+                latencies.append(latency)
+
+    await asyncio.gather(*(run(index, client) for index, client in enumerate(senders)))
+    return latency_summary(latencies, errors)
+
+
+async def measure_chat(clients, messages, timeout):
+    """Each client writes to the next one: sender acknowledgement and receiver delivery latencies"""
+    acknowledged, delivered, errors = [], [], 0
+
+    async def run(index, client):
+        nonlocal errors
+        receiver = clients[(index + 1) % len(clients)]
+        for number in range(messages):
+            token = f'load {index}-{number}'
+            sent = time.perf_counter()
+            await client.communicator.send_json_to(
+                {'type': 'chat_message', 'receiver_id': receiver.user.pk, 'message': token}
+            )
+            try:
+                kind, arrived, _ = await client.expect('message_sent', timeout=timeout)
+                if kind == 'error':
+                    errors += 1
+                    continue
+                acknowledged.append((arrived - sent) * 1000)
+                _, arrived, _ = await receiver.expect(
+                    'new_message', timeout=timeout, match=lambda payload: payload['message']['message'] == token
+                )
+                delivered.append((arrived - sent) * 1000)
+            except asyncio.TimeoutError:
+                errors += 1
+
+    await asyncio.gather(*(run(index, client) for index, client in enumerate(clients)))
+    return latency_summary(acknowledged, errors), latency_summary(delivered)
+
+
+def memory_summary(clients, traced_before, traced_after, rss_before, rss_after):
+    count = max(len(clients), 1)
+    return {
+        'memory_per_connection_kb': round((traced_after - traced_before) / count / 1024, 2),
+        'rss_per_connection_kb': round(max(rss_after - rss_before, 0) / count / 1024, 2),
+    }
+
+
+async def _run_load(course_connections, chat_connections, messages, senders, broadcasts,
+                    connect_concurrency, timeout):
+    from . import routing
+
+    application = URLRouter(routing.websocket_urlpatterns)
+    targets = await load_targets()
+    if not targets['subscribers']:
+        raise ValueError(f"Course {targets['course'].pk} has no active subscriber")
+    process = psutil.Process()
+    report = {'course_id': targets['course'].pk}
+
+    tracemalloc.start()
+    try:
+        traced_before, rss_before = tracemalloc.get_traced_memory()[0], process.memory_info().rss
+        started = time.perf_counter()
+        course_clients, connect_latencies, failures = await open_clients(
+            application, f"/ws/course/{targets['course'].pk}/", targets['subscribers'],
+            course_connections, connect_concurrency, timeout,
+        )
+        chat_clients, chat_latencies, chat_failures = await open_clients(
+            application, '/ws/chat/', targets['chat_users'], chat_connections, connect_concurrency, timeout,
+        )
+        connect_seconds = time.perf_counter() - started
+        traced_after, rss_after = tracemalloc.get_traced_memory()[0], process.memory_info().rss
+    finally:
+        tracemalloc.stop()
+
+    report['connections'] = {
+        'course': len(course_clients),
+        'chat': len(chat_clients),
+        'failed': failures + chat_failures,
+        'connect_seconds': round(connect_seconds, 3),
+        'connect': latency_summary(connect_latencies + chat_latencies),
+        **memory_summary(course_clients + chat_clients, traced_before, traced_after, rss_before, rss_after),
+    }
+
+    try:
+        if course_clients:
+            report['fanout'] = await measure_fanout(course_clients, targets['content_ids'], broadcasts, timeout)
+            active = course_clients[:senders]
+            content_ids = targets['content_ids']
+            report['messages'] = {
+                'progress_request': await measure_requests(
+                    active, messages, lambda index, number: {'type': 'progress_request'},
+                    ('progress_update',), timeout,
+                ),
+                'content_completed': await measure_requests(
+                    active, messages,
+                    lambda index, number: {
+                        'type': 'content_completed', 'content_id': content_ids[(index + number) % len(content_ids)],
+                    },
+                    ('content_completed',), timeout,
+                ),
+                # Beyond the QCM's max_attempts the consumer answers with an error
+                'qcm_submission': await measure_requests(
+                    active, messages,
+                    lambda index, number: {
+                        'type': 'qcm_submission', 'content_id': targets['qcm_content_id'],
+                        'selected_options': targets['correct_options'], 'time_taken': 60,
+                    },
+                    ('qcm_result',), timeout,
+                ),
+            }
+        if chat_clients:
+            acknowledged, delivered = await measure_chat(chat_clients[:max(senders, 2)], messages, timeout)
+            report.setdefault('messages', {}).update({'chat_message': acknowledged, 'chat_delivery': delivered})
+    finally:
+        await asyncio.gather(*(client.close() for client in course_clients + chat_clients), return_exceptions=True)
+    return report
+
+
+def run_load(course_connections=1000, chat_connections=200, messages=20, senders=20, broadcasts=10,
+             connect_concurrency=100, timeout=30.0):
+    """Run the scenario against the current database; see the module docstring for the report"""
+    from asgiref.sync import async_to_sync
+
+    with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS):
+        # async_to_sync keeps the consumers' database calls on this thread and its connection
+        return async_to_sync(_run_load)(
+            course_connections, chat_connections, messages, senders, broadcasts, connect_concurrency, timeout,
+        )
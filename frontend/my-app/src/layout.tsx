@@ -68,6 +68,7 @@ interface SearchResult {
 
 interface Notification {
   id: number;
+  kind: 'personal' | 'broadcast';
   notification_type: string;
   title: string;
   message: string;
@@ -439,12 +440,17 @@ const AuthGuard = ({ children }: AuthGuardProps) => {
     }
   };
 
-  const markAsRead = async (notificationId: number) => {
+  const markAsRead = async (notification: Notification) => {
     try {
-      await api.post(`notifications/${notificationId}/mark-read/`);
+      // Personal and broadcast notifications have their own ids
+      await api.post(
+        notification.kind === 'broadcast'
+          ? `notifications/broadcast/${notification.id}/mark-read/`
+          : `notifications/${notification.id}/mark-read/`
+      );
       setNotifications(prev =>
         prev.map(notif =>
-          notif.id === notificationId ? { ...notif, is_read: true } : notif
+          notif.kind === notification.kind && notif.id === notification.id ? { ...notif, is_read: true } : notif
         )
       );
       setUnreadCount(prev => Math.max(0, prev - 1));
@@ -933,7 +939,7 @@ const AuthGuard = ({ children }: AuthGuardProps) => {
 
                                   {groupNotifications.map((notification) => (
                                     <div
-                                      key={notification.id}
+                                      key={`${notification.kind}-${notification.id}`}
                                       style={{
                                         display: 'flex',
                                         gap: '0.75rem',
@@ -947,7 +953,7 @@ const AuthGuard = ({ children }: AuthGuardProps) => {
                                       }}
                                       onMouseEnter={(e) => e.currentTarget.style.backgroundColor = notification.is_read ? '#f3f4f6' : '#e0e7ff'}
                                       onMouseLeave={(e) => e.currentTarget.style.backgroundColor = notification.is_read ? 'white' : '#f0f4ff'}
-                                      onClick={() => markAsRead(notification.id)}
+                                      onClick={() => markAsRead(notification)}
                                     >
                                       <div style={{
                                         width: '40px',